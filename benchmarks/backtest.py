@@ -0,0 +1,71 @@
+"""Rolling-origin backtest of the glucose predictors on a diary CSV or synthetic CGM data
+
+Usage: python benchmarks/backtest.py [--data user_data.csv | --synthetic-days 14]
+                                     [--models linear rls kalman] [--folds 20] [--workers 4]
+"""
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.backtest import (
+    BACKTEST_MODELS, accuracy_by_horizon, hypo_detection, latency, load_history, run_backtest, runnable_models,
+)
+from utils.synthetic_cgm import synthetic_history
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--data', help='diary CSV in the user_data.csv layout')
+    source.add_argument('--synthetic-days', type=int, default=14, help='days of simulated 5-minute CGM data')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--models', nargs='+', choices=list(BACKTEST_MODELS), default=list(BACKTEST_MODELS))
+    parser.add_argument('--folds', type=int, default=20)
+    parser.add_argument('--min-history', default='2D', help='history before the first origin')
+    parser.add_argument('--workers', type=int, default=None, help='process pool size (default: all cores)')
+    parser.add_argument('--output', help='write per-forecast results to this CSV')
+    args = parser.parse_args()
+
+    if args.data:
+        data = load_history(args.data)
+        print(f"{args.data}: {len(data)} records")
+    else:
+        data = synthetic_history(days=args.synthetic_days, seed=args.seed)
+        print(f"synthetic CGM: {args.synthetic_days} days, {len(data)} records")
+
+    models = runnable_models(args.models)
+    if 'recurrent' in args.models and 'recurrent' not in models:
+        print("Skipping recurrent: no trained sequence model or TensorFlow (run train_sequence_model.py)")
+    if not models:
+        return
+
+    start = time.perf_counter()
+    results = run_backtest(data, models=models, n_folds=args.folds, min_history=args.min_history,
+                           workers=args.workers)
+    elapsed = time.perf_counter() - start
+    if results.empty:
+        print("Not enough glucose readings for any forecast origin")
+        return
+    print(f"{results['origin'].nunique()} folds x {len(models)} models in {elapsed:.1f}s\n")
+
+    with pd.option_context('display.float_format', '{:.1f}'.format, 'display.width', 120):
+        print("Accuracy by horizon (mg/dL)")
+        print(accuracy_by_horizon(results).to_string(index=False))
+        print("\nLatency (ms)")
+        print(latency(results).to_string(index=False))
+    with pd.option_context('display.float_format', '{:.2f}'.format):
+        print("\nHypo detection (< 70 mg/dL within the horizon)")
+        print(hypo_detection(results).to_string(index=False))
+
+    if args.output:
+        results.to_csv(args.output, index=False)
+        print(f"\nPer-forecast results saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
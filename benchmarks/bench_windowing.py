@@ -0,0 +1,67 @@
+"""Benchmark lagged-window construction on a long synthetic CGM series
+
+Usage: python benchmarks/bench_windowing.py [--steps 100000] [--repeat 5]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.features import lagged_windows
+
+
+def loop_windows(X, sequence_length):
+    """The original list-append construction, kept as the baseline"""
+    sequences = []
+    targets = []
+    for i in range(len(X) - sequence_length):
+        sequences.append(X[i:i+sequence_length].flatten())
+        targets.append(X[i+sequence_length, 0])
+    return np.array(sequences), np.array(targets)
+
+
+def synthetic_cgm(steps, seed=0):
+    """5-minute glucose/carbs/insulin series with daily rhythm and noise"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(steps)
+    glucose = 140 + 40 * np.sin(2 * np.pi * t / 288) + rng.normal(0, 10, steps).cumsum() * 0.05
+    carbs = np.where(rng.random(steps) < 3 / 288, rng.uniform(10, 80, steps), 0.0)
+    insulin = np.where(carbs > 0, carbs / 15, 0.0)
+    return np.column_stack([glucose, carbs, insulin])
+
+
+def best_of(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--steps', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    X = synthetic_cgm(args.steps)
+    print(f"{args.steps} steps x {X.shape[1]} features")
+    print(f"{'seq_len':>8} {'loop (ms)':>12} {'strided (ms)':>14} {'speedup':>10}")
+    for sequence_length in (2, 3, 6, 12, 24):
+        expected = loop_windows(X, sequence_length)
+        actual = lagged_windows(X, sequence_length)
+        assert np.array_equal(expected[0], actual[0]) and np.array_equal(expected[1], actual[1])
+
+        loop_time = best_of(lambda: loop_windows(X, sequence_length), args.repeat)
+        strided_time = best_of(lambda: lagged_windows(X, sequence_length), args.repeat)
+        print(f"{sequence_length:>8} {loop_time * 1000:>12.1f} {strided_time * 1000:>14.3f} "
+              f"{loop_time / strided_time:>9.0f}x")
+
+
+if __name__ == '__main__':
+    main()
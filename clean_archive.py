@@ -0,0 +1,37 @@
+"""Clean a CGM/diary archive in bounded memory
+
+Usage: python clean_archive.py ARCHIVE.csv [--output user_data.csv] [--chunksize 100000] [--lateness 1h]
+
+The archive is read in chunks and streamed through the same pipeline as
+DataProcessor.process_glucose_data: time-ordered merge, duplicate
+timestamps dropped, glucose forward-filled and default columns added.
+Rows may be out of order by at most --lateness.
+"""
+import argparse
+
+import pandas as pd
+
+from utils.cleaning import CHUNK_SIZE, RECORD_KEY, clean_csv
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('archive', help='CSV in the user_data.csv layout')
+    parser.add_argument('--output', default='cleaned_data.csv')
+    parser.add_argument('--chunksize', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--lateness', default='1h', help="pandas time span, or 'none' to sort the whole file")
+    parser.add_argument('--keep-same-time-records', action='store_true',
+                        help='only drop exact repeats, keeping distinct records that share a timestamp')
+    args = parser.parse_args()
+
+    lateness = None if args.lateness.lower() == 'none' else pd.Timedelta(args.lateness)
+    subset = RECORD_KEY if args.keep_same_time_records else ('timestamp',)
+    try:
+        written = clean_csv(args.archive, args.output, chunksize=args.chunksize, lateness=lateness, subset=subset)
+    except ValueError as e:
+        parser.exit(1, f"{e}\n")
+    print(f"Wrote {written} rows to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -3,16 +3,63 @@ import streamlit.components.v1 as components
 import pandas as pd
 import numpy as np
 import os
+import uuid
 from datetime import datetime, timedelta
 import pytz
-from models.glucose_predictor import GlucosePredictor
+from models.glucose_predictor import GlucosePredictor, REAL_TIME_GRID
+from models.model_cache import configure_model_cache
+from models.online_predictor import RecursiveLeastSquaresPredictor
+from models.prediction_service import PredictionService
+from models.sequence_model import sequence_model_available
+from models.therapy_estimator import TherapyEstimateService
+from utils.bolus_calculator import BolusCalculator, TherapySchedule
+from utils.cleaning import RECORD_KEY, clean_csv
 from utils.data_processor import DataProcessor
-from utils.visualization import create_glucose_plot, create_prediction_plot
+from utils.visualization import create_agp_plot, create_glucose_plot, create_prediction_plot
+from utils.agp import cached_agp_percentiles
+from utils.patterns import ALL_DAYS, cached_patterns
+from utils.meal_search import MealSearchIndex
+from utils.food_stats import FoodStats
+from utils.meal_response import MealResponseTable
+from utils.insulin_activity import on_board_grid
+from utils.glucose_alerts import GlucoseAlertDetector
+from utils.glycemic_metrics import GlycemicMetrics
+from utils.insulin_profile import InsulinProfile
+from utils.resampling import data_version
+from utils.site_rotation import SITES, SiteRotationTracker
 import plotly.graph_objects as go
 
 # Set Hong Kong timezone
 HK_TZ = pytz.timezone('Asia/Hong_Kong')
 
+# Derived indexes persisted alongside user_data.csv
+MEAL_INDEX_FILE = 'meal_index.json'
+MODEL_CACHE_DIR = 'model_cache'
+THERAPY_SCHEDULE_FILE = 'therapy_schedule.json'
+THERAPY_ESTIMATES_FILE = 'therapy_estimates.json'
+
+# Fitted predictor state is shared by all sessions and survives restarts
+configure_model_cache(max_entries=32, cache_dir=MODEL_CACHE_DIR)
+
+# Glucose forecast models selectable in the prediction section
+PREDICTION_MODES = ['批量线性回归', '在线递归最小二乘 (RLS)', '卡尔曼滤波 (状态空间)', '循环神经网络 (GRU)']
+
+# Periods offered for glycemic metrics, in days back from the latest record (None: everything)
+METRIC_PERIODS = {'最近7天': 7, '最近14天': 14, '最近30天': 30, '最近90天': 90, '全部': None}
+
+# Ambulatory glucose profile windows (days) and the readings needed for a meaningful one
+AGP_DAY_OPTIONS = [14, 30, 90]
+AGP_MIN_READINGS = 100
+
+# Carb amounts (g) and dosing delays (minutes) tabulated by the bolus calculator
+BOLUS_CARB_OPTIONS = [0, 15, 30, 45, 60, 75, 90]
+BOLUS_DELAY_OPTIONS = [0, 30, 60, 120]
+BOLUS_GLUCOSE_MAX_AGE_MINUTES = 30  # older readings don't set the correction dose
+
+# Forecasts run on a background worker; a render waits this long before showing the last result
+PREDICTION_WAIT_SECONDS = 0.5
+PREDICTION_POLL_SECONDS = 1
+
 # Page config
 st.set_page_config(
     page_title="我的日記",
@@ -731,10 +778,12 @@ def load_persistent_data():
         if not any(os.path.exists(f) for f in data_sources):
             if os.path.exists('processed_dm_data.csv'):
                 try:
-                    imported_data = pd.read_csv('processed_dm_data.csv')
+                    # Stream the import through the cleaning pipeline; only exact repeats are
+                    # dropped, since diary records (e.g. basal and bolus) can share a timestamp
+                    clean_csv('processed_dm_data.csv', 'user_data.csv', subset=RECORD_KEY)
+                    imported_data = pd.read_csv('user_data.csv')
                     imported_data['timestamp'] = pd.to_datetime(imported_data['timestamp'])
-                    # Save as user data with multiple backups
-                    imported_data.to_csv('user_data.csv', index=False)
+                    # Save multiple backups
                     imported_data.to_csv('user_data_safe.csv', index=False)
                     imported_data.to_csv('user_data_backup.csv', index=False)
                     return imported_data
@@ -839,6 +888,409 @@ def save_persistent_data():
                 except:
                     continue
 
+def append_record(record):
+    """Append a single record and keep derived indexes in sync"""
+    st.session_state.glucose_data = pd.concat([
+        st.session_state.glucose_data,
+        pd.DataFrame([record])
+    ], ignore_index=True)
+
+    if record.get('food_details'):
+        st.session_state.meal_index.add(record['timestamp'], record['food_details'], record['carbs'])
+        st.session_state.meal_index.save(MEAL_INDEX_FILE)
+        st.session_state.food_stats.add(record['food_details'])
+
+    # The online predictor consumes grid steps in time order; records that change a consumed step need a replay
+    online_predictor = st.session_state.online_predictor
+    if online_predictor.accepts(record['timestamp'], (record.get('glucose_level') or 0) > 0):
+        online_predictor.advance(st.session_state.glucose_data)
+    else:
+        st.session_state.online_predictor = RecursiveLeastSquaresPredictor.warm_start(st.session_state.glucose_data)
+
+    st.session_state.insulin_profile.add(record['timestamp'], record.get('insulin', 0), record.get('insulin_type', ''))
+
+    # Site rotation is replayed in time order as well
+    site_tracker = st.session_state.site_tracker
+    if record.get('injection_site') and record.get('insulin', 0) > 0:
+        if site_tracker.last_timestamp is None or pd.Timestamp(record['timestamp']) >= site_tracker.last_timestamp:
+            site_tracker.add(record['timestamp'], record['injection_site'])
+        else:
+            st.session_state.site_tracker = SiteRotationTracker.from_data(st.session_state.glucose_data)
+
+    # Only meals around the new meal or reading change their post-meal response
+    if record.get('carbs', 0) > 0 or record.get('glucose_level', 0) > 0:
+        st.session_state.meal_responses.refresh(st.session_state.glucose_data, record['timestamp'])
+
+    # Glycemic metrics extend their prefix sums from the latest reading on
+    metrics = st.session_state.glycemic_metrics
+    if metrics.last_timestamp is None or pd.Timestamp(record['timestamp']) >= metrics.last_timestamp:
+        metrics.extend(pd.DataFrame([record]))
+    else:
+        st.session_state.glycemic_metrics = GlycemicMetrics.from_data(st.session_state.glucose_data)
+
+    # Alerts stream readings in time order too; show any new alert right away
+    detector = st.session_state.alert_detector
+    if record.get('glucose_level', 0) > 0:
+        if detector.last_timestamp is None or pd.Timestamp(record['timestamp']) >= detector.last_timestamp:
+            for alert in detector.update(record['timestamp'], record['glucose_level']):
+                st.toast(alert['message'], icon="🔔")
+        else:
+            st.session_state.alert_detector = GlucoseAlertDetector.from_data(st.session_state.glucose_data)
+
+def delete_record(idx):
+    """Delete a record by index and keep derived indexes in sync"""
+    row = st.session_state.glucose_data.loc[idx]
+    st.session_state.glucose_data = st.session_state.glucose_data.drop(idx).reset_index(drop=True)
+
+    if isinstance(row.get('food_details'), str) and row['food_details']:
+        if st.session_state.meal_index.remove(row['timestamp'], row['food_details']):
+            st.session_state.meal_index.save(MEAL_INDEX_FILE)
+        st.session_state.food_stats.remove(row['food_details'])
+    st.session_state.insulin_profile.remove(row['timestamp'], row.get('insulin', 0), row.get('insulin_type', ''))
+    if isinstance(row.get('injection_site'), str) and row['injection_site'] and row.get('insulin', 0) > 0:
+        st.session_state.site_tracker = SiteRotationTracker.from_data(st.session_state.glucose_data)
+
+    # Recursive least squares cannot unlearn a sample, so replay the history once
+    st.session_state.online_predictor = RecursiveLeastSquaresPredictor.warm_start(st.session_state.glucose_data)
+    st.session_state.alert_detector = GlucoseAlertDetector.from_data(st.session_state.glucose_data)
+    st.session_state.glycemic_metrics = GlycemicMetrics.from_data(st.session_state.glucose_data)
+    if row.get('carbs', 0) > 0 or row.get('glucose_level', 0) > 0:
+        st.session_state.meal_responses.refresh(st.session_state.glucose_data, row['timestamp'])
+
+def rebuild_derived_state():
+    """(Re)load indexes derived from glucose_data after the data itself was (re)loaded"""
+    data = st.session_state.glucose_data
+    meal_index = MealSearchIndex.load(MEAL_INDEX_FILE)
+    if meal_index is None or not meal_index.is_in_sync(data):
+        meal_index = MealSearchIndex.from_data(data)
+        try:
+            meal_index.save(MEAL_INDEX_FILE)
+        except OSError as e:
+            st.warning(f"饮食搜索索引保存失败: {e}")
+    st.session_state.meal_index = meal_index
+    st.session_state.food_stats = FoodStats.from_data(data)
+    st.session_state.online_predictor = RecursiveLeastSquaresPredictor.warm_start(data)
+    st.session_state.alert_detector = GlucoseAlertDetector.from_data(data)
+    st.session_state.insulin_profile = InsulinProfile.from_data(data)
+    st.session_state.site_tracker = SiteRotationTracker.from_data(data)
+    st.session_state.glycemic_metrics = GlycemicMetrics.from_data(data)
+    st.session_state.meal_responses = MealResponseTable.from_data(data)
+
+def local_now():
+    """Current Hong Kong time as a naive datetime, like the recorded timestamps"""
+    return datetime.now(HK_TZ).replace(tzinfo=None)
+
+def current_isf_and_carb_ratio():
+    """ISF and carb ratio of the therapy schedule block in effect now"""
+    carb_ratio, isf, _ = st.session_state.bolus_calculator.schedule.settings_at([local_now()])
+    return float(isf[0]), float(carb_ratio[0])
+
+def recent_readings(data, count=5):
+    """The last `count` glucose readings, skipping meal and insulin rows (which carry no reading)"""
+    return data[data['glucose_level'] > 0].tail(count)
+
+def show_latest_glucose():
+    """Latest glucose reading with its time, from the alert detector rather than the last (maybe meal/insulin) row"""
+    detector = st.session_state.alert_detector
+    if detector.last_glucose is None:
+        st.metric("最新血糖", "-")
+        return
+    st.metric("最新血糖", f"{detector.last_glucose / 18.0182:.1f} mmol/L")
+    st.caption(f"测量于 {detector.last_timestamp.strftime('%m-%d %H:%M')}")
+
+def show_bolus_calculator(data):
+    """Dose recommendation for recent carbs plus a dose table for planned meals"""
+    calculator = st.session_state.bolus_calculator
+    now = local_now()
+    # Only a recent reading sets the correction; otherwise the user can enter one, or it is left out
+    glucose = st.session_state.alert_detector.current_glucose(now, BOLUS_GLUCOSE_MAX_AGE_MINUTES)
+    if glucose is None:
+        entered = st.number_input("当前血糖 (mmol/L)", min_value=2.0, max_value=33.3, value=None, step=0.1,
+                                  key="bolus_glucose_input",
+                                  placeholder=f"近{BOLUS_GLUCOSE_MAX_AGE_MINUTES}分钟无血糖读数，请输入以计算校正剂量")
+        glucose = None if entered is None else entered * 18.0182
+    glucose_note = (f"按当前血糖 {glucose / 18.0182:.1f} mmol/L 计算" if glucose is not None
+                    else "无近期血糖读数，未计入校正剂量")
+
+    # Carbs logged in the last hour that have not been covered yet
+    timestamps = pd.to_datetime(data['timestamp'])
+    recent_carbs = data.loc[(timestamps > now - timedelta(hours=1)) & (timestamps <= now), 'carbs'].sum()
+    if recent_carbs > 0:
+        result = calculator.dose(data, glucose, recent_carbs, now)
+        st.metric("建议胰岛素剂量", f"{result['dose']:.1f} 单位")
+        st.caption(f"近1小时碳水 {recent_carbs:.0f}g，碳水比 1:{result['carb_ratio']:g}，"
+                   f"敏感系数 {result['isf']:g} mg/dL，目标 {result['target']:g} mg/dL；{glucose_note}")
+        if result['insulin_on_board'] > 0:
+            st.caption(f"已扣除活性胰岛素 {result['insulin_on_board']:.1f} 单位")
+
+    with st.expander("🧮 餐前剂量计算"):
+        st.caption(f"{glucose_note}，已扣除各时间点的活性胰岛素")
+        times = [now + timedelta(minutes=delay) for delay in BOLUS_DELAY_OPTIONS]
+        table = calculator.scenarios(data, glucose, BOLUS_CARB_OPTIONS, times)
+        table['time'] = table['time'].dt.strftime('%H:%M')
+        doses = table.pivot(index='time', columns='carbs', values='dose')
+        doses.columns = [f"{carbs:.0f}g" for carbs in doses.columns]
+        doses.index.name = '注射时间'
+        st.dataframe(doses.style.format('{:.1f}'), use_container_width=True)
+
+        st.write("分时段参数（碳水比 g/单位，敏感系数 mg/dL/单位，目标 mg/dL）：")
+        edited = st.data_editor(calculator.schedule.to_frame(), num_rows="dynamic", hide_index=True,
+                                key="therapy_schedule_editor")
+        if st.button("保存分时段参数", key="save_therapy_schedule"):
+            try:
+                schedule = TherapySchedule.from_frame(edited)
+            except (ValueError, TypeError) as e:
+                st.error(f"参数无效: {e}")
+            else:
+                schedule.save(THERAPY_SCHEDULE_FILE)
+                st.session_state.bolus_calculator = BolusCalculator(schedule)
+                st.rerun()
+
+        show_therapy_estimates(data, calculator.schedule)
+
+def show_therapy_estimates(data, schedule):
+    """Carb ratio and ISF fitted from the history per schedule block; carb ratios can be adopted into the schedule"""
+    estimator = get_therapy_estimator()
+    result, running = estimator.get(data, schedule)
+    st.write("根据历史记录估算的参数：")
+    if estimator.error is not None:
+        st.warning(f"参数估算失败，有新的餐食/注射记录后将重试: {estimator.error}")
+    if result is None or result['blocks'] != schedule.blocks:
+        if running:
+            st.info("正在根据历史记录估算参数…")
+        elif estimator.error is None:
+            st.info("餐食和注射记录不足，暂无法估算参数")
+        return
+
+    labels = {'high': '高', 'medium': '中', 'low': '低'}
+    estimates = pd.DataFrame(result['estimates'])
+    st.dataframe(pd.DataFrame({
+        '时段开始': estimates['start'],
+        '估算碳水比': estimates['carb_ratio'].map(lambda v: f"{v:.1f}" if pd.notna(v) else '-'),
+        '碳水比可信度': estimates['confidence'].map(labels),
+        '估算敏感系数 (仅供参考)': estimates['isf'].map(lambda v: f"{v:.0f}" if pd.notna(v) else '-'),
+        '分析窗口': estimates['windows'],
+    }), hide_index=True, use_container_width=True)
+    st.caption(f"基于 {result['events']} 条餐食/注射记录，估算于 {result['fitted_at'].replace('T', ' ')}"
+               + ("；正在用新记录重新估算" if running else ""))
+    st.caption("敏感系数估算会受血糖自然波动影响而偏低，仅供参考，不会被自动采用；如需调整请咨询医生")
+
+    adoptable = estimates['confidence'].isin(['high', 'medium']).to_numpy()
+    if adoptable.any() and st.button("采用中/高可信度的碳水比", key="adopt_therapy_estimates"):
+        blocks = [
+            {**block, 'carb_ratio': round(estimate['carb_ratio'], 1)} if use else block
+            for block, estimate, use in zip(schedule.blocks, result['estimates'], adoptable)
+        ]
+        schedule = TherapySchedule(blocks)
+        schedule.save(THERAPY_SCHEDULE_FILE)
+        st.session_state.bolus_calculator = BolusCalculator(schedule)
+        st.rerun()
+
+def show_meal_responses():
+    """Post-meal glucose of recent meals and the foods with the largest spikes"""
+    table = st.session_state.meal_responses.table
+    measured = table.dropna(subset=['excursion'])
+    st.markdown("#### 餐后血糖反应")
+    if measured.empty:
+        st.info("暂无可分析的餐后血糖（需要餐前30分钟内及餐后3小时内的血糖读数）")
+        return
+
+    to_mmol = lambda values: (values / 18.0182).round(1)
+    recent = measured.sort_values('timestamp', ascending=False).head(20)
+    st.dataframe(pd.DataFrame({
+        '时间': recent['timestamp'].dt.strftime('%Y-%m-%d %H:%M'),
+        '食物': recent['food_details'].fillna(''),
+        '碳水 (g)': recent['carbs'],
+        '餐前': to_mmol(recent['pre_glucose']),
+        '餐后1小时': to_mmol(recent['glucose_1h']),
+        '餐后2小时': to_mmol(recent['glucose_2h']),
+        '峰值': to_mmol(recent['peak_glucose']),
+        '升幅': to_mmol(recent['excursion']),
+    }), hide_index=True, use_container_width=True)
+    st.caption(f"共 {len(measured)} 餐有完整的餐前和餐后读数；血糖单位 mmol/L")
+
+    ranking = st.session_state.meal_responses.food_ranking()
+    if not ranking.empty:
+        st.write("升糖最明显的食物：")
+        worst = ranking.head(10)
+        st.dataframe(pd.DataFrame({
+            '食物': worst.index,
+            '餐次': worst['meals'],
+            '平均升幅': to_mmol(worst['mean_excursion']),
+            '最大升幅': to_mmol(worst['max_excursion']),
+            '平均峰值': to_mmol(worst['mean_peak']),
+        }), hide_index=True, use_container_width=True)
+
+def show_agp():
+    """Ambulatory glucose profile over the chosen number of days before the latest reading"""
+    with st.expander("📊 动态血糖图谱 (AGP)"):
+        days = st.selectbox("统计天数", AGP_DAY_OPTIONS, key="agp_days")
+        agp = cached_agp_percentiles(st.session_state.glucose_data, days=days)
+        if agp['readings'].sum() < AGP_MIN_READINGS:
+            st.info(f"该时段血糖读数不足（至少需要 {AGP_MIN_READINGS} 个），暂无法生成图谱")
+            return
+        st.plotly_chart(create_agp_plot(agp, days), use_container_width=True)
+        st.caption(f"按每日时间汇总 {int(agp['readings'].sum())} 个读数；阴影为 25%-75% 和 5%-95% 区间")
+
+def show_glucose_patterns():
+    """Recurring lows and highs by time of day (and weekday), strongest first"""
+    st.markdown("#### 规律性血糖模式")
+    patterns = cached_patterns(st.session_state.glucose_data)
+    if patterns.empty:
+        st.info("暂未发现在同一时段反复出现的低/高血糖")
+        return
+    for pattern in patterns.head(8).itertuples():
+        block = f"{pattern.start:02d}:00-{pattern.end:02d}:00"
+        when = "" if pattern.weekday == ALL_DAYS else f"{pattern.weekday} "
+        extreme = pattern.mean_extreme / 18.0182
+        if pattern.kind == 'low':
+            label = "🌙 夜间低血糖" if pattern.night else "⚠️ 反复低血糖"
+            st.warning(f"{label}：{when}{block} 在 {pattern.days}/{pattern.observed} 天出现低血糖，"
+                       f"平均最低 {extreme:.1f} mmol/L")
+        else:
+            label = "🌙 夜间高血糖" if pattern.night else "📈 反复高血糖"
+            st.info(f"{label}：{when}{block} 在 {pattern.days}/{pattern.observed} 天出现高血糖，"
+                    f"平均最高 {extreme:.1f} mmol/L")
+        st.caption("日期：" + "、".join(date.strftime('%m-%d') for date in pattern.dates[-10:]))
+
+def show_glycemic_metrics():
+    """Time in ranges, GMI, CV and hypo events over a chosen period, time-weighted on the 5-minute grid"""
+    metrics = st.session_state.glycemic_metrics
+    st.markdown("#### 血糖控制指标")
+    period = st.selectbox("统计时段", list(METRIC_PERIODS), key="glycemic_metrics_period")
+    days = METRIC_PERIODS[period]
+    result = metrics.window() if days is None else metrics.last_days(days)
+    if result is None or result['hours'] == 0:
+        st.info("该时段没有可用的血糖数据")
+        return
+
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("目标范围内时间 (TIR)", f"{result['time_in_range']:.0f}%", help="3.9–10.0 mmol/L，目标 >70%")
+    with col2:
+        st.metric("低于范围时间 (TBR)", f"{result['time_very_low'] + result['time_low']:.1f}%",
+                  help=f"<3.9 mmol/L，其中 <3.0 mmol/L 占 {result['time_very_low']:.1f}%；目标 <4%")
+    with col3:
+        st.metric("高于范围时间 (TAR)", f"{result['time_high'] + result['time_very_high']:.0f}%",
+                  help=f">10.0 mmol/L，其中 >13.9 mmol/L 占 {result['time_very_high']:.1f}%；目标 <25%")
+    with col4:
+        st.metric("低血糖事件", f"{result['hypo_events']}次",
+                  help=f"持续≥15分钟低于3.9 mmol/L；其中低于3.0 mmol/L {result['severe_hypo_events']}次")
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("平均血糖 (时间加权)", f"{result['mean'] / 18.0182:.1f} mmol/L")
+    with col2:
+        st.metric("GMI", f"{result['gmi']:.1f}%", help="血糖管理指标，估算的糖化血红蛋白")
+    with col3:
+        st.metric("变异系数 (CV)", f"{result['cv']:.0f}%", help="目标 ≤36%")
+    with col4:
+        st.metric("数据覆盖率", f"{result['coverage']:.0f}%", help=f"共 {result['hours']:.0f} 小时有效数据")
+
+def show_site_rotation():
+    """Rolling per-site usage, overuse warnings and the recommended next site"""
+    tracker = st.session_state.site_tracker
+    if tracker.last_timestamp is None:
+        st.info("暂无注射部位数据")
+        return
+
+    summary = tracker.summary(local_now())
+    for site, reason in tracker.overused().items():
+        st.warning(f"⚠️ {site} 使用过于频繁（{reason}），建议轮换注射部位")
+    st.info(f"💡 建议下次注射部位：{tracker.recommend()}")
+
+    st.write("注射部位使用统计：")
+    summary['last_used'] = summary['last_used'].map(lambda t: t.strftime('%m-%d %H:%M') if pd.notna(t) else '从未使用')
+    summary['days_since'] = summary['days_since'].map(lambda d: f"{d:.1f}" if pd.notna(d) else '-')
+    summary = summary.rename(columns={'site': '部位', 'last_used': '上次使用', 'days_since': '距今 (天)',
+                                      'last_7d': '近7天', 'last_14d': '近14天', 'last_30d': '近30天'})
+    st.dataframe(summary, hide_index=True, use_container_width=True)
+
+@st.cache_resource
+def get_therapy_estimator():
+    """The process-wide estimator service; it owns the worker process and the persisted estimates"""
+    return TherapyEstimateService(THERAPY_ESTIMATES_FILE)
+
+@st.cache_resource
+def get_prediction_service():
+    """The process-wide forecast worker pool; results are held per session and kind"""
+    return PredictionService()
+
+def prediction_slot(kind):
+    """This session's result slot for a kind of forecast in the shared PredictionService"""
+    return (st.session_state.session_id, kind)
+
+@st.cache_resource
+def get_predictor():
+    """The process-wide GlucosePredictor; it is stateless, so all sessions and threads share it"""
+    return GlucosePredictor()
+
+def forecast_glucose(data, mode):
+    """Six-hour glucose forecast as (predictions, intervals or None, fresh)"""
+    if mode == PREDICTION_MODES[1]:
+        # O(1) from the already-updated RLS state, so no need for the worker
+        return st.session_state.online_predictor.forecast(), None, True
+
+    # The worker thread has no Streamlit context, so bind objects up front
+    predictor = get_predictor()
+    isf, carb_ratio = current_isf_and_carb_ratio()
+    if mode == PREDICTION_MODES[2]:
+        compute = lambda: predictor.predict_state_space(data, steps=6, isf=isf, carb_ratio=carb_ratio)
+    elif mode == PREDICTION_MODES[3]:
+        # Falls back to the linear model until train_sequence_model.py has produced an artifact
+        compute = lambda: predictor.predict_recurrent(data, with_intervals=True)
+    else:
+        compute = lambda: predictor.predict(data, with_intervals=True)
+
+    key = (data_version(data), mode, isf, carb_ratio)
+    result, fresh = get_prediction_service().get(prediction_slot('glucose'), key, compute, PREDICTION_WAIT_SECONDS)
+    if result is None:
+        return [], None, fresh
+    predictions, lower, upper = result
+    return predictions, (lower, upper), fresh
+
+def forecast_real_time(data, mode):
+    """Thirty-minute forecast in 5-minute steps as (predictions, lower, upper, fresh)"""
+    predictor = get_predictor()
+    isf, carb_ratio = current_isf_and_carb_ratio()
+    if mode == PREDICTION_MODES[2]:
+        compute = lambda: predictor.predict_state_space(data, steps=6, grid=REAL_TIME_GRID, isf=isf,
+                                                        carb_ratio=carb_ratio)
+    else:
+        compute = lambda: predictor.predict_real_time(data, with_intervals=True)
+
+    key = (data_version(data), mode == PREDICTION_MODES[2], isf, carb_ratio)
+    result, fresh = get_prediction_service().get(prediction_slot('real_time'), key, compute,
+                                                 PREDICTION_WAIT_SECONDS)
+    if result is None:
+        return [], [], [], fresh
+    return (*result, fresh)
+
+def forecast_insulin_needs(hours=24):
+    """Insulin need per coming hour, total and by kind, looked up from the maintained profile"""
+    profile = st.session_state.insulin_profile
+    processor = st.session_state.processor
+    return {
+        kind: processor.predict_insulin_needs(None, hours, profile=profile, kind=kind)
+        for kind in (None, 'basal', 'bolus')
+    }
+
+@st.fragment(run_every=PREDICTION_POLL_SECONDS)
+def watch_prediction(kind):
+    """Rerun the page once the background forecast of this kind has finished"""
+    if not get_prediction_service().is_busy(prediction_slot(kind)):
+        st.rerun()
+
+def show_stale_prediction(kind):
+    """Computing indicator shown while the displayed forecast is from older data"""
+    st.caption("⏳ 正在后台计算最新预测，当前显示上一次结果")
+    watch_prediction(kind)
+
+def prefill_food_carbs():
+    """Prefill the carbs input with the learned estimate for the typed food"""
+    estimate = st.session_state.food_stats.estimate(st.session_state.get('food_name_input', ''))
+    if estimate is not None:
+        st.session_state.carbs_input = estimate['median']
+
 def generate_daily_summary(selected_date):
     """Generate daily summary in the requested format"""
     if st.session_state.glucose_data.empty:
@@ -897,6 +1349,7 @@ if not validate_session_data():
     st.session_state.glucose_data = load_persistent_data()
     st.session_state.data_initialized = True
     st.session_state.data_recovery_count = 0
+    rebuild_derived_state()
 else:
     # Verify data hasn't been accidentally reset
     if hasattr(st.session_state, 'last_record_count'):
@@ -906,11 +1359,18 @@ else:
             recovered_data = load_persistent_data()
             if len(recovered_data) > current_count:
                 st.session_state.glucose_data = recovered_data
+                rebuild_derived_state()
                 st.warning(f"检测到数据丢失，已恢复 {len(recovered_data)} 条记录")
 
 # Track record count for loss detection
 st.session_state.last_record_count = len(st.session_state.glucose_data)
 
+# Sessions started before an index existed still need one
+if any(key not in st.session_state for key in ('meal_index', 'food_stats', 'online_predictor', 'alert_detector',
+                                                  'insulin_profile', 'site_tracker', 'glycemic_metrics',
+                                                  'meal_responses')):
+    rebuild_derived_state()
+
 # Enhanced periodic backup system
 if 'last_backup_time' not in st.session_state:
     st.session_state.last_backup_time = datetime.now()
@@ -932,10 +1392,15 @@ if 'selected_time' not in st.session_state:
     st.session_state.selected_time = datetime.now().time()
 
 try:
-    if 'predictor' not in st.session_state:
-        st.session_state.predictor = GlucosePredictor()
     if 'processor' not in st.session_state:
         st.session_state.processor = DataProcessor()
+    if 'session_id' not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
+    if 'bolus_calculator' not in st.session_state:
+        processor = st.session_state.processor
+        schedule = TherapySchedule.load(THERAPY_SCHEDULE_FILE) or TherapySchedule.constant(
+            processor.carb_ratio, processor.correction_factor, processor.target_glucose)
+        st.session_state.bolus_calculator = BolusCalculator(schedule)
 except Exception as e:
     st.error(f"初始化预测模型时发生错误: {str(e)}")
 
@@ -1063,10 +1528,7 @@ if st.session_state.input_type == 'glucose':
                 'injection_site': '',
                 'food_details': ''
             }
-            st.session_state.glucose_data = pd.concat([
-                st.session_state.glucose_data,
-                pd.DataFrame([new_data])
-            ], ignore_index=True)
+            append_record(new_data)
             # Immediate save with validation
             save_persistent_data()
             # Verify save was successful
@@ -1121,10 +1583,13 @@ elif st.session_state.input_type == 'meal':
     col_food, col_carbs, col_add = st.columns([3, 2, 1])
     
     with col_food:
-        food_name = st.text_input("食物名称", key="food_name_input", placeholder="例如：米饭、面条、苹果...")
+        food_name = st.text_input("食物名称", key="food_name_input", placeholder="例如：米饭、面条、苹果...", on_change=prefill_food_carbs)
     
     with col_carbs:
         carbs_amount = st.number_input("碳水化合物 (克)", min_value=0.0, max_value=500.0, value=None, step=0.1, key="carbs_input", placeholder="请输入克数")
+        food_estimate = st.session_state.food_stats.estimate(food_name) if food_name else None
+        if food_estimate is not None:
+            st.caption(f"历史记录 {food_estimate['count']} 次，中位数 {food_estimate['median']}g (±{food_estimate['spread']}g)")
     
     with col_add:
         st.write("")  # 空行对齐
@@ -1167,10 +1632,7 @@ elif st.session_state.input_type == 'meal':
                 'injection_site': '',
                 'food_details': food_details
             }
-            st.session_state.glucose_data = pd.concat([
-                st.session_state.glucose_data,
-                pd.DataFrame([new_meal])
-            ], ignore_index=True)
+            append_record(new_meal)
             # Immediate save with validation
             save_persistent_data()
             # Verify save was successful
@@ -1220,9 +1682,12 @@ elif st.session_state.input_type == 'insulin':
             st.caption(f"解析时间: {injection_time.strftime('%H:%M')}")
 
     # 注射部位选择
+    # Preselect the site the rotation tracker recommends
+    recommended_site = st.session_state.site_tracker.recommend()
     injection_site = st.selectbox(
         "注射部位",
-        ["腹部", "大腿", "手臂", "臀部"],
+        SITES,
+        index=SITES.index(recommended_site) if recommended_site in SITES else 0,
         key="injection_site_select"
     )
 
@@ -1254,10 +1719,7 @@ elif st.session_state.input_type == 'insulin':
                         'injection_site': injection_site,
                         'food_details': ''
                     }
-                    st.session_state.glucose_data = pd.concat([
-                        st.session_state.glucose_data,
-                        pd.DataFrame([new_injection])
-                    ], ignore_index=True)
+                    append_record(new_injection)
                     # Immediate save with validation
                     save_persistent_data()
                     # Verify save was successful
@@ -1424,16 +1886,24 @@ elif st.session_state.input_type == 'insulin':
     """, height=80)
 
 # 血糖预警系统 (显著位置)
-if not st.session_state.glucose_data.empty:
-    latest_glucose = st.session_state.glucose_data['glucose_level'].iloc[-1]
-    if latest_glucose <= 40:
-        st.error("🚨 严重低血糖预警！当前血糖: {:.1f} mg/dL - 请立即处理！".format(latest_glucose))
+# State of the streaming detector after the latest reading (not the last row, which may be a meal or insulin entry)
+for alert in st.session_state.alert_detector.active_alerts(local_now()):
+    reading_time = alert['timestamp'].strftime('%m-%d %H:%M')
+    if alert['kind'] == 'urgent_low':
+        st.error(f"{alert['message']}（{reading_time}）")
         st.markdown("**紧急处理建议：**")
         st.markdown("- 立即摄入15-20克快速碳水化合物")
         st.markdown("- 15分钟后重新测量血糖")
         st.markdown("- 如无改善请寻求医疗帮助")
-    elif latest_glucose < 70:
-        st.warning("⚠️ 低血糖预警！当前血糖: {:.1f} mg/dL - 请及时处理".format(latest_glucose))
+    elif alert['kind'] == 'high':
+        st.info(f"{alert['message']}（{reading_time}）")
+    else:
+        st.warning(f"{alert['message']}（{reading_time}）")
+
+if st.session_state.alert_detector.events:
+    with st.expander("预警记录"):
+        for alert in reversed(list(st.session_state.alert_detector.events)[-10:]):
+            st.write(f"{alert['timestamp'].strftime('%Y-%m-%d %H:%M')}  {alert['message']}")
 
 # Main content with responsive layout
 if st.session_state.glucose_data.empty:
@@ -1475,33 +1945,41 @@ else:
             ]
 
             # Create interactive plot with date range
-            fig = create_glucose_plot(data_filtered, (start_datetime, end_datetime))
+            fig = create_glucose_plot(data_filtered, (start_datetime, end_datetime),
+                                      on_board=on_board_grid(st.session_state.glucose_data))
             st.plotly_chart(fig, use_container_width=True, height=350)
+            show_agp()
 
             # Recent statistics
             st.subheader("最近统计")
-            recent_data = data_sorted.tail(5)
             col1, col2 = st.columns(2)
             with col1:
-                latest_mmol = round(recent_data['glucose_level'].iloc[-1] / 18.0182, 1)
-                st.metric("最新血糖", f"{latest_mmol} mmol/L")
+                show_latest_glucose()
             with col2:
-                avg_mmol = round(recent_data['glucose_level'].mean() / 18.0182, 1)
+                avg_mmol = round(recent_readings(data_sorted)['glucose_level'].mean() / 18.0182, 1)
                 st.metric("平均值 (最近5次)", f"{avg_mmol} mmol/L")
 
             # 血糖预警检查
-            recent_glucose = recent_data['glucose_level'].iloc[-1]
-            if recent_glucose <= 40:
+            recent_glucose = st.session_state.alert_detector.current_glucose(local_now()) or 0
+            if 0 < recent_glucose <= 40:
                 st.error("⚠️ 危险！当前血糖值过低，请立即处理！")
-            elif recent_glucose < 70:
+            elif 0 < recent_glucose < 70:
                 st.warning("⚠️ 注意！当前血糖值偏低，请及时补充糖分。")
 
+            show_bolus_calculator(st.session_state.glucose_data)
 
             # Predictions
             st.subheader("血糖预测")
+            prediction_mode = st.radio("预测模型", PREDICTION_MODES, horizontal=True, key="prediction_mode")
+            if prediction_mode == PREDICTION_MODES[3] and not sequence_model_available():
+                st.caption("尚未训练序列模型（python train_sequence_model.py）或未安装 TensorFlow，暂用线性回归预测")
             if len(data_filtered) >= 3:
-                predictions = st.session_state.predictor.predict(data_filtered)
-                fig_pred = create_prediction_plot(data_filtered, predictions)
+                predictions, intervals, fresh = forecast_glucose(data_filtered, prediction_mode)
+                if not fresh:
+                    show_stale_prediction('glucose')
+                elif len(predictions) == 0:
+                    st.info("近期血糖读数间隔过长，暂无法预测")
+                fig_pred = create_prediction_plot(data_filtered, predictions, intervals)
                 st.plotly_chart(fig_pred, use_container_width=True, height=350)
             else:
                 st.info("需要至少3个血糖记录来进行预测")
@@ -1510,14 +1988,15 @@ else:
             # Real-time predictions
             st.subheader("实时血糖预测")
             if len(data_filtered) >= 12:
-                real_time_predictions = st.session_state.predictor.predict_real_time(data_filtered)
+                real_time_predictions, lower_bound, upper_bound, fresh = forecast_real_time(data_filtered, prediction_mode)
+                if not fresh:
+                    show_stale_prediction('real_time')
                 if len(real_time_predictions) > 0:
-                    pred_times = [datetime.now() + timedelta(minutes=5*i) for i in range(6)]
+                    pred_times = [datetime.now() + timedelta(minutes=5*i) for i in range(len(real_time_predictions))]
                     real_time_df = pd.DataFrame({
                         'timestamp': pred_times,
                         'glucose_level': real_time_predictions
                     })
-                    lower_bound, upper_bound = st.session_state.predictor.get_prediction_intervals(real_time_predictions)
 
                     fig_real_time = go.Figure()
 
@@ -1526,15 +2005,16 @@ else:
                     upper_bound_mmol = [p / 18.0182 for p in upper_bound]
                     lower_bound_mmol = [p / 18.0182 for p in lower_bound]
 
-                    # Add prediction intervals
-                    fig_real_time.add_trace(go.Scatter(
-                        x=pred_times + pred_times[::-1],
-                        y=np.concatenate([upper_bound_mmol, lower_bound_mmol[::-1]]),
-                        fill='toself',
-                        fillcolor='rgba(0,176,246,0.2)',
-                        line=dict(color='rgba(255,255,255,0)'),
-                        name='预测区间'
-                    ))
+                    # Add prediction intervals (none until there is enough history to calibrate them)
+                    if len(lower_bound) > 0:
+                        fig_real_time.add_trace(go.Scatter(
+                            x=pred_times + pred_times[::-1],
+                            y=np.concatenate([upper_bound_mmol, lower_bound_mmol[::-1]]),
+                            fill='toself',
+                            fillcolor='rgba(0,176,246,0.2)',
+                            line=dict(color='rgba(255,255,255,0)'),
+                            name='预测区间'
+                        ))
 
                     # Add predictions
                     fig_real_time.add_trace(go.Scatter(
@@ -1562,13 +2042,14 @@ else:
 
                     if np.any(np.array(predictions_mmol) > 10.0) or np.any(np.array(predictions_mmol) < 3.9):
                         st.warning("⚠️ 预测显示血糖可能会超出目标范围，请注意监测")
-                else:
+                elif fresh:
                     st.info("需要至少1小时的数据来进行实时预测")
 
             # Insulin needs prediction
             st.subheader("胰岛素需求预测")
             if len(data_filtered) >= 24:
-                insulin_predictions = st.session_state.processor.predict_insulin_needs(data_filtered)
+                insulin_needs = forecast_insulin_needs()
+                insulin_predictions = insulin_needs[None]
                 if len(insulin_predictions) > 0:
                     pred_hours = [datetime.now() + timedelta(hours=i) for i in range(24)]
                     insulin_df = pd.DataFrame({
@@ -1583,6 +2064,13 @@ else:
                         name='预计胰岛素需求',
                         line=dict(color='purple', width=2)
                     ))
+                    for kind, label, color in (('basal', '基础胰岛素', 'teal'), ('bolus', '餐时胰岛素', 'orange')):
+                        fig_insulin.add_trace(go.Scatter(
+                            x=pred_hours,
+                            y=insulin_needs[kind],
+                            name=label,
+                            line=dict(color=color, width=1, dash='dot')
+                        ))
 
                     fig_insulin.update_layout(
                         title='24小时胰岛素需求预测',
@@ -1596,13 +2084,7 @@ else:
 
             # Injection site analysis
             st.subheader("注射部位分析")
-            site_stats = st.session_state.processor.analyze_injection_sites(data_filtered)
-            if site_stats:
-                site_df = pd.DataFrame(site_stats)
-                st.write("注射部位使用统计：")
-                st.dataframe(site_df)
-            else:
-                st.info("暂无注射部位数据")
+            show_site_rotation()
 
         except Exception as e:
             st.error(f"生成图表时发生错误: {str(e)}")
@@ -1640,14 +2122,23 @@ else:
                 ]
 
                 # Create interactive plot with date range
-                fig = create_glucose_plot(data_filtered, (start_datetime, end_datetime))
+                fig = create_glucose_plot(data_filtered, (start_datetime, end_datetime),
+                                      on_board=on_board_grid(st.session_state.glucose_data))
                 st.plotly_chart(fig, use_container_width=True, height=450)
+                show_agp()
 
                 # Predictions
                 st.subheader("血糖预测")
+                prediction_mode = st.radio("预测模型", PREDICTION_MODES, horizontal=True, key="prediction_mode")
+                if prediction_mode == PREDICTION_MODES[3] and not sequence_model_available():
+                    st.caption("尚未训练序列模型（python train_sequence_model.py）或未安装 TensorFlow，暂用线性回归预测")
                 if len(data_filtered) >= 3:
-                    predictions = st.session_state.predictor.predict(data_filtered)
-                    fig_pred = create_prediction_plot(data_filtered, predictions)
+                    predictions, intervals, fresh = forecast_glucose(data_filtered, prediction_mode)
+                    if not fresh:
+                        show_stale_prediction('glucose')
+                    elif len(predictions) == 0:
+                        st.info("近期血糖读数间隔过长，暂无法预测")
+                    fig_pred = create_prediction_plot(data_filtered, predictions, intervals)
                     st.plotly_chart(fig_pred, use_container_width=True, height=450)
                 else:
                     st.info("需要至少3个血糖记录来进行预测")
@@ -1655,14 +2146,15 @@ else:
                 # Real-time predictions
                 st.subheader("实时血糖预测")
                 if len(data_filtered) >= 12:
-                    real_time_predictions = st.session_state.predictor.predict_real_time(data_filtered)
+                    real_time_predictions, lower_bound, upper_bound, fresh = forecast_real_time(data_filtered, prediction_mode)
+                    if not fresh:
+                        show_stale_prediction('real_time')
                     if len(real_time_predictions) > 0:
-                        pred_times = [datetime.now() + timedelta(minutes=5*i) for i in range(6)]
+                        pred_times = [datetime.now() + timedelta(minutes=5*i) for i in range(len(real_time_predictions))]
                         real_time_df = pd.DataFrame({
                             'timestamp': pred_times,
                             'glucose_level': real_time_predictions
                         })
-                        lower_bound, upper_bound = st.session_state.predictor.get_prediction_intervals(real_time_predictions)
 
                         fig_real_time = go.Figure()
 
@@ -1671,15 +2163,16 @@ else:
                         upper_bound_mmol = [p / 18.0182 for p in upper_bound]
                         lower_bound_mmol = [p / 18.0182 for p in lower_bound]
 
-                        # Add prediction intervals
-                        fig_real_time.add_trace(go.Scatter(
-                            x=pred_times + pred_times[::-1],
-                            y=np.concatenate([upper_bound_mmol, lower_bound_mmol[::-1]]),
-                            fill='toself',
-                            fillcolor='rgba(0,176,246,0.2)',
-                            line=dict(color='rgba(255,255,255,0)'),
-                            name='预测区间'
-                        ))
+                        # Add prediction intervals (none until there is enough history to calibrate them)
+                        if len(lower_bound) > 0:
+                            fig_real_time.add_trace(go.Scatter(
+                                x=pred_times + pred_times[::-1],
+                                y=np.concatenate([upper_bound_mmol, lower_bound_mmol[::-1]]),
+                                fill='toself',
+                                fillcolor='rgba(0,176,246,0.2)',
+                                line=dict(color='rgba(255,255,255,0)'),
+                                name='预测区间'
+                            ))
 
                         # Add predictions
                         fig_real_time.add_trace(go.Scatter(
@@ -1713,7 +2206,8 @@ else:
                 # Insulin needs prediction
                 st.subheader("胰岛素需求预测")
                 if len(data_filtered) >= 24:
-                    insulin_predictions = st.session_state.processor.predict_insulin_needs(data_filtered)
+                    insulin_needs = forecast_insulin_needs()
+                    insulin_predictions = insulin_needs[None]
                     if len(insulin_predictions) > 0:
                         pred_hours = [datetime.now() + timedelta(hours=i) for i in range(24)]
                         insulin_df = pd.DataFrame({
@@ -1728,6 +2222,13 @@ else:
                             name='预计胰岛素需求',
                             line=dict(color='purple', width=2)
                         ))
+                        for kind, label, color in (('basal', '基础胰岛素', 'teal'), ('bolus', '餐时胰岛素', 'orange')):
+                            fig_insulin.add_trace(go.Scatter(
+                                x=pred_hours,
+                                y=insulin_needs[kind],
+                                name=label,
+                                line=dict(color=color, width=1, dash='dot')
+                            ))
 
                         fig_insulin.update_layout(
                             title='24小时胰岛素需求预测',
@@ -1741,13 +2242,7 @@ else:
 
                 # Injection site analysis
                 st.subheader("注射部位分析")
-                site_stats = st.session_state.processor.analyze_injection_sites(data_filtered)
-                if site_stats:
-                    site_df = pd.DataFrame(site_stats)
-                    st.write("注射部位使用统计：")
-                    st.dataframe(site_df)
-                else:
-                    st.info("暂无注射部位数据")
+                show_site_rotation()
 
             except Exception as e:
                 st.error(f"生成图表时发生错误: {str(e)}")
@@ -1755,26 +2250,19 @@ else:
         with col2:
             st.subheader("最近统计")
             try:
-                recent_data = data_sorted.tail(5)
-                latest_glucose_mmol = recent_data['glucose_level'].iloc[-1] / 18.0182
-                avg_glucose_mmol = recent_data['glucose_level'].mean() / 18.0182
-                st.metric("最新血糖", f"{latest_glucose_mmol:.1f} mmol/L")
+                avg_glucose_mmol = recent_readings(data_sorted)['glucose_level'].mean() / 18.0182
+                show_latest_glucose()
                 st.metric("平均值 (最近5次)", f"{avg_glucose_mmol:.1f} mmol/L")
 
                 # 血糖预警检查
-                recent_glucose = recent_data['glucose_level'].iloc[-1]
-                if recent_glucose <= 40:
+                recent_glucose = st.session_state.alert_detector.current_glucose(local_now()) or 0
+                if 0 < recent_glucose <= 40:
                     st.error("⚠️ 危险！当前血糖值过低，请立即处理！")
-                elif recent_glucose < 70:
+                elif 0 < recent_glucose < 70:
                     st.warning("⚠️ 注意！当前血糖值偏低，请及时补充糖分。")
 
                 # Insulin recommendation
-                if recent_data['carbs'].sum() > 0:
-                    insulin_recommendation = st.session_state.processor.calculate_insulin_dose(
-                        recent_data['glucose_level'].iloc[-1],
-                        recent_data['carbs'].sum()
-                    )
-                    st.metric("建议胰岛素剂量", f"{insulin_recommendation:.1f} 单位")
+                show_bolus_calculator(st.session_state.glucose_data)
             except Exception as e:
                 st.error(f"计算统计数据时发生错误: {str(e)}")
 
@@ -1830,7 +2318,7 @@ else:
                         col_yes, col_no = st.columns(2)
                         with col_yes:
                             if st.button("确认删除", key=f"confirm_yes_{idx}"):
-                                st.session_state.glucose_data = st.session_state.glucose_data.drop(idx).reset_index(drop=True)
+                                delete_record(idx)
                                 save_persistent_data()
                                 del st.session_state[f"confirm_delete_glucose_{idx}"]
                                 st.success("记录已删除")
@@ -1854,6 +2342,9 @@ else:
                 with col4:
                     danger_count = len(glucose_data[glucose_data['glucose_level'] <= 40])
                     st.metric("严重低血糖", f"{danger_count}次", delta_color="inverse")
+
+                show_glycemic_metrics()
+                show_glucose_patterns()
             else:
                 st.info("暂无血糖记录")
         except Exception as e:
@@ -1904,7 +2395,7 @@ else:
                         col_yes, col_no = st.columns(2)
                         with col_yes:
                             if st.button("确认删除", key=f"confirm_insulin_yes_{idx}"):
-                                st.session_state.glucose_data = st.session_state.glucose_data.drop(idx).reset_index(drop=True)
+                                delete_record(idx)
                                 save_persistent_data()
                                 del st.session_state[f"confirm_delete_insulin_{idx}"]
                                 st.success("记录已删除")
@@ -1936,6 +2427,22 @@ else:
     with tab3:
         st.subheader("饮食记录汇总")
         try:
+            # Full-text search over food details via the inverted index
+            meal_query = st.text_input("搜索食物", key="meal_search_query", placeholder="例如：榴槤 糯米糍、Chia")
+            if meal_query:
+                search_start = datetime.now()
+                search_results = st.session_state.meal_index.search(meal_query)
+                search_ms = (datetime.now() - search_start).total_seconds() * 1000
+                st.caption(f"找到 {len(search_results)} 条记录 ({search_ms:.1f} 毫秒)")
+                if not search_results.empty:
+                    display_results = pd.DataFrame({
+                        '日期': search_results['timestamp'].dt.strftime('%Y-%m-%d'),
+                        '时间': search_results['timestamp'].dt.strftime('%H:%M'),
+                        '食物详情': search_results['food_details'],
+                        '碳水化合物 (g)': search_results['carbs'].round(1)
+                    })
+                    st.dataframe(display_results, use_container_width=True, hide_index=True)
+
             # Filter data to show only meal records (carbs > 0)
             meal_data = st.session_state.glucose_data[st.session_state.glucose_data['carbs'] > 0].copy()
             if not meal_data.empty:
@@ -1976,7 +2483,7 @@ else:
                         col_yes, col_no = st.columns(2)
                         with col_yes:
                             if st.button("确认删除", key=f"confirm_meal_yes_{idx}"):
-                                st.session_state.glucose_data = st.session_state.glucose_data.drop(idx).reset_index(drop=True)
+                                delete_record(idx)
                                 save_persistent_data()
                                 del st.session_state[f"confirm_delete_meal_{idx}"]
                                 st.success("记录已删除")
@@ -1999,6 +2506,8 @@ else:
                 with col3:
                     total_meals = len(meal_data)
                     st.metric("总餐次", f"{total_meals}次")
+
+                show_meal_responses()
                     
             else:
                 st.info("暂无饮食记录")
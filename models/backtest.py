@@ -0,0 +1,232 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from models.glucose_predictor import HOURLY_GRID, REAL_TIME_GRID, GlucosePredictor
+from models.model_cache import ModelCache
+from models.online_predictor import RecursiveLeastSquaresPredictor
+from models.sequence_model import sequence_model_available
+from utils.insulin_activity import on_board_grid
+from utils.resampling import to_regular_grid
+
+HYPO_THRESHOLD = 70  # mg/dL, same line as the app's low-glucose warning
+
+
+def _fit_linear(history):
+    predictor = GlucosePredictor(cache=ModelCache())
+    return predictor, predictor.predict(history)
+
+
+def _fit_real_time(history):
+    predictor = GlucosePredictor(cache=ModelCache())
+    return predictor, predictor.predict_real_time(history)
+
+
+def _fit_rls(history):
+    predictor = RecursiveLeastSquaresPredictor.warm_start(history)
+    return predictor, predictor.forecast()
+
+
+def _fit_recurrent(history):
+    # The artifact loads once per process, on the first fold
+    predictor = GlucosePredictor(cache=ModelCache())
+    return predictor, predictor.predict_recurrent(history)
+
+
+def _fit_kalman(history):
+    predictor = GlucosePredictor()
+    return predictor, predictor.predict_state_space(history, steps=6)[0]
+
+
+def _fit_kalman_real_time(history):
+    predictor = GlucosePredictor()
+    return predictor, predictor.predict_state_space(history, steps=6, grid=REAL_TIME_GRID)[0]
+
+
+# name -> (grid the forecast steps live on, fit function, predict-again function).
+# Fitting returns the model and its first forecast; predicting again on the
+# fitted model (e.g. a model-cache hit) measures forecast-only latency.
+BACKTEST_MODELS = {
+    'linear': (HOURLY_GRID, _fit_linear, lambda model, history: model.predict(history)),
+    'real_time': (REAL_TIME_GRID, _fit_real_time, lambda model, history: model.predict_real_time(history)),
+    'rls': (HOURLY_GRID, _fit_rls, lambda model, history: model.forecast()),
+    'recurrent': (HOURLY_GRID, _fit_recurrent, lambda model, history: model.predict_recurrent(history)),
+    'kalman': (HOURLY_GRID, _fit_kalman, lambda model, history: model.predict_state_space(history, steps=6)[0]),
+    'kalman_real_time': (REAL_TIME_GRID, _fit_kalman_real_time,
+                         lambda model, history: model.predict_state_space(history, steps=6, grid=REAL_TIME_GRID)[0]),
+}
+
+
+def runnable_models(models=None):
+    """The requested backtest models, without 'recurrent' when it would only fall back to 'linear'"""
+    models = list(models or BACKTEST_MODELS)
+    if 'recurrent' in models and not sequence_model_available():
+        models.remove('recurrent')
+    return models
+
+
+def load_history(path):
+    """Read a diary CSV in the user_data.csv layout for offline evaluation"""
+    data = pd.read_csv(path)
+    data['timestamp'] = pd.to_datetime(data['timestamp'])
+    for column in ('glucose_level', 'carbs', 'insulin'):
+        data[column] = pd.to_numeric(data[column], errors='coerce').fillna(0)
+    return data.sort_values('timestamp').reset_index(drop=True)
+
+
+def rolling_origins(data, n_folds=20, min_history='2D', horizon='6h', start=None):
+    """Evenly spaced forecast origins at glucose readings, leaving room for history and horizon
+
+    With `start`, origins begin no earlier than it (e.g. after a model's training period).
+    """
+    timestamps = pd.to_datetime(data['timestamp'])
+    readings = np.sort(timestamps[data['glucose_level'] > 0].unique())
+    if len(readings) == 0:
+        return []
+    first = readings[0] + pd.Timedelta(min_history)
+    if start is not None:
+        first = max(first, pd.Timestamp(start).to_datetime64())
+    last = readings[-1] - pd.Timedelta(horizon)
+    candidates = readings[(readings >= first) & (readings <= last)]
+    if len(candidates) == 0:
+        return []
+    picks = np.unique(np.linspace(0, len(candidates) - 1, min(n_folds, len(candidates))).round().astype(int))
+    return [pd.Timestamp(candidates[i]) for i in picks]
+
+
+# Per-process state set once by the pool initializer instead of pickled per fold
+_worker_state = {}
+
+
+def _init_worker(data, models):
+    timestamps = pd.to_datetime(data['timestamp'])
+    _worker_state['data'] = data.assign(timestamp=timestamps)
+    _worker_state['models'] = models
+    # Ground truth on each grid the models forecast on
+    _worker_state['truth'] = {
+        grid['freq']: to_regular_grid(data, **grid)['glucose_level']
+        for grid in {BACKTEST_MODELS[name][0]['freq']: BACKTEST_MODELS[name][0] for name in models}.values()
+    }
+
+
+def _timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def evaluate_fold(origin):
+    """Fit every model on history up to `origin` and score its forecast against later readings"""
+    data = _worker_state['data']
+    history = data[data['timestamp'] <= origin]
+    # Build the feature grids up front so latencies compare models, not resampling
+    for grid in (HOURLY_GRID, REAL_TIME_GRID):
+        on_board_grid(history, **grid)
+
+    rows = []
+    for name in _worker_state['models']:
+        grid, fit, predict_again = BACKTEST_MODELS[name]
+        (model, predictions), fit_ms = _timed(fit, history)
+        _, predict_ms = _timed(predict_again, model, history)
+
+        truth = _worker_state['truth'][grid['freq']]
+        step = pd.Timedelta(grid['freq'])
+        base = origin.floor(grid['freq'])
+        # Forecasts with their own timestamps (RLS anchors at its last closed step) are scored
+        # at those; the rest start at the origin's grid step. Horizons count from that step,
+        # and anything not after it is not a forecast
+        if isinstance(predictions, pd.Series):
+            horizons = np.round((predictions.index - base) / step).astype(int)
+        else:
+            horizons = np.arange(1, len(predictions) + 1)
+        for h, predicted in zip(horizons, predictions):
+            if h < 1:
+                continue
+            rows.append({
+                'model': name,
+                'origin': origin,
+                'horizon': h,
+                'horizon_minutes': int(h * step.total_seconds() // 60),
+                'predicted': float(predicted),
+                'actual': float(truth.get(base + h * step, np.nan)),
+                'fit_ms': fit_ms,
+                'predict_ms': predict_ms,
+            })
+        if len(predictions) == 0:
+            rows.append({'model': name, 'origin': origin, 'horizon': 0, 'horizon_minutes': 0,
+                         'predicted': np.nan, 'actual': np.nan, 'fit_ms': fit_ms, 'predict_ms': predict_ms})
+    return rows
+
+
+def run_backtest(data, models=None, n_folds=20, min_history='2D', horizon='6h', workers=None, start=None):
+    """Rolling-origin backtest returning one row per (model, origin, horizon step)
+
+    'recurrent' is skipped without a trained sequence model, since its
+    fallback would just repeat the 'linear' rows (see runnable_models).
+    """
+    models = runnable_models(models)
+    origins = rolling_origins(data, n_folds=n_folds, min_history=min_history, horizon=horizon, start=start)
+    if not origins:
+        return pd.DataFrame(columns=['model', 'origin', 'horizon', 'horizon_minutes', 'predicted', 'actual',
+                                     'fit_ms', 'predict_ms'])
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        _init_worker(data, models)
+        folds = [evaluate_fold(origin) for origin in origins]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(origins)), initializer=_init_worker,
+                                 initargs=(data, models)) as pool:
+            folds = list(pool.map(evaluate_fold, origins))
+    return pd.DataFrame([row for fold in folds for row in fold])
+
+
+def accuracy_by_horizon(results):
+    """MAE/RMSE per model and horizon over forecasts with a known outcome"""
+    scored = results.dropna(subset=['predicted', 'actual'])
+    errors = scored.assign(abs_error=(scored['predicted'] - scored['actual']).abs(),
+                           sq_error=(scored['predicted'] - scored['actual']) ** 2)
+    summary = errors.groupby(['model', 'horizon_minutes']).agg(
+        n=('abs_error', 'size'), mae=('abs_error', 'mean'), rmse=('sq_error', 'mean')
+    )
+    summary['rmse'] = np.sqrt(summary['rmse'])
+    return summary.reset_index()
+
+
+def hypo_detection(results, threshold=HYPO_THRESHOLD):
+    """Precision/recall of 'a hypo within the forecast horizon' per model, one event per fold"""
+    scored = results.dropna(subset=['predicted', 'actual'])
+    per_fold = scored.groupby(['model', 'origin']).agg(
+        predicted=('predicted', lambda s: bool((s < threshold).any())),
+        actual=('actual', lambda s: bool((s < threshold).any())),
+    )
+    rows = []
+    for model, folds in per_fold.groupby(level='model'):
+        tp = int((folds['predicted'] & folds['actual']).sum())
+        fp = int((folds['predicted'] & ~folds['actual']).sum())
+        fn = int((~folds['predicted'] & folds['actual']).sum())
+        rows.append({
+            'model': model,
+            'hypo_folds': tp + fn,
+            'precision': tp / (tp + fp) if tp + fp else np.nan,
+            'recall': tp / (tp + fn) if tp + fn else np.nan,
+        })
+    return pd.DataFrame(rows, columns=['model', 'hypo_folds', 'precision', 'recall'])
+
+
+def latency(results):
+    """Median and p95 fit/predict latency per model in milliseconds"""
+    per_fold = results.drop_duplicates(['model', 'origin'])
+    grouped = per_fold.groupby('model')
+    forecasts = results.dropna(subset=['predicted']).drop_duplicates(['model', 'origin']).groupby('model').size()
+    return pd.DataFrame({
+        'folds': grouped.size(),
+        'forecasts': forecasts.reindex(grouped.size().index, fill_value=0),
+        'fit_ms_p50': grouped['fit_ms'].median(),
+        'fit_ms_p95': grouped['fit_ms'].quantile(0.95),
+        'predict_ms_p50': grouped['predict_ms'].median(),
+        'predict_ms_p95': grouped['predict_ms'].quantile(0.95),
+    }).reset_index()
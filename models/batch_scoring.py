@@ -0,0 +1,142 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from models.features import last_window
+from models.glucose_predictor import (
+    HOURLY_GRID, HOURLY_SEQUENCE_LENGTH, REAL_TIME_GRID, REAL_TIME_RIDGE, REAL_TIME_SEQUENCE_LENGTH,
+    GlucosePredictor,
+)
+from utils.insulin_activity import on_board_grid
+
+HYPO_THRESHOLD = 70  # mg/dL, same line as the app's low-glucose warning
+
+# kind -> (grid, input window length, forecast steps, ridge penalty)
+SCORING_KINDS = {
+    'hourly': (HOURLY_GRID, HOURLY_SEQUENCE_LENGTH, 6, 0.0),
+    'real_time': (REAL_TIME_GRID, REAL_TIME_SEQUENCE_LENGTH, 6, REAL_TIME_RIDGE),
+}
+OUTPUT_COLUMNS = ['patient_id', 'origin', 'timestamp', 'horizon_minutes', 'predicted', 'lower', 'upper',
+                  'hypo_predicted', 'hypo_risk']
+
+
+def load_patients(path):
+    """Patient histories from a directory of CSVs (one per patient) or one CSV with a patient_id column"""
+    if os.path.isdir(path):
+        frames = {
+            os.path.splitext(name)[0]: pd.read_csv(os.path.join(path, name))
+            for name in sorted(os.listdir(path)) if name.endswith('.csv')
+        }
+    else:
+        combined = pd.read_csv(path)
+        if 'patient_id' not in combined.columns:
+            raise ValueError(f"{path} has no patient_id column")
+        frames = {str(pid): group.drop(columns='patient_id') for pid, group in combined.groupby('patient_id')}
+
+    patients = {}
+    for patient_id, data in frames.items():
+        data['timestamp'] = pd.to_datetime(data['timestamp'])
+        for column in ('glucose_level', 'carbs', 'insulin'):
+            data[column] = pd.to_numeric(data[column], errors='coerce').fillna(0)
+        patients[patient_id] = data.sort_values('timestamp').reset_index(drop=True)
+    return patients
+
+
+def fit_patient(args):
+    """Fit one patient's model; returns (patient_id, origin, X_raw, FittedModel, error bounds) or None
+
+    The error bounds are the real-time model's rolling-origin (lower, upper)
+    in mg/dL, NaN without enough history to calibrate them; None for the
+    hourly model, whose bounds come with the fit.
+    """
+    patient_id, data, kind = args
+    grid, sequence_length, steps, alpha = SCORING_KINDS[kind]
+    predictor = GlucosePredictor()
+    if kind == 'hourly':
+        X_raw = predictor.hourly_features(data)
+    else:
+        X_raw = predictor.real_time_features(data, steps)
+    if X_raw is None:
+        return None
+    fitted = predictor.fit(X_raw, sequence_length, steps, alpha)
+    if fitted is None:
+        return None
+    bounds = None
+    if kind == 'real_time':
+        bounds = predictor.real_time_error_bounds(data, steps) or (np.full(steps, np.nan), np.full(steps, np.nan))
+    origin = on_board_grid(data, **grid).index[-1]
+    return patient_id, origin, X_raw, fitted, bounds
+
+
+def forecast_batch(fits):
+    """Forecast every patient in one pass: stacked windows times stacked coefficient tensors
+
+    Returns (predictions, lower, upper), each (n_patients, horizon) in mg/dL.
+    """
+    windows = np.vstack([
+        last_window(fitted.scaler.transform(X_raw[-fitted.sequence_length:]), fitted.sequence_length)
+        for _, _, X_raw, fitted, _ in fits
+    ])
+    design = np.hstack([windows, np.ones((len(windows), 1))])                # (n, p + 1)
+    weights = np.stack([np.vstack([fitted.model.coef_, fitted.model.intercept_])
+                        for _, _, _, fitted, _ in fits])                      # (n, p + 1, horizon)
+    error_lower = np.stack([fitted.model.error_lower_ for _, _, _, fitted, _ in fits])
+    error_upper = np.stack([fitted.model.error_upper_ for _, _, _, fitted, _ in fits])
+    mean = np.array([fitted.scaler.mean_[0] for _, _, _, fitted, _ in fits])[:, None]
+    scale = np.array([fitted.scaler.scale_[0] for _, _, _, fitted, _ in fits])[:, None]
+
+    scaled = np.einsum('np,nph->nh', design, weights)
+    predictions = scaled * scale + mean
+    lower, upper = (scaled + error_lower) * scale + mean, (scaled + error_upper) * scale + mean
+
+    # Calibrated out-of-sample bounds (mg/dL) replace the fit's own where given
+    calibrated = [i for i, (*_, bounds) in enumerate(fits) if bounds is not None]
+    if calibrated:
+        lower[calibrated] = predictions[calibrated] + np.stack([fits[i][4][0] for i in calibrated])
+        upper[calibrated] = predictions[calibrated] + np.stack([fits[i][4][1] for i in calibrated])
+    return predictions, lower, upper
+
+
+def score_patients(patients, kind='hourly', workers=None, threshold=HYPO_THRESHOLD):
+    """Forecast every patient and flag hypo risk; one output row per patient and horizon step
+
+    Per-patient refits are independent, so they fan out over a process pool;
+    the forecasts themselves are then one vectorized pass over all patients.
+    hypo_predicted means the forecast is below `threshold`, hypo_risk that
+    the lower 95% bound is.
+    """
+    tasks = [(patient_id, data, kind) for patient_id, data in patients.items()]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(tasks) <= 1:
+        fits = [fit_patient(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+            fits = list(pool.map(fit_patient, tasks, chunksize=max(1, len(tasks) // (4 * workers))))
+    fits = [fit for fit in fits if fit is not None]
+    if not fits:
+        return pd.DataFrame(columns=OUTPUT_COLUMNS)
+
+    predictions, lower, upper = forecast_batch(fits)
+    grid, _, steps, _ = SCORING_KINDS[kind]
+    step = pd.Timedelta(grid['freq'])
+    horizons = np.arange(1, steps + 1)
+    origins = np.repeat([origin for _, origin, *_ in fits], steps)
+    result = pd.DataFrame({
+        'patient_id': np.repeat([patient_id for patient_id, *_ in fits], steps),
+        'origin': origins,
+        'timestamp': pd.DatetimeIndex(origins) + np.tile(horizons, len(fits)) * step,
+        'horizon_minutes': np.tile(horizons * int(step.total_seconds() // 60), len(fits)),
+        'predicted': predictions.ravel(),
+        'lower': lower.ravel(),
+        'upper': upper.ravel(),
+    })
+    result['hypo_predicted'] = result['predicted'] < threshold
+    result['hypo_risk'] = result['lower'] < threshold
+    return result[OUTPUT_COLUMNS]
+
+
+def patients_without_forecast(patients, scores):
+    """Patient ids whose recent readings were too sparse to forecast"""
+    return sorted(set(patients) - set(scores['patient_id']))
@@ -0,0 +1,72 @@
+import numpy as np
+
+from models.intervals import block_bootstrap_bounds
+
+
+def ridge_penalty(n_columns, alpha):
+    """Ridge penalty matrix for a design whose last column is the intercept (left unpenalized)"""
+    penalty = alpha * np.eye(n_columns)
+    penalty[-1, -1] = 0.0
+    return penalty
+
+
+class DirectMultiHorizonForecaster:
+    """Linear forecaster that predicts every horizon step directly from one window
+
+    All horizons share the same design matrix, so fitting is a single
+    least-squares solve against a (n_samples, horizon) target matrix and
+    forecasting is a single matrix multiply. An optional ridge penalty
+    (`alpha`, not applied to the intercept) keeps short, collinear training
+    windows from producing wild extrapolations. Fitting also bootstraps the
+    leave-one-out residuals once into per-horizon error bounds, so intervals
+    cost nothing extra at forecast time; for short windows these understate
+    out-of-sample error, see GlucosePredictor.real_time_error_bounds.
+    """
+
+    def __init__(self, confidence=0.95, alpha=0.0):
+        self.confidence = confidence
+        self.alpha = alpha
+        self.coef_ = None       # (n_features, horizon)
+        self.intercept_ = None  # (horizon,)
+        self.error_lower_ = None  # (horizon,) residual quantiles added to the forecast
+        self.error_upper_ = None
+
+    @property
+    def horizon(self):
+        return 0 if self.coef_ is None else self.coef_.shape[1]
+
+    def fit(self, X, Y):
+        X = np.asarray(X, dtype=float)
+        Y = np.asarray(Y, dtype=float)
+        if Y.ndim == 1:
+            Y = Y[:, None]
+
+        design = np.hstack([X, np.ones((len(X), 1))])
+        if self.alpha > 0:
+            gram = design.T @ design + ridge_penalty(design.shape[1], self.alpha)
+            solution = np.linalg.solve(gram, design.T @ Y)
+            leverage = np.einsum('ij,ji->i', design, np.linalg.solve(gram, design.T))
+        else:
+            solution, _, _, _ = np.linalg.lstsq(design, Y, rcond=None)
+            U, singular, _ = np.linalg.svd(design, full_matrices=False)
+            U = U[:, singular > singular[0] * 1e-10]
+            leverage = (U ** 2).sum(axis=1)
+        self.coef_ = solution[:-1]
+        self.intercept_ = solution[-1]
+
+        # In-sample residuals understate out-of-sample error, badly so for the
+        # short real-time window; bootstrap leave-one-out residuals instead,
+        # which for (ridge) least squares are the residuals divided by 1 - leverage
+        leverage = np.minimum(leverage, 0.99)
+        residuals = (Y - design @ solution) / (1 - leverage)[:, None]
+        self.error_lower_, self.error_upper_ = block_bootstrap_bounds(residuals, self.confidence)
+        return self
+
+    def predict(self, X):
+        """Forecast the full horizon for each row of X, shape (n_rows, horizon)"""
+        return np.asarray(X, dtype=float) @ self.coef_ + self.intercept_
+
+    def predict_interval(self, X):
+        """Forecast plus lower and upper bounds at the fitted confidence, each (n_rows, horizon)"""
+        predictions = self.predict(X)
+        return predictions, predictions + self.error_lower_, predictions + self.error_upper_
@@ -0,0 +1,41 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def lagged_windows(X, sequence_length, target_col=0, horizon=1):
+    """Build the lagged design matrix and next-step targets from a feature array
+
+    Row i of the design matrix is X[i:i+sequence_length].flatten() and its target
+    is X[i+sequence_length, target_col] (or the next `horizon` values of that
+    column when horizon > 1). Windows are taken as strided, read-only views; for a
+    C-contiguous X the flattened design matrix is itself a view, so nothing is copied.
+    """
+    X = np.ascontiguousarray(X, dtype=float)
+    if X.ndim == 1:
+        X = X[:, None]
+    n_features = X.shape[1]
+    n_windows = len(X) - sequence_length - horizon + 1
+
+    if n_windows <= 0:
+        targets_shape = (0,) if horizon == 1 else (0, horizon)
+        return np.empty((0, sequence_length * n_features)), np.empty(targets_shape)
+
+    # (n, n_features, sequence_length) view -> (n, sequence_length, n_features)
+    windows = sliding_window_view(X, sequence_length, axis=0)[:n_windows]
+    design = windows.transpose(0, 2, 1).reshape(n_windows, sequence_length * n_features)
+
+    target_series = X[sequence_length:, target_col]
+    if horizon == 1:
+        targets = target_series[:n_windows]
+    else:
+        targets = sliding_window_view(target_series, horizon)[:n_windows]
+
+    return design, targets
+
+
+def last_window(X, sequence_length):
+    """Return the most recent window as a single design-matrix row"""
+    X = np.asarray(X, dtype=float)
+    if X.ndim == 1:
+        X = X[:, None]
+    return X[-sequence_length:].reshape(1, -1)
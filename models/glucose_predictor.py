@@ -1,111 +1,277 @@
+from collections import namedtuple
+import warnings
+
 import numpy as np
 from sklearn.preprocessing import StandardScaler
-from sklearn.linear_model import LinearRegression
-from datetime import datetime, timedelta
+import pandas as pd
+from models.direct_forecaster import DirectMultiHorizonForecaster, ridge_penalty
+from models.features import lagged_windows, last_window
+from models.intervals import block_bootstrap_bounds
+from models.kalman import KalmanGlucoseForecaster
+from models.model_cache import get_model_cache, training_key
+from models.sequence_model import get_sequence_forecaster
+from utils.insulin_activity import on_board_grid, project_effects
+
+# Insulin/carbs on board let the forecast see a bolus or meal that is still acting
+FEATURES = ['glucose_level', 'carbs', 'insulin', 'iob', 'cob']
+REAL_TIME_WINDOWS = 24  # training windows used by the short-term model (~2 hours)
+HOURLY_SEQUENCE_LENGTH = 3  # grid steps per input window
+REAL_TIME_SEQUENCE_LENGTH = 2
+# ~24 windows of 11 collinear features: without shrinkage the real-time fit
+# occasionally extrapolates by thousands of mg/dL
+REAL_TIME_RIDGE = 1.0
+# The real-time model only sees ~2 hours, so its own residuals say little about its error;
+# its bands come from re-fitting it at past origins over this much history and scoring the
+# forecasts it would have made (rolling-origin, out of sample)
+CALIBRATION_HISTORY = pd.Timedelta('2D')
+CALIBRATION_STRIDE = 3           # grid steps between calibration origins (15 minutes)
+MIN_CALIBRATION_ORIGINS = 30     # fewer scored forecasts than this and no band is given
+
+# Regular grids the predictors run on: hourly steps for the multi-hour view,
+# 5-minute steps for the real-time view
+HOURLY_GRID = {'freq': '1h', 'max_gap': '4h'}
+REAL_TIME_GRID = {'freq': '5min', 'max_gap': '30min'}
+KALMAN_WARMUP = pd.Timedelta('2D')  # history the state-space filter runs over per forecast
+MODEL_VERSION = 4  # part of the model cache key; bump when fitted model state changes shape
+
+class FittedModel(namedtuple('FittedModel', ['scaler', 'model', 'sequence_length'])):
+    """Immutable result of GlucosePredictor.fit: the feature scaler and forecaster for one training window"""
+    __slots__ = ()
+
+def _freeze(fitted):
+    # Fitted arrays are shared across threads and sessions, so make them read-only
+    for array in (fitted.scaler.mean_, fitted.scaler.scale_, fitted.scaler.var_, fitted.model.coef_,
+                  fitted.model.intercept_, fitted.model.error_lower_, fitted.model.error_upper_):
+        array.setflags(write=False)
+    return fitted
+
+def rolling_origin_errors(X_raw, train_steps, sequence_length, horizon, stride, alpha=0.0):
+    """Out-of-sample errors (actual - forecast, glucose units) of GlucosePredictor.fit at past origins
+
+    Origin o fits on rows o - train_steps .. o - 1 (scaled on those rows
+    alone, ridge penalty `alpha`) and forecasts rows o .. o + horizon - 1.
+    All origins are solved together as one stack of least-squares problems;
+    windows with unknown glucose are zeroed out of their origin's design,
+    which drops them from the fit.
+    Returns (n_origins, horizon) in time order, for origins whose forecast
+    window and targets are fully known.
+    """
+    X_raw = np.asarray(X_raw, dtype=float)
+    origins = np.arange(train_steps, len(X_raw) - horizon + 1, stride)
+    if len(origins) == 0:
+        return np.empty((0, horizon))
+    train = np.stack([X_raw[o - train_steps:o] for o in origins])       # (origins, train_steps, features)
+    actual = np.stack([X_raw[o:o + horizon, 0] for o in origins])       # (origins, horizon)
+    usable = ~np.isnan(actual).any(axis=1) & ~np.isnan(train[:, -sequence_length:, 0]).any(axis=1)
+    train, actual = train[usable], actual[usable]
+    if len(train) == 0:
+        return np.empty((0, horizon))
+
+    # StandardScaler per origin: NaN-aware mean/std, constant columns left unscaled
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # all-NaN columns
+        mean = np.nanmean(train, axis=1, keepdims=True)
+        scale = np.nanstd(train, axis=1, keepdims=True)
+    mean = np.nan_to_num(mean)
+    scale = np.where(np.nan_to_num(scale) > 0, np.nan_to_num(scale, nan=1.0), 1.0)
+    scaled = (train - mean) / scale
+
+    n_windows = train_steps - sequence_length - horizon + 1
+    rows = np.arange(n_windows)[:, None] + np.arange(sequence_length)[None, :]
+    design = scaled[:, rows].reshape(len(scaled), n_windows, -1)
+    targets = scaled[:, sequence_length + np.arange(n_windows)[:, None] + np.arange(horizon)[None, :], 0]
+    valid = ~np.isnan(design).any(axis=2) & ~np.isnan(targets).any(axis=2)
+    design = np.concatenate([np.where(valid[..., None], design, 0.0), valid[..., None].astype(float)], axis=2)
+    targets = np.where(valid[..., None], targets, 0.0)
+    if alpha > 0:
+        gram = np.swapaxes(design, 1, 2) @ design + ridge_penalty(design.shape[2], alpha)
+        solution = np.linalg.solve(gram, np.swapaxes(design, 1, 2) @ targets)
+    else:
+        solution = np.linalg.pinv(design) @ targets                      # (origins, features + 1, horizon)
+
+    window = np.concatenate([scaled[:, -sequence_length:].reshape(len(scaled), -1), np.ones((len(scaled), 1))],
+                            axis=1)
+    forecast = np.einsum('of,ofh->oh', window, solution) * scale[:, 0, :1] + mean[:, 0, :1]
+    fitted = valid.any(axis=1)
+    return (actual - forecast)[fitted]
 
 class GlucosePredictor:
-    def __init__(self):
-        self.scaler = StandardScaler()
-        self.model = LinearRegression()
-        self.short_term_model = LinearRegression()  # 用于实时预测
-
-    def _prepare_data(self, data, sequence_length=3):
-        features = ['glucose_level', 'carbs', 'insulin']
-        X = data[features].values
-        X = self.scaler.fit_transform(X)
-
-        sequences = []
-        targets = []
-        for i in range(len(X) - sequence_length):
-            sequences.append(X[i:i+sequence_length].flatten())
-            targets.append(X[i+sequence_length, 0])  # Next glucose level
-
-        return np.array(sequences), np.array(targets)
-
-    def predict(self, data):
-        """Predict next 6 hours of glucose levels"""
-        if len(data) < 3:
-            return []
+    """Stateless forecaster: fit returns a FittedModel and nothing is stored on the instance
+
+    One instance can serve every session and thread concurrently; fitted
+    models are shared through the process-wide model cache instead.
+    """
+
+    def __init__(self, cache=None):
+        # Fitted models keyed by training window and parameters
+        self.cache = cache
 
-        X, y = self._prepare_data(data)
-        if len(X) == 0:
-            return []
+    def _model_cache(self):
+        return self.cache if self.cache is not None else get_model_cache()
 
-        # Fit the model with available data
-        self.model.fit(X, y)
+    def fit(self, X_raw, sequence_length=3, horizon=1, alpha=0.0):
+        """Fit on grid features; returns a FittedModel, or None without a fully known window
 
-        # Prepare last sequence for prediction
-        last_sequence = data[['glucose_level', 'carbs', 'insulin']].values[-3:]
-        last_sequence = self.scaler.transform(last_sequence)
-        last_sequence = last_sequence.flatten().reshape(1, -1)
+        alpha is the ridge penalty on the standardized features.
+        """
+        scaler = StandardScaler()
+        X = scaler.fit_transform(X_raw)
 
-        # Predict next 6 hours
-        predictions = []
-        current_sequence = last_sequence.copy()
+        # The next `horizon` glucose levels after each window, keeping only windows whose glucose is fully known
+        sequences, targets = lagged_windows(X, sequence_length, target_col=0, horizon=horizon)
+        targets = targets.reshape(len(targets), -1)
+        valid = ~np.isnan(sequences).any(axis=1) & ~np.isnan(targets).any(axis=1)
+        if not valid.any():
+            return None
 
-        for _ in range(6):
-            pred = self.model.predict(current_sequence)[0]
-            predictions.append(pred)
+        # One least-squares solve fits every horizon step at once
+        model = DirectMultiHorizonForecaster(alpha=alpha).fit(sequences[valid], targets[valid])
+        return _freeze(FittedModel(scaler, model, sequence_length))
 
-            # Update sequence for next prediction
-            new_row = np.array([pred, 0, 0])  # Assuming no future carbs/insulin
-            current_sequence = np.roll(current_sequence, -3)
-            current_sequence[0, -3:] = new_row
+    def forecast(self, fitted, X_raw, with_intervals=False):
+        """Forecast the horizon after the last window of X_raw with a fitted model"""
+        window = last_window(fitted.scaler.transform(X_raw[-fitted.sequence_length:]), fitted.sequence_length)
 
-        # Inverse transform predictions
-        pred_array = np.array(predictions).reshape(-1, 1)
-        pred_array = np.hstack([pred_array, np.zeros((len(pred_array), 2))])
-        pred_array = self.scaler.inverse_transform(pred_array)[:, 0]
+        def to_glucose(scaled):
+            return np.asarray(scaled)[0] * fitted.scaler.scale_[0] + fitted.scaler.mean_[0]
 
-        return pred_array
+        if not with_intervals:
+            return to_glucose(fitted.model.predict(window))
+        predictions, lower, upper = (to_glucose(bound) for bound in fitted.model.predict_interval(window))
+        return predictions, lower, upper
 
-    def predict_real_time(self, data, minutes=30):
-        """Predict glucose levels for the next 30 minutes in 5-minute intervals"""
+    def _cached_fit(self, X_raw, method, sequence_length, horizon, grid, alpha=0.0):
+        # Reuse the fitted model if this training window was seen before
+        cache = self._model_cache()
+        key = training_key(X_raw, method=method, sequence_length=sequence_length, horizon=horizon,
+                           alpha=alpha, model_version=MODEL_VERSION, **grid)
+        fitted = cache.get(key)
+        if fitted is None:
+            fitted = self.fit(X_raw, sequence_length, horizon, alpha)
+            if fitted is not None:
+                cache.put(key, fitted)
+        return fitted
+
+    def hourly_features(self, data):
+        """Hourly grid features `predict` trains on, or None if the latest window is incomplete"""
+        if len(data) < 3:
+            return None
+        X_raw = on_board_grid(data, **HOURLY_GRID)[FEATURES].to_numpy(float)
+        if len(X_raw) < 3 or np.isnan(X_raw[-HOURLY_SEQUENCE_LENGTH:, 0]).any():
+            return None
+        return X_raw
+
+    def real_time_features(self, data, steps=6):
+        """Recent 5-minute grid features `predict_real_time` trains on, or None"""
         if len(data) < 12:  # Need at least 1 hour of data
-            return []
+            return None
+        # Recent grid steps for short-term prediction, long enough for REAL_TIME_WINDOWS training windows
+        grid = on_board_grid(data, **REAL_TIME_GRID)
+        X_raw = grid[FEATURES].to_numpy(float)[-(REAL_TIME_WINDOWS + REAL_TIME_SEQUENCE_LENGTH + steps - 1):]
+        if len(X_raw) < 12 or np.isnan(X_raw[-REAL_TIME_SEQUENCE_LENGTH:, 0]).any():
+            return None
+        return X_raw
+
+    def predict(self, data, hours=6, with_intervals=False):
+        """Predict the next `hours` hourly glucose levels (6 by default)
+
+        With with_intervals=True returns (predictions, lower, upper) 95% bounds
+        from the bootstrapped training residuals.
+        """
+        empty = ([], [], []) if with_intervals else []
+        X_raw = self.hourly_features(data)
+        if X_raw is None:
+            return empty
+
+        fitted = self._cached_fit(X_raw, 'predict', HOURLY_SEQUENCE_LENGTH, hours, HOURLY_GRID)
+        if fitted is None:
+            return empty
+        return self.forecast(fitted, X_raw, with_intervals)
 
-        # Prepare recent data for short-term prediction
-        recent_data = data.sort_values('timestamp').tail(12)
-        X = recent_data[['glucose_level', 'carbs', 'insulin']].values
-        X = self.scaler.fit_transform(X)
+    def predict_real_time(self, data, minutes=30, with_intervals=False):
+        """Predict glucose levels for the next `minutes` in 5-minute intervals
 
-        # Train short-term model
-        sequences, targets = [], []
-        for i in range(len(X) - 2):
-            sequences.append(X[i:i+2].flatten())
-            targets.append(X[i+2, 0])
+        With with_intervals=True returns (predictions, lower, upper), the bounds
+        being 95% rolling-origin bands from real_time_error_bounds, or empty
+        without enough history to calibrate them.
+        """
+        empty = ([], [], []) if with_intervals else []
+        steps = max(1, minutes // 5)
+        X_raw = self.real_time_features(data, steps)
+        if X_raw is None:
+            return empty
 
-        if len(sequences) == 0:
-            return []
+        # Train short-term model on every 5-minute step ahead at once
+        fitted = self._cached_fit(X_raw, 'predict_real_time', REAL_TIME_SEQUENCE_LENGTH, steps, REAL_TIME_GRID,
+                                  REAL_TIME_RIDGE)
+        if fitted is None:
+            return empty
+        predictions = self.forecast(fitted, X_raw)
+        if not with_intervals:
+            return predictions
+        bounds = self.real_time_error_bounds(data, steps)
+        if bounds is None:
+            return predictions, [], []
+        return predictions, predictions + bounds[0], predictions + bounds[1]
 
-        self.short_term_model.fit(sequences, targets)
+    def real_time_error_bounds(self, data, steps=6, confidence=0.95):
+        """Per-step (lower, upper) forecast-error bounds (mg/dL) for predict_real_time, or None
 
-        # Generate predictions for next 30 minutes (6 five-minute intervals)
-        predictions = []
-        current_sequence = X[-2:].flatten().reshape(1, -1)
+        The real-time model is re-fitted at origins every CALIBRATION_STRIDE
+        steps over the last CALIBRATION_HISTORY, exactly as predict_real_time
+        would have been at that time, and its forecasts are scored against the
+        readings that followed. The bounds are a block bootstrap of those
+        out-of-sample errors; None when too few forecasts could be scored.
+        """
+        grid = on_board_grid(data, **REAL_TIME_GRID)
+        train_steps = REAL_TIME_WINDOWS + REAL_TIME_SEQUENCE_LENGTH + steps - 1
+        history_steps = int(CALIBRATION_HISTORY / pd.Timedelta(REAL_TIME_GRID['freq']))
+        X_history = grid[FEATURES].to_numpy(float)[-(history_steps + train_steps):]
 
-        for _ in range(6):
-            pred = self.short_term_model.predict(current_sequence)[0]
-            predictions.append(pred)
+        cache = self._model_cache()
+        key = training_key(X_history, method='real_time_calibration', steps=steps, confidence=confidence,
+                           stride=CALIBRATION_STRIDE, alpha=REAL_TIME_RIDGE, model_version=MODEL_VERSION,
+                           **REAL_TIME_GRID)
+        bounds = cache.get(key)
+        if bounds is not None:
+            return bounds if len(bounds[0]) else None
 
-            # Update sequence
-            new_row = np.array([pred, 0, 0])
-            current_sequence = np.roll(current_sequence, -3)
-            current_sequence[0, -3:] = new_row
+        errors = rolling_origin_errors(X_history, train_steps, REAL_TIME_SEQUENCE_LENGTH, steps, CALIBRATION_STRIDE,
+                                       REAL_TIME_RIDGE)
+        if len(errors) < MIN_CALIBRATION_ORIGINS:
+            bounds = (np.empty(0), np.empty(0))
+        else:
+            bounds = block_bootstrap_bounds(errors, confidence)
+        for array in bounds:
+            array.setflags(write=False)
+        cache.put(key, bounds)
+        return bounds if len(bounds[0]) else None
 
-        # Inverse transform predictions
-        pred_array = np.array(predictions).reshape(-1, 1)
-        pred_array = np.hstack([pred_array, np.zeros((len(pred_array), 2))])
-        pred_array = self.scaler.inverse_transform(pred_array)[:, 0]
+    def predict_recurrent(self, data, with_intervals=False):
+        """Six-hour forecast from the offline-trained sequence model, or predict() without an artifact"""
+        forecaster = get_sequence_forecaster()
+        if forecaster is None:
+            return self.predict(data, with_intervals=with_intervals)
+        return forecaster.predict(data, with_intervals)
 
-        return pred_array
+    def predict_state_space(self, data, steps=6, grid=HOURLY_GRID, isf=50, carb_ratio=15):
+        """Kalman-filter forecast returning (predictions, lower, upper) 95% bounds
 
-    def get_prediction_intervals(self, predictions, confidence=0.95):
-        """Calculate prediction intervals"""
-        std_dev = np.std(predictions)
-        z_score = 1.96  # 95% confidence interval
+        Use grid=HOURLY_GRID for hourly steps or grid=REAL_TIME_GRID for 5-minute steps.
+        """
+        on_board = on_board_grid(data, **grid)
+        if on_board.empty or on_board['glucose_level'].isna().all():
+            return [], [], []
 
-        lower_bound = predictions - (z_score * std_dev)
-        upper_bound = predictions + (z_score * std_dev)
+        warmup_steps = max(1, int(KALMAN_WARMUP / pd.Timedelta(grid['freq'])))
+        forecaster = KalmanGlucoseForecaster(freq=grid['freq'], isf=isf, carb_ratio=carb_ratio)
+        forecaster.filter(on_board.iloc[-warmup_steps:])
 
-        return lower_bound, upper_bound
\ No newline at end of file
+        # Doses and meals already logged keep acting over the forecast horizon
+        future = project_effects(on_board, grid['freq'], steps)
+        predictions, lower, upper = forecaster.forecast(
+            steps, future['activity_short'].to_numpy(), future['carb_absorption'].to_numpy()
+        )
+        if len(predictions) == 0:
+            return [], [], []
+        return predictions, lower, upper
@@ -0,0 +1,31 @@
+import numpy as np
+
+N_RESAMPLES = 1000
+MAX_RESIDUALS = 500  # most recent windows used, bounding the resample tensor to ~N_RESAMPLES x 500 x horizon
+
+
+def block_bootstrap_bounds(residuals, confidence=0.95, n_resamples=N_RESAMPLES, block_size=None, seed=0):
+    """Lower/upper forecast-error quantiles per horizon from a block bootstrap of residuals
+
+    residuals is (n_windows, horizon) in time order. Overlapping windows make
+    neighbouring residuals correlated, so whole blocks of consecutive rows are
+    resampled (block_size defaults to the horizon), and each row keeps its
+    horizons together. All resamples are drawn and reduced as one
+    (n_resamples, n_windows, horizon) array; the bounds are the resample
+    average of the empirical quantiles.
+    """
+    residuals = np.asarray(residuals, dtype=float)[-MAX_RESIDUALS:]
+    n, horizon = residuals.shape
+    if n == 0:
+        return np.zeros(horizon), np.zeros(horizon)
+
+    block = max(1, min(block_size or horizon, n))
+    n_blocks = -(-n // block)
+    rng = np.random.default_rng(seed)
+    starts = rng.integers(0, n - block + 1, size=(n_resamples, n_blocks))
+    rows = (starts[:, :, None] + np.arange(block)).reshape(n_resamples, -1)[:, :n]
+
+    alpha = 1 - confidence
+    quantiles = np.quantile(residuals[rows], [alpha / 2, 1 - alpha / 2], axis=1)  # (2, n_resamples, horizon)
+    lower, upper = quantiles.mean(axis=1)
+    return lower, upper
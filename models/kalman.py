@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+
+# Noise levels per 5 minutes; scaled linearly with the grid step
+LEVEL_NOISE_PER_5MIN = 4.0        # (mg/dL)² random walk of the level
+TREND_NOISE_PER_5MIN = 0.25       # (mg/dL per step)² drift of the trend
+OBSERVATION_NOISE = 64.0          # (mg/dL)², roughly ±8 mg/dL meter/CGM error
+
+
+class KalmanGlucoseForecaster:
+    """Local linear trend Kalman filter with insulin and carb effects as inputs
+
+    State is [glucose level, trend per step]. Short-acting insulin activity
+    (units/step) lowers the level by `isf` mg/dL per unit and carb absorption
+    (g/step) raises it by isf / carb_ratio mg/dL per gram. Each update is O(1),
+    and forecasts carry their own variance, so intervals come from the model
+    rather than from the spread of the forecast.
+    """
+
+    def __init__(self, freq='5min', isf=50.0, carb_ratio=15.0, damping=0.9,
+                 level_noise=None, trend_noise=None, observation_noise=OBSERVATION_NOISE):
+        self.freq = freq
+        self.isf = isf
+        self.carb_ratio = carb_ratio
+        self.damping = damping
+        scale = pd.Timedelta(freq).total_seconds() / 300
+        level_noise = LEVEL_NOISE_PER_5MIN * scale if level_noise is None else level_noise
+        trend_noise = TREND_NOISE_PER_5MIN * scale if trend_noise is None else trend_noise
+
+        self.F = np.array([[1.0, 1.0], [0.0, damping]])
+        self.Q = np.diag([level_noise, trend_noise])
+        self.R = observation_noise
+        self.reset()
+
+    def reset(self):
+        self.x = None
+        self.P = np.diag([1e4, 1e2])
+        self.n_observations = 0
+
+    def _effect(self, insulin_activity, carb_absorption):
+        return -self.isf * insulin_activity + (self.isf / self.carb_ratio) * carb_absorption
+
+    def update(self, glucose, insulin_activity=0.0, carb_absorption=0.0):
+        """Advance one grid step and assimilate the glucose reading if known"""
+        if self.x is None:
+            if np.isnan(glucose):
+                return
+            self.x = np.array([glucose, 0.0])
+            self.n_observations = 1
+            return
+
+        # Time update
+        self.x = self.F @ self.x
+        self.x[0] += self._effect(insulin_activity, carb_absorption)
+        self.P = self.F @ self.P @ self.F.T + self.Q
+
+        # Measurement update (glucose only observes the level)
+        if not np.isnan(glucose):
+            innovation = glucose - self.x[0]
+            variance = self.P[0, 0] + self.R
+            gain = self.P[:, 0] / variance
+            self.x = self.x + gain * innovation
+            self.P = self.P - np.outer(gain, self.P[0, :])
+            self.n_observations += 1
+
+    def filter(self, grid):
+        """Run the filter over grid rows with glucose and activity columns"""
+        glucose = grid['glucose_level'].to_numpy(float)
+        insulin = grid['activity_short'].to_numpy(float) if 'activity_short' in grid else np.zeros(len(grid))
+        carbs = grid['carb_absorption'].to_numpy(float) if 'carb_absorption' in grid else np.zeros(len(grid))
+        for g, i, c in zip(glucose, insulin, carbs):
+            self.update(g, i, c)
+        return self
+
+    def forecast(self, steps, future_insulin=None, future_carbs=None, z=1.96):
+        """Forecast mean and (lower, upper) interval bounds for the next steps"""
+        if self.x is None:
+            return np.array([]), np.array([]), np.array([])
+
+        future_insulin = np.zeros(steps) if future_insulin is None else np.asarray(future_insulin, dtype=float)
+        future_carbs = np.zeros(steps) if future_carbs is None else np.asarray(future_carbs, dtype=float)
+        x = self.x.copy()
+        P = self.P.copy()
+        means = np.empty(steps)
+        variances = np.empty(steps)
+        for k in range(steps):
+            x = self.F @ x
+            x[0] += self._effect(future_insulin[k], future_carbs[k])
+            P = self.F @ P @ self.F.T + self.Q
+            means[k] = x[0]
+            variances[k] = P[0, 0] + self.R
+
+        spread = z * np.sqrt(variances)
+        return means, means - spread, means + spread
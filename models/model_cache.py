@@ -0,0 +1,116 @@
+import glob
+import hashlib
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+def training_key(*arrays, **params):
+    """Hash training arrays and hyper-parameters into a cache key"""
+    digest = hashlib.sha1()
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        digest.update(str((array.shape, array.dtype.str)).encode())
+        digest.update(array.tobytes())
+    digest.update(repr(sorted(params.items())).encode())
+    return digest.hexdigest()
+
+
+class ModelCache:
+    """Bounded LRU of fitted model state, optionally mirrored to disk"""
+
+    def __init__(self, max_entries=32, cache_dir=None):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def get(self, key):
+        """Return cached state for the key, or None on a miss"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+        state = self._load(key)
+        with self._lock:
+            if state is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._store(key, state)
+        return state
+
+    def put(self, key, state):
+        """Cache fitted state under the key"""
+        with self._lock:
+            self._store(key, state)
+        self._dump(key, state)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _store(self, key, state):
+        self._entries[key] = state
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _load(self, key):
+        if not self.cache_dir:
+            return None
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+
+    def _dump(self, key, state):
+        if not self.cache_dir:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            temp_path = f"{self._path(key)}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'wb') as f:
+                pickle.dump(state, f)
+            os.replace(temp_path, self._path(key))
+
+            # Keep the on-disk cache bounded as well
+            files = sorted(glob.glob(os.path.join(self.cache_dir, '*.pkl')), key=os.path.getmtime)
+            for old_file in files[:-self.max_entries]:
+                os.remove(old_file)
+        except OSError:
+            pass
+
+
+# Process-wide cache shared by every GlucosePredictor instance
+_default_cache = ModelCache()
+
+
+def get_model_cache():
+    """Return the process-wide model cache"""
+    return _default_cache
+
+
+def configure_model_cache(max_entries=32, cache_dir=None):
+    """Replace the process-wide model cache, e.g. to enable disk persistence"""
+    global _default_cache
+    if _default_cache.max_entries != max_entries or _default_cache.cache_dir != cache_dir:
+        _default_cache = ModelCache(max_entries=max_entries, cache_dir=cache_dir)
+    return _default_cache
@@ -0,0 +1,163 @@
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from utils.resampling import to_regular_grid
+
+FEATURES = ['glucose_level', 'carbs', 'insulin']
+# Fixed per-feature scales keep the RLS problem well conditioned without a fitted scaler
+FEATURE_SCALE = np.array([100.0, 50.0, 10.0])
+
+
+class RecursiveLeastSquaresPredictor:
+    """Online multi-horizon linear predictor updated one grid step at a time
+
+    Uses recursive least squares with an exponential forgetting factor, so each
+    update costs O(n_params²) regardless of how much history has been seen.
+    Steps are regular grid steps (hourly by default, matching
+    GlucosePredictor.predict); a step without a known glucose breaks the window.
+    """
+
+    def __init__(self, sequence_length=3, horizon=6, forgetting=0.99, delta=100.0,
+                 freq='1h', max_gap='4h'):
+        self.sequence_length = sequence_length
+        self.horizon = horizon
+        self.forgetting = forgetting
+        self.delta = delta
+        self.freq = freq
+        self.max_gap = max_gap
+
+        n_params = sequence_length * len(FEATURES) + 1  # lagged features + bias
+        self.theta = np.zeros((n_params, horizon))
+        self.P = np.eye(n_params) * delta
+        self.history = deque(maxlen=sequence_length + horizon)
+        self.n_updates = 0
+        self.last_timestamp = None  # start of the last consumed step, the forecast's anchor
+        self.last_reading = None    # latest glucose reading seen by advance()
+
+    @classmethod
+    def warm_start(cls, data, **params):
+        """Fit from history once, replaying its regular grid in time order"""
+        predictor = cls(**params)
+        predictor.advance(data)
+        return predictor
+
+    def advance(self, data):
+        """Feed the grid steps that became known since the last update"""
+        if data.empty:
+            return
+        timestamps = pd.to_datetime(data['timestamp'])
+        readings = timestamps[data['glucose_level'] > 0]
+        if readings.empty:
+            return
+        self.last_reading = readings.max()
+
+        # Only the tail after the last consumed step (plus one gap of context for
+        # interpolation) needs resampling. A step is consumed once it has closed (a
+        # later record exists, so no more carbs or insulin can land in it) and a
+        # reading at or after it fixes its glucose; the open step stays pending
+        if self.last_timestamp is not None:
+            data = data[timestamps >= pd.Timestamp(self.last_timestamp) - pd.Timedelta(self.max_gap)]
+        grid = to_regular_grid(data, freq=self.freq, max_gap=self.max_gap)
+        closed = (grid.index + pd.Timedelta(self.freq) <= timestamps.max()) & (grid.index <= readings.max())
+        new_steps = grid[closed]
+        if self.last_timestamp is not None:
+            new_steps = new_steps[new_steps.index > pd.Timestamp(self.last_timestamp)]
+
+        for timestamp, row in zip(new_steps.index, new_steps[FEATURES].to_numpy(float)):
+            self.update(row, timestamp)
+
+    def accepts(self, timestamp, is_reading=False):
+        """Whether a new record at `timestamp` leaves every consumed step as it was, so advance() can take it
+
+        Carbs and insulin only change the step they fall in, so they must come
+        after the last consumed one. A reading also re-interpolates the
+        glucose of steps back to the previous reading, so it must not be
+        older than that. Anything else needs a warm_start replay.
+        """
+        if self.last_timestamp is None:
+            return True
+        timestamp = pd.Timestamp(timestamp)
+        if timestamp < self.last_timestamp + pd.Timedelta(self.freq):
+            return False
+        return not is_reading or self.last_reading is None or timestamp >= self.last_reading
+
+    def _regressor(self, rows):
+        return np.append(np.asarray(rows).ravel(), 1.0)
+
+    def update(self, row, timestamp=None):
+        """Fold one glucose/carbs/insulin grid step into the coefficients"""
+        if timestamp is not None:
+            self.last_timestamp = pd.Timestamp(timestamp)
+        row = np.asarray(row, dtype=float)
+        if np.isnan(row[0]):
+            # Unknown glucose: no window can span this step
+            self.history.clear()
+            return
+
+        self.history.append(row / FEATURE_SCALE)
+        if len(self.history) < self.sequence_length + self.horizon:
+            return
+
+        # The window that ended `horizon` steps ago now has all its targets
+        rows = list(self.history)
+        x = self._regressor(rows[:self.sequence_length])
+        y = np.array([r[0] for r in rows[self.sequence_length:]])
+
+        Px = self.P @ x
+        gain = Px / (self.forgetting + x @ Px)
+        error = y - x @ self.theta
+        self.theta += np.outer(gain, error)
+        self.P = (self.P - np.outer(gain, Px)) / self.forgetting
+        self.n_updates += 1
+
+    def forecast(self):
+        """Forecast the `horizon` grid steps after the last consumed one, as a Series indexed by step time
+
+        Only closed steps are consumed, so the first forecast step is usually
+        the one still in progress, not the one after the latest record.
+        """
+        if self.n_updates == 0 or len(self.history) < self.sequence_length:
+            return pd.Series(dtype=float, name='glucose_level')
+        x = self._regressor(list(self.history)[-self.sequence_length:])
+        times = pd.date_range(self.last_timestamp + pd.Timedelta(self.freq), periods=self.horizon, freq=self.freq,
+                              name='timestamp')
+        return pd.Series((x @ self.theta) * FEATURE_SCALE[0], index=times, name='glucose_level')
+
+    def to_dict(self):
+        """Serialize the predictor state to plain Python types"""
+        return {
+            'sequence_length': self.sequence_length,
+            'horizon': self.horizon,
+            'forgetting': self.forgetting,
+            'delta': self.delta,
+            'freq': self.freq,
+            'max_gap': self.max_gap,
+            'theta': self.theta.tolist(),
+            'P': self.P.tolist(),
+            'history': [row.tolist() for row in self.history],
+            'n_updates': self.n_updates,
+            'last_timestamp': None if self.last_timestamp is None else str(self.last_timestamp),
+            'last_reading': None if self.last_reading is None else str(self.last_reading),
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        predictor = cls(
+            sequence_length=state['sequence_length'],
+            horizon=state['horizon'],
+            forgetting=state['forgetting'],
+            delta=state['delta'],
+            freq=state['freq'],
+            max_gap=state['max_gap'],
+        )
+        predictor.theta = np.array(state['theta'])
+        predictor.P = np.array(state['P'])
+        predictor.history.extend(np.array(row) for row in state['history'])
+        predictor.n_updates = state['n_updates']
+        if state['last_timestamp'] is not None:
+            predictor.last_timestamp = pd.Timestamp(state['last_timestamp'])
+        if state.get('last_reading') is not None:
+            predictor.last_reading = pd.Timestamp(state['last_reading'])
+        return predictor
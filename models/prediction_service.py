@@ -0,0 +1,86 @@
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+
+MAX_SLOTS = 256  # finished results kept; the least recently used are dropped as sessions come and go
+
+
+class PredictionService:
+    """Computes forecasts on worker threads and serves the latest result of each slot
+
+    A slot is one stream of forecasts, typically (session id, kind), so a
+    single process-wide service serves every browser session. Results are
+    keyed by the caller (typically the data version plus model settings). A
+    request for a key that is not ready yet schedules the work and
+    immediately returns the slot's last result, marked stale, so the page
+    can render without waiting on model fits. The predictors themselves are
+    safe to call from any number of threads.
+    """
+
+    def __init__(self, max_workers=None, max_slots=MAX_SLOTS):
+        max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='prediction')
+        self._lock = threading.Lock()
+        self.max_slots = max_slots
+        self._results = OrderedDict()  # slot -> (key, value or exception), least recently used first
+        self._pending = {}  # slot -> (key, future)
+
+    def _store(self, slot, key, value):
+        """Record a finished result (call with the lock held)"""
+        self._results[slot] = (key, value)
+        self._results.move_to_end(slot)
+        while len(self._results) > self.max_slots:
+            self._results.popitem(last=False)
+
+    def _run(self, slot, key, compute):
+        try:
+            value = compute()
+        except Exception as e:
+            value = e
+        with self._lock:
+            self._store(slot, key, value)
+            if slot in self._pending and self._pending[slot][0] == key:
+                del self._pending[slot]
+
+    def get(self, slot, key, compute, wait_seconds=0.0):
+        """Return (value, fresh) for the slot; value is the previous result while the key computes
+
+        Waits up to `wait_seconds` so quick forecasts still render in the same
+        run. An exception from compute is re-raised only for the key that
+        raised it; a failure from an older key is not served while the new
+        key computes.
+        """
+        with self._lock:
+            done = self._results.get(slot)
+            if done is not None:
+                self._results.move_to_end(slot)
+            if done is None or done[0] != key:
+                pending = self._pending.get(slot)
+                if pending is None or pending[0] != key:
+                    if pending is not None:
+                        pending[1].cancel()  # superseded before it started
+                    future = self._executor.submit(self._run, slot, key, compute)
+                    self._pending[slot] = pending = (key, future)
+
+        if done is None or done[0] != key:
+            if wait_seconds > 0:
+                wait([pending[1]], timeout=wait_seconds)
+            with self._lock:
+                done = self._results.get(slot)
+
+        fresh = done is not None and done[0] == key
+        value = None if done is None else done[1]
+        if isinstance(value, Exception):
+            if fresh:
+                raise value
+            value = None
+        return value, fresh
+
+    def is_busy(self, slot):
+        """Whether a forecast for this slot is still being computed"""
+        with self._lock:
+            return slot in self._pending
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
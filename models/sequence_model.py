@@ -0,0 +1,208 @@
+import importlib.util
+import json
+import os
+import threading
+from datetime import datetime
+
+import numpy as np
+
+from models.features import lagged_windows
+from models.intervals import block_bootstrap_bounds
+from utils.insulin_activity import on_board_grid
+
+# Trained artifact location, next to model_cache/ and meal_index.json
+SEQUENCE_MODEL_DIR = 'sequence_model'
+MODEL_FILE = 'model.keras'
+META_FILE = 'meta.json'
+METRICS_FILE = 'metrics.json'
+
+SEQUENCE_FEATURES = ['glucose_level', 'carbs', 'insulin', 'iob', 'cob']
+SEQUENCE_GRID = {'freq': '1h', 'max_gap': '4h'}
+MIN_TRAINING_WINDOWS = 200
+
+
+def has_sequence_model(path=SEQUENCE_MODEL_DIR):
+    """Whether a trained artifact exists (cheap; does not import TensorFlow)"""
+    return os.path.exists(os.path.join(path, MODEL_FILE))
+
+
+def sequence_model_available(path=SEQUENCE_MODEL_DIR):
+    """Whether forecasts would come from the sequence model rather than the linear fallback
+
+    Needs the artifact and an installed TensorFlow; neither check imports it.
+    """
+    return has_sequence_model(path) and importlib.util.find_spec('tensorflow') is not None
+
+
+def import_tensorflow():
+    """TensorFlow is optional and heavy; import it only when a sequence model is used"""
+    try:
+        import tensorflow as tf
+    except ImportError:
+        return None
+    return tf
+
+
+def sequence_windows(data, sequence_length=12, horizon=6):
+    """(n, sequence_length, n_features) input windows and (n, horizon) glucose targets from the hourly grid
+
+    Windows that contain an unknown glucose level are dropped.
+    """
+    X = on_board_grid(data, **SEQUENCE_GRID)[SEQUENCE_FEATURES].to_numpy(float)
+    design, targets = lagged_windows(X, sequence_length, target_col=0, horizon=horizon)
+    targets = targets.reshape(len(targets), -1)
+    valid = ~np.isnan(design).any(axis=1) & ~np.isnan(targets).any(axis=1)
+    return design[valid].reshape(-1, sequence_length, X.shape[1]), targets[valid]
+
+
+def build_model(tf, sequence_length, n_features, horizon, cell='gru', units=32):
+    """Small recurrent network mapping one window to every horizon step"""
+    layer = tf.keras.layers.GRU if cell == 'gru' else tf.keras.layers.LSTM
+    model = tf.keras.Sequential([
+        tf.keras.Input(shape=(sequence_length, n_features)),
+        layer(units),
+        tf.keras.layers.Dense(horizon),
+    ])
+    model.compile(optimizer=tf.keras.optimizers.Adam(1e-3), loss='mse')
+    return model
+
+
+def train_sequence_model(train_data, path=SEQUENCE_MODEL_DIR, sequence_length=12, horizon=6, cell='gru',
+                         units=32, epochs=200, seed=0):
+    """Train on the hourly grid of train_data and save the model and its metadata under path"""
+    tf = import_tensorflow()
+    if tf is None:
+        raise RuntimeError("TensorFlow is not installed; install it to train the sequence model")
+    tf.keras.utils.set_random_seed(seed)
+
+    X, Y = sequence_windows(train_data, sequence_length, horizon)
+    if len(X) < MIN_TRAINING_WINDOWS:
+        raise ValueError(f"Only {len(X)} complete training windows; need at least {MIN_TRAINING_WINDOWS}")
+
+    mean = X.reshape(-1, X.shape[2]).mean(axis=0)
+    scale = X.reshape(-1, X.shape[2]).std(axis=0)
+    scale[scale == 0] = 1.0
+    X_scaled = (X - mean) / scale
+    Y_scaled = (Y - mean[0]) / scale[0]
+
+    # Chronological validation split for early stopping
+    split = int(len(X) * 0.85)
+    model = build_model(tf, sequence_length, X.shape[2], horizon, cell=cell, units=units)
+    model.fit(
+        X_scaled[:split], Y_scaled[:split],
+        validation_data=(X_scaled[split:], Y_scaled[split:]),
+        epochs=epochs, batch_size=64, verbose=0,
+        callbacks=[tf.keras.callbacks.EarlyStopping(patience=15, restore_best_weights=True)],
+    )
+
+    # Validation residuals give the forecast bounds, as for the linear model
+    residuals = Y_scaled[split:] - model(X_scaled[split:], training=False).numpy()
+    error_lower, error_upper = block_bootstrap_bounds(residuals)
+
+    os.makedirs(path, exist_ok=True)
+    model.save(os.path.join(path, MODEL_FILE))
+    meta = {
+        'cell': cell,
+        'units': units,
+        'features': SEQUENCE_FEATURES,
+        'grid': SEQUENCE_GRID,
+        'sequence_length': sequence_length,
+        'horizon': horizon,
+        'mean': mean.tolist(),
+        'scale': scale.tolist(),
+        'error_lower': error_lower.tolist(),
+        'error_upper': error_upper.tolist(),
+        'training_windows': int(len(X)),
+        'trained_until': str(train_data['timestamp'].max()),
+        'trained_at': datetime.now().isoformat(timespec='seconds'),
+    }
+    with open(os.path.join(path, META_FILE), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+class SequenceForecaster:
+    """A trained recurrent model loaded for CPU inference; immutable once loaded"""
+
+    def __init__(self, model, meta):
+        self.model = model
+        self.meta = meta
+        self.sequence_length = meta['sequence_length']
+        self.horizon = meta['horizon']
+        self._mean = np.array(meta['mean'])
+        self._scale = np.array(meta['scale'])
+        self._error_lower = np.array(meta['error_lower'])
+        self._error_upper = np.array(meta['error_upper'])
+
+    @classmethod
+    def load(cls, path=SEQUENCE_MODEL_DIR):
+        """Load the artifact, or return None if it is absent or TensorFlow is unavailable"""
+        if not has_sequence_model(path):
+            return None
+        tf = import_tensorflow()
+        if tf is None:
+            return None
+        # Inference batches are small; keep them on the CPU
+        tf.config.set_visible_devices([], 'GPU')
+        model = tf.keras.models.load_model(os.path.join(path, MODEL_FILE))
+        with open(os.path.join(path, META_FILE), encoding='utf-8') as f:
+            meta = json.load(f)
+        return cls(model, meta)
+
+    def predict_batch(self, windows, with_intervals=False):
+        """Forecast a batch of raw (n, sequence_length, n_features) windows in mg/dL, shape (n, horizon)"""
+        scaled = (np.asarray(windows, dtype=float) - self._mean) / self._scale
+        output = self.model(scaled, training=False).numpy()
+        to_glucose = lambda values: values * self._scale[0] + self._mean[0]
+        if not with_intervals:
+            return to_glucose(output)
+        return to_glucose(output), to_glucose(output + self._error_lower), to_glucose(output + self._error_upper)
+
+    def latest_window(self, data):
+        """The most recent raw input window from the history, or None if its glucose is incomplete"""
+        X = on_board_grid(data, **SEQUENCE_GRID)[SEQUENCE_FEATURES].to_numpy(float)
+        window = X[-self.sequence_length:]
+        if len(window) < self.sequence_length or np.isnan(window).any():
+            return None
+        return window
+
+    def predict(self, data, with_intervals=False):
+        """Forecast the next `horizon` hourly glucose levels from a history, or [] if it cannot"""
+        window = self.latest_window(data)
+        if window is None:
+            return ([], [], []) if with_intervals else []
+        result = self.predict_batch(window[None], with_intervals)
+        if not with_intervals:
+            return result[0]
+        predictions, lower, upper = result
+        return predictions[0], lower[0], upper[0]
+
+
+_forecaster = None
+_forecaster_loaded = False
+_forecaster_lock = threading.Lock()
+
+
+def get_sequence_forecaster():
+    """Process-wide SequenceForecaster, loaded lazily on first use; None without an artifact"""
+    global _forecaster, _forecaster_loaded
+    with _forecaster_lock:
+        if not _forecaster_loaded:
+            if not has_sequence_model():
+                return None  # check again next time, in case it gets trained meanwhile
+            _forecaster = SequenceForecaster.load(SEQUENCE_MODEL_DIR)
+            _forecaster_loaded = True
+        return _forecaster
+
+
+def reset_sequence_forecaster():
+    """Forget the loaded model so the next use reloads the artifact (e.g. after retraining)"""
+    global _forecaster, _forecaster_loaded
+    with _forecaster_lock:
+        _forecaster = None
+        _forecaster_loaded = False
+
+
+def save_metrics(metrics, path=SEQUENCE_MODEL_DIR):
+    with open(os.path.join(path, METRICS_FILE), 'w', encoding='utf-8') as f:
+        json.dump(metrics, f, indent=2, default=str)
@@ -0,0 +1,267 @@
+import json
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from utils.bolus_calculator import TherapySchedule
+from utils.insulin_activity import on_board_grid
+
+WINDOW_HOURS = 3            # glucose change is measured over this long after each window start
+WINDOW_TOLERANCE = '30min'  # ... ending at the reading nearest that mark within this tolerance
+WINDOW_STRIDE = '30min'     # window starts are at least this far apart, so CGM windows don't all overlap
+MIN_NEW_EVENTS = 10         # meal/bolus records needed since the last fit before refitting
+PRIOR_WINDOWS = 3.0         # weight of the current schedule, in windows' worth of typical data
+# Windows overlap (a new one every 30 minutes, each 3 hours long) and glucose drift
+# carries over between them, so errors of windows starting within this long of each
+# other are treated as correlated (Bartlett-weighted HAC covariance)
+HAC_BANDWIDTH = pd.Timedelta(hours=2 * WINDOW_HOURS)
+# Typical window magnitudes (carbs absorbed g, bolus acting U, hours, glucose-hours/100) scaling the prior
+TYPICAL_FEATURES = np.array([40.0, 4.0, WINDOW_HOURS, 1.5 * WINDOW_HOURS])
+# Estimates outside these ranges are treated as failed fits
+CARB_RATIO_RANGE = (3.0, 50.0)  # g per unit
+ISF_RANGE = (10.0, 200.0)       # mg/dL per unit
+ESTIMATE_FORMAT_VERSION = 2
+
+
+def estimation_windows(data, hours=WINDOW_HOURS, freq='5min'):
+    """Windows from one glucose reading to another about `hours` later, with the carbs and bolus insulin acting
+
+    Returns a frame with start, glucose_change, carbs (g absorbed), insulin
+    (U of short-acting insulin activity), hours and level (mean glucose x
+    hours / 100, for the pull back towards normal). Only windows in which
+    carbs or bolus insulin acted are kept.
+    """
+    grid = on_board_grid(data, freq=freq)
+    glucose = grid['glucose_level'].to_numpy(float)
+    valid = np.flatnonzero(~np.isnan(glucose))
+    if len(valid) < 2:
+        return pd.DataFrame(columns=['start', 'glucose_change', 'carbs', 'insulin', 'hours', 'level',
+                                     'start_level'])
+
+    step = pd.Timedelta(freq)
+    steps = int(pd.Timedelta(hours=hours) / step)
+    tolerance = int(pd.Timedelta(WINDOW_TOLERANCE) / step)
+    stride = max(int(pd.Timedelta(WINDOW_STRIDE) / step), 1)
+
+    # Starts at most one per stride; ends at the valid reading nearest start + steps
+    starts = valid[np.unique(valid // stride, return_index=True)[1]]
+    after = np.clip(np.searchsorted(valid, starts + steps), 0, len(valid) - 1)
+    before = np.clip(after - 1, 0, len(valid) - 1)
+    ends = np.where(np.abs(valid[after] - starts - steps) <= np.abs(valid[before] - starts - steps),
+                    valid[after], valid[before])
+    keep = (np.abs(ends - starts - steps) <= tolerance) & (ends > starts)
+    starts, ends = starts[keep], ends[keep]
+
+    # Window sums over steps (start, end] from prefix sums
+    def window_sum(values):
+        prefix = np.concatenate([[0.0], np.cumsum(values)])
+        return prefix[ends + 1] - prefix[starts + 1]
+
+    observed = ~np.isnan(glucose)
+    mean_glucose = window_sum(np.where(observed, glucose, 0.0)) / np.maximum(window_sum(observed), 1)
+
+    window_hours = (ends - starts) * step / pd.Timedelta(hours=1)
+    windows = pd.DataFrame({
+        'start': grid.index[starts],
+        'glucose_change': glucose[ends] - glucose[starts],
+        'carbs': window_sum(grid['carb_absorption'].to_numpy(float)),
+        'insulin': window_sum(grid['activity_short'].to_numpy(float)),
+        'hours': window_hours,
+        'level': mean_glucose * window_hours / 100,
+        'start_level': glucose[starts] * window_hours / 100,
+    })
+    return windows[(windows['carbs'] > 0.5) | (windows['insulin'] > 0.05)].reset_index(drop=True)
+
+
+def fit_block(windows, carb_ratio, isf):
+    """Ridge fit of one block's windows, shrunk towards its current carb ratio and ISF
+
+    glucose_change = (ISF / CR) * carbs - ISF * insulin + drift * hours - pull * level.
+    Returns the estimates with their standard errors (delta method for the
+    carb ratio) and the number of windows; the estimates are None when the
+    block has no windows or the fit is outside the plausible ranges.
+    """
+    if windows.empty:
+        # Nothing to fit; the prior alone would just echo the current schedule back
+        return {'windows': 0, 'rmse': None, 'carb_ratio': None, 'isf': None,
+                'se_carb_ratio': None, 'se_isf': None}
+    # The window's mean glucose also carries the drift that moved it, so it enters through
+    # its fit on the exogenous features and the starting glucose (two-stage least squares)
+    Z = np.column_stack([windows['carbs'], -windows['insulin'], windows['hours'], -windows['start_level']])
+    level = -windows['level'].to_numpy(float)
+    if len(Z) > Z.shape[1]:
+        level = Z @ np.linalg.lstsq(Z, level, rcond=None)[0]
+    X = np.column_stack([Z[:, :3], level])
+    y = windows['glucose_change'].to_numpy(float)
+    prior = np.array([isf / carb_ratio, isf, 0.0, 0.0])
+    penalty = np.diag(PRIOR_WINDOWS * TYPICAL_FEATURES ** 2)
+
+    gram = X.T @ X + penalty
+    beta = np.linalg.solve(gram, X.T @ y + penalty @ prior)
+    residuals = y - X @ beta
+    dof = max(len(y) - X.shape[1], 1)
+    gram_inv = np.linalg.inv(gram)
+    if len(y) > X.shape[1]:
+        sigma2 = residuals @ residuals / dof
+        # Sandwich covariance with Bartlett weights on the time between window
+        # starts, since overlapping windows share their errors
+        starts = windows['start'].to_numpy('datetime64[ns]').astype(np.int64)
+        lag = np.abs(starts[:, None] - starts[None, :]) / HAC_BANDWIDTH.value
+        scores = X * residuals[:, None] * np.sqrt(len(y) / dof)
+        cov = gram_inv @ (scores.T @ np.clip(1 - lag, 0, None) @ scores) @ gram_inv
+    else:
+        # Without enough windows the residual variance is unknown; assume a generous 30 mg/dL
+        sigma2 = 30.0 ** 2
+        cov = sigma2 * gram_inv
+
+    carb_effect, sensitivity = beta[0], beta[1]
+    result = {'windows': len(y), 'rmse': float(np.sqrt(sigma2))}
+    estimated_ratio = sensitivity / carb_effect if carb_effect > 0 else np.nan
+    plausible = (CARB_RATIO_RANGE[0] <= estimated_ratio <= CARB_RATIO_RANGE[1]
+                 and ISF_RANGE[0] <= sensitivity <= ISF_RANGE[1])
+    if not plausible:
+        result.update({'carb_ratio': None, 'isf': None, 'se_carb_ratio': None, 'se_isf': None})
+        return result
+    gradient = np.array([-sensitivity / carb_effect ** 2, 1 / carb_effect])
+    result.update({
+        'carb_ratio': float(estimated_ratio),
+        'isf': float(sensitivity),
+        'se_carb_ratio': float(np.sqrt(gradient @ cov[:2, :2] @ gradient)),
+        'se_isf': float(np.sqrt(cov[1, 1])),
+    })
+    return result
+
+
+def confidence_level(estimate):
+    """'high', 'medium' or 'low' for the carb ratio, from the window count and its relative standard error
+
+    Only the carb ratio is rated. The ISF estimate is biased low by glucose
+    drift the model cannot tell apart from insulin action (about -10% on
+    synthetic histories, well outside its standard error), so it is reported
+    for reference and never rated adoptable.
+    """
+    if estimate['carb_ratio'] is None:
+        return 'low'
+    relative = estimate['se_carb_ratio'] / estimate['carb_ratio']
+    if estimate['windows'] >= 20 and relative <= 0.15:
+        return 'high'
+    if estimate['windows'] >= 8 and relative <= 0.3:
+        return 'medium'
+    return 'low'
+
+
+def estimate_therapy(data, blocks):
+    """Estimate carb ratio and ISF for each block of a schedule (given as its block dicts)
+
+    Runs in a worker process, so it takes and returns plain data.
+    """
+    schedule = TherapySchedule(blocks)
+    windows = estimation_windows(data)
+    block_of_window = schedule.block_index(windows['start']) if len(windows) else np.empty(0, dtype=int)
+    estimates = []
+    for index, block in enumerate(schedule.blocks):
+        in_block = windows[(block_of_window % len(schedule.blocks)) == index]
+        estimate = fit_block(in_block, block['carb_ratio'], block['isf'])
+        estimate['start'] = block['start']
+        estimate['confidence'] = confidence_level(estimate)
+        estimates.append(estimate)
+    return estimates
+
+
+def count_events(data):
+    """Meal and insulin records, the data that informs the estimates"""
+    if data.empty:
+        return 0
+    return int(((data['carbs'].fillna(0) > 0) | (data['insulin'].fillna(0) > 0)).sum())
+
+
+class TherapyEstimateService:
+    """Refits the estimates on a worker process once enough new meals and boluses are recorded
+
+    The last result is persisted so it survives restarts; get() never
+    blocks the page.
+    """
+
+    def __init__(self, path, min_new_events=MIN_NEW_EVENTS):
+        self.path = path
+        self.min_new_events = min_new_events
+        # A fresh interpreter rather than a fork of the multi-threaded app process
+        method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        self._executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context(method))
+        self._lock = threading.Lock()
+        self._pending = None  # (events, blocks, future)
+        self._failed = None   # (events, blocks) of the last fit that raised, not retried until new events
+        self.result = self.load(path)
+        self.error = None
+
+    @staticmethod
+    def load(path):
+        """The persisted estimates, or None if missing or unreadable"""
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, encoding='utf-8') as f:
+                payload = json.load(f)
+            if payload.get('version') != ESTIMATE_FORMAT_VERSION:
+                return None
+            return payload
+        except (OSError, ValueError):
+            return None
+
+    def _save(self, payload):
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(payload, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, self.path)
+
+    def _collect(self):
+        """Take a finished fit's result, if any (call with the lock held)"""
+        if self._pending is None or not self._pending[2].done():
+            return
+        events, blocks, future = self._pending
+        self._pending = None
+        try:
+            estimates = future.result()
+        except Exception as e:
+            self.error = e
+            self._failed = (events, blocks)
+            return
+        self.error = None
+        self._failed = None
+        self.result = {
+            'version': ESTIMATE_FORMAT_VERSION,
+            'fitted_at': datetime.now().isoformat(timespec='seconds'),
+            'events': events,
+            'blocks': blocks,
+            'estimates': estimates,
+        }
+        try:
+            self._save(self.result)
+        except OSError as e:
+            self.error = e
+
+    def get(self, data, schedule):
+        """Return (result or None, running), starting a refit if there is enough new data
+
+        A fit that raised is kept in `error` and not retried on the same data
+        until new events arrive or the schedule changes.
+        """
+        with self._lock:
+            self._collect()
+            events = count_events(data)
+            stale = (self.result is None or self.result['blocks'] != schedule.blocks
+                     or events - self.result['events'] >= self.min_new_events)
+            failed_before = (self._failed is not None and self._failed[1] == schedule.blocks
+                             and events <= self._failed[0])
+            if stale and self._pending is None and events >= self.min_new_events and not failed_before:
+                future = self._executor.submit(estimate_therapy, data, schedule.blocks)
+                self._pending = (events, schedule.blocks, future)
+            return self.result, self._pending is not None
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,47 @@
+"""Batch glucose forecasts and hypo-risk flags for many patients
+
+Usage: python score_patients.py PATIENTS [--kind hourly|real_time] [--output forecasts.csv] [--workers 4]
+
+PATIENTS is a directory with one diary CSV per patient (file name = patient id)
+or a single CSV with a patient_id column, in the user_data.csv layout.
+Use --synthetic N instead to score N simulated CGM patients.
+"""
+import argparse
+import time
+
+from models.batch_scoring import SCORING_KINDS, load_patients, patients_without_forecast, score_patients
+from utils.synthetic_cgm import synthetic_history
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('patients', nargs='?', help='directory of per-patient CSVs, or one CSV with patient_id')
+    source.add_argument('--synthetic', type=int, help='score this many simulated patients instead')
+    parser.add_argument('--kind', choices=list(SCORING_KINDS), default='hourly',
+                        help='hourly: next 6 hours; real_time: next 30 minutes')
+    parser.add_argument('--workers', type=int, default=None, help='process pool size for refits (default: all cores)')
+    parser.add_argument('--output', default='forecasts.csv')
+    args = parser.parse_args()
+
+    if args.synthetic:
+        patients = {f"synthetic_{i:03d}": synthetic_history(days=7, seed=i) for i in range(args.synthetic)}
+    else:
+        patients = load_patients(args.patients)
+    print(f"Loaded {len(patients)} patients")
+
+    start = time.perf_counter()
+    scores = score_patients(patients, kind=args.kind, workers=args.workers)
+    elapsed = time.perf_counter() - start
+
+    scores.to_csv(args.output, index=False)
+    at_risk = scores.loc[scores['hypo_risk'], 'patient_id'].nunique()
+    print(f"Scored {scores['patient_id'].nunique()} patients in {elapsed:.2f}s -> {args.output}")
+    print(f"Hypo risk within the horizon: {at_risk} patients")
+    skipped = patients_without_forecast(patients, scores)
+    if skipped:
+        print(f"Not enough recent readings to forecast: {', '.join(skipped)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,17 @@
+import numpy as np
+import pandas as pd
+
+from models.backtest import run_backtest
+from models.online_predictor import RecursiveLeastSquaresPredictor
+from utils.synthetic_cgm import synthetic_history
+
+
+def test_rls_is_scored_at_its_own_forecast_times():
+    data = synthetic_history(days=4, seed=4)
+    results = run_backtest(data, models=['rls'], n_folds=3, workers=1)
+    assert not results.empty
+    for origin, rows in results.groupby('origin'):
+        forecast = RecursiveLeastSquaresPredictor.warm_start(data[data['timestamp'] <= origin]).forecast()
+        times = origin.floor('1h') + rows['horizon'].to_numpy() * pd.Timedelta('1h')
+        assert (rows['horizon'] >= 1).all()
+        np.testing.assert_allclose(rows['predicted'], forecast.loc[times])
@@ -0,0 +1,27 @@
+import pandas as pd
+import pytest
+
+from utils.bolus_calculator import BolusCalculator, TherapySchedule
+from utils.synthetic_cgm import synthetic_history
+
+
+@pytest.mark.parametrize('start', ['25:90', '24:00', '12:60', '-1:30', '0630', 'noon', '1:2:3'])
+def test_invalid_block_start_is_rejected(start):
+    with pytest.raises(ValueError, match='block start'):
+        TherapySchedule.parse_start(start)
+
+
+def test_valid_block_start():
+    assert TherapySchedule.parse_start('00:00') == 0
+    assert TherapySchedule.parse_start('23:59') == 23 * 60 + 59
+
+
+def test_no_correction_without_a_reading():
+    calculator = BolusCalculator(TherapySchedule.constant(10, 50, 100))
+    data = synthetic_history(days=1, seed=0)
+    when = pd.Timestamp(data['timestamp'].max())
+    assert calculator.dose(data, 250, 0, when)['correction_dose'] == pytest.approx(3.0)
+    assert calculator.dose(data, None, 0, when)['correction_dose'] == 0
+    table = calculator.scenarios(data, None, [0, 30], [when, when + pd.Timedelta(hours=1)])
+    assert (table['correction_dose'] == 0).all()
+    assert table['carb_dose'].tolist() == [0, 3, 0, 3]
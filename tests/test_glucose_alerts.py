@@ -0,0 +1,17 @@
+import pandas as pd
+
+from utils.glucose_alerts import GlucoseAlertDetector
+
+
+def test_alerts_expire_with_the_latest_reading():
+    detector = GlucoseAlertDetector(max_age_minutes=60)
+    reading_time = pd.Timestamp('2025-01-01 08:00')
+    detector.update(reading_time, 55)
+
+    assert [alert['kind'] for alert in detector.active_alerts(reading_time + pd.Timedelta(minutes=30))] == ['low']
+    assert detector.current_glucose(reading_time + pd.Timedelta(minutes=30)) == 55
+    assert detector.active_alerts(reading_time + pd.Timedelta(days=2)) == []
+    assert detector.current_glucose(reading_time + pd.Timedelta(days=2)) is None
+    # Meal and insulin rows don't count as readings
+    detector.update(reading_time + pd.Timedelta(days=2), 0)
+    assert detector.active_alerts(reading_time + pd.Timedelta(days=2)) == []
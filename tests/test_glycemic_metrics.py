@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.glycemic_metrics import GlycemicMetrics
+from utils.synthetic_cgm import synthetic_history
+
+
+def history_with_duplicates(seed):
+    """Two days of synthetic records plus repeated readings at existing timestamps"""
+    rng = np.random.default_rng(seed)
+    data = synthetic_history(days=2, seed=seed)
+    readings = data[data['glucose_level'] > 0]
+    repeats = readings.sample(n=40, random_state=seed).copy()
+    repeats['glucose_level'] = repeats['glucose_level'] + rng.normal(0, 20, len(repeats))
+    # Drop some other readings so gaps and isolated readings occur too
+    data = data.drop(readings.drop(repeats.index).sample(frac=0.2, random_state=seed).index)
+    data = pd.concat([data, repeats], ignore_index=True)
+    return data.sort_values('timestamp', kind='stable').reset_index(drop=True)
+
+
+def test_incremental_extend_matches_from_data():
+    for seed in range(8):
+        data = history_with_duplicates(seed)
+        rng = np.random.default_rng(seed)
+        # Random chunks, some of them starting with a repeat of the previous chunk's last reading
+        repeated = np.flatnonzero(data['timestamp'].duplicated().to_numpy() & (data['glucose_level'] > 0).to_numpy())
+        cuts = np.union1d(rng.choice(np.arange(1, len(data)), size=60, replace=False), repeated[::2])
+
+        incremental = GlycemicMetrics()
+        for start, end in zip(np.r_[0, cuts], np.r_[cuts, len(data)]):
+            incremental.extend(data.iloc[start:end])
+        rebuilt = GlycemicMetrics.from_data(data)
+
+        assert incremental.start == rebuilt.start
+        np.testing.assert_allclose(incremental.glucose, rebuilt.glucose, equal_nan=True)
+        for name in rebuilt.prefix:
+            np.testing.assert_allclose(incremental.prefix[name], rebuilt.prefix[name], err_msg=name)
+        assert incremental.last_days(1) == pytest.approx(rebuilt.last_days(1), nan_ok=True)
@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+
+from models.online_predictor import RecursiveLeastSquaresPredictor
+from utils.synthetic_cgm import synthetic_history
+
+
+def test_incremental_advance_matches_warm_start():
+    data = synthetic_history(days=5, seed=1)
+    incremental = RecursiveLeastSquaresPredictor()
+    # Records arrive one at a time, so every hourly step is seen while still open
+    for end in range(1, len(data) + 1):
+        incremental.advance(data.iloc[:end])
+
+    replayed = RecursiveLeastSquaresPredictor.warm_start(data)
+    assert incremental.n_updates == replayed.n_updates > 0
+    assert incremental.last_timestamp == replayed.last_timestamp
+    np.testing.assert_allclose(incremental.theta, replayed.theta, rtol=1e-9, atol=1e-12)
+    np.testing.assert_allclose(incremental.forecast(), replayed.forecast(), rtol=1e-9)
+
+
+def test_backfilled_records_match_a_cold_refit():
+    data = synthetic_history(days=5, seed=2)
+    predictor = RecursiveLeastSquaresPredictor.warm_start(data)
+    step = pd.Timedelta(predictor.freq)
+    # A meal inside the last consumed step, then a bolus in the open one, as append_record sees them
+    for offset in (step / 3, step + step / 3):
+        record = {'timestamp': predictor.last_timestamp + offset, 'glucose_level': 0.0, 'carbs': 40.0,
+                  'insulin': 0.0}
+        data = pd.concat([data, pd.DataFrame([record])], ignore_index=True)
+        if predictor.accepts(record['timestamp'], record['glucose_level'] > 0):
+            predictor.advance(data)
+        else:
+            predictor = RecursiveLeastSquaresPredictor.warm_start(data)
+
+    replayed = RecursiveLeastSquaresPredictor.warm_start(data)
+    np.testing.assert_allclose(predictor.theta, replayed.theta, rtol=1e-9, atol=1e-12)
+    np.testing.assert_allclose(predictor.forecast(), replayed.forecast(), rtol=1e-9)
+
+
+def test_forecast_is_anchored_at_the_last_consumed_step():
+    data = synthetic_history(days=3, seed=3)
+    predictor = RecursiveLeastSquaresPredictor.warm_start(data)
+    forecast = predictor.forecast()
+    assert len(forecast) == predictor.horizon
+    assert forecast.index[0] == predictor.last_timestamp + pd.Timedelta(predictor.freq)
+    assert forecast.index[0] <= pd.Timestamp(data['timestamp'].max()).floor(predictor.freq)
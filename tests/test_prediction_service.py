@@ -0,0 +1,26 @@
+import threading
+
+import pytest
+
+from models.prediction_service import PredictionService
+
+
+def test_failure_from_an_older_key_is_not_reraised():
+    service = PredictionService(max_workers=1)
+
+    def fail():
+        raise ValueError('old data')
+
+    with pytest.raises(ValueError):
+        service.get('slot', 1, fail, wait_seconds=5)
+
+    # While the new key computes, the old key's failure is not served ...
+    release = threading.Event()
+    value, fresh = service.get('slot', 2, lambda: release.wait(5) and 'new')
+    assert (value, fresh) == (None, False)
+
+    # ... and once done the new result is
+    release.set()
+    value, fresh = service.get('slot', 2, lambda: 'unused', wait_seconds=5)
+    assert (value, fresh) == ('new', True)
+    service.shutdown()
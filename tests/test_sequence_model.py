@@ -0,0 +1,75 @@
+import numpy as np
+
+from models import backtest, glucose_predictor
+from models.glucose_predictor import GlucosePredictor
+from models.sequence_model import SEQUENCE_FEATURES, SequenceForecaster, sequence_windows
+from utils.synthetic_cgm import synthetic_history
+
+SEQUENCE_LENGTH = 12
+HORIZON = 6
+
+
+class RepeatLastGlucose:
+    """Stands in for the Keras model: forecasts the window's last (scaled) glucose at every step"""
+
+    class Output:
+        def __init__(self, values):
+            self.values = values
+
+        def numpy(self):
+            return self.values
+
+    def __call__(self, windows, training=False):
+        return self.Output(np.repeat(windows[:, -1:, 0], HORIZON, axis=1))
+
+
+def stub_forecaster(X):
+    features = X.reshape(-1, X.shape[2])
+    meta = {
+        'sequence_length': SEQUENCE_LENGTH,
+        'horizon': HORIZON,
+        'mean': features.mean(axis=0).tolist(),
+        'scale': features.std(axis=0).tolist(),
+        'error_lower': [-0.5] * HORIZON,
+        'error_upper': [0.5] * HORIZON,
+    }
+    return SequenceForecaster(RepeatLastGlucose(), meta)
+
+
+def test_windows_and_inference_path():
+    data = synthetic_history(days=6, seed=5)
+    X, Y = sequence_windows(data, SEQUENCE_LENGTH, HORIZON)
+    assert X.shape[1:] == (SEQUENCE_LENGTH, len(SEQUENCE_FEATURES))
+    assert Y.shape == (len(X), HORIZON)
+    assert len(X) > 0 and not np.isnan(X).any() and not np.isnan(Y).any()
+    # Targets are the glucose of the steps right after each window
+    np.testing.assert_allclose(Y[:-1, 0], X[1:, -1, 0])
+
+    forecaster = stub_forecaster(X)
+    predictions, lower, upper = forecaster.predict_batch(X[:5], with_intervals=True)
+    np.testing.assert_allclose(predictions, np.repeat(X[:5, -1:, 0], HORIZON, axis=1))
+    assert (lower < predictions).all() and (predictions < upper).all()
+
+    window = forecaster.latest_window(data)
+    assert window.shape == (SEQUENCE_LENGTH, len(SEQUENCE_FEATURES))
+    forecast = forecaster.predict(data)
+    np.testing.assert_allclose(forecast, np.full(HORIZON, window[-1, 0]))
+
+
+def test_predict_recurrent_uses_the_loaded_model(monkeypatch):
+    data = synthetic_history(days=6, seed=5)
+    forecaster = stub_forecaster(sequence_windows(data, SEQUENCE_LENGTH, HORIZON)[0])
+    monkeypatch.setattr(glucose_predictor, 'get_sequence_forecaster', lambda: forecaster)
+    predictions, lower, upper = GlucosePredictor().predict_recurrent(data, with_intervals=True)
+    np.testing.assert_allclose(predictions, forecaster.predict(data))
+
+
+def test_backtest_skips_recurrent_without_a_model(monkeypatch):
+    monkeypatch.setattr(backtest, 'sequence_model_available', lambda: False)
+    assert 'recurrent' not in backtest.runnable_models()
+    data = synthetic_history(days=3, seed=6)
+    results = backtest.run_backtest(data, models=['recurrent', 'linear'], n_folds=2, workers=1)
+    assert set(results['model']) == {'linear'}
+
+    monkeypatch.setattr(backtest, 'sequence_model_available', lambda: True)
+    assert backtest.runnable_models(['recurrent', 'linear']) == ['recurrent', 'linear']
@@ -0,0 +1,49 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from models import therapy_estimator
+from models.therapy_estimator import TherapyEstimateService, estimate_therapy
+from utils.bolus_calculator import TherapySchedule
+from utils.synthetic_cgm import synthetic_history
+
+
+def meal_and_bolus_records(days=3):
+    data = synthetic_history(days=days, seed=0)
+    events = data[(data['carbs'] > 0) | (data['insulin'] > 0)].copy()
+    events['glucose_level'] = 0
+    return events.reset_index(drop=True)
+
+
+def test_no_estimate_without_glucose_readings():
+    schedule = TherapySchedule.constant(10, 50, 100)
+    estimates = estimate_therapy(meal_and_bolus_records(), schedule.blocks)
+    assert [(e['windows'], e['carb_ratio'], e['isf'], e['confidence']) for e in estimates] == [(0, None, None, 'low')]
+
+
+def test_failed_fit_is_not_resubmitted_until_new_events(tmp_path, monkeypatch):
+    calls = []
+
+    def failing_estimate(data, blocks):
+        calls.append(len(data))
+        raise RuntimeError('fit failed')
+
+    monkeypatch.setattr(therapy_estimator, 'estimate_therapy', failing_estimate)
+    service = TherapyEstimateService(str(tmp_path / 'estimates.json'), min_new_events=1)
+    service._executor.shutdown()
+    service._executor = ThreadPoolExecutor(max_workers=1)
+    schedule = TherapySchedule.constant(10, 50, 100)
+    data = meal_and_bolus_records()
+
+    def settle(records):
+        service.get(records, schedule)
+        service._pending[2].exception()
+
+    settle(data.iloc[:-1])
+    for _ in range(3):
+        result, running = service.get(data.iloc[:-1], schedule)
+        assert (result, running) == (None, False)
+    assert isinstance(service.error, RuntimeError)
+    assert len(calls) == 1
+
+    settle(data)
+    assert len(calls) == 2
+    service.shutdown()
@@ -0,0 +1,71 @@
+"""Train the optional recurrent (GRU/LSTM) glucose model offline and record its backtest metrics
+
+Usage: python train_sequence_model.py [--data user_data.csv | --synthetic-days 60] [--cell gru|lstm]
+
+The model is trained on the first part of the history and backtested against
+the linear model on the held-out rest; the artifact (model.keras, meta.json)
+and metrics.json are written to sequence_model/, where the app and the
+backtest harness pick it up. Requires TensorFlow.
+"""
+import argparse
+
+import pandas as pd
+
+from models.backtest import accuracy_by_horizon, hypo_detection, latency, load_history, run_backtest
+from models.sequence_model import SEQUENCE_MODEL_DIR, reset_sequence_forecaster, save_metrics, train_sequence_model
+from utils.synthetic_cgm import synthetic_history
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--data', help='diary CSV in the user_data.csv layout')
+    source.add_argument('--synthetic-days', type=int, default=60, help='days of simulated 5-minute CGM data')
+    parser.add_argument('--cell', choices=['gru', 'lstm'], default='gru')
+    parser.add_argument('--units', type=int, default=32)
+    parser.add_argument('--sequence-length', type=int, default=12, help='hourly steps per input window')
+    parser.add_argument('--epochs', type=int, default=200)
+    parser.add_argument('--holdout', type=float, default=0.2, help='fraction of the time span kept for backtesting')
+    parser.add_argument('--folds', type=int, default=30)
+    parser.add_argument('--workers', type=int, default=1,
+                        help='backtest processes; each one loads TensorFlow, so keep this small')
+    args = parser.parse_args()
+
+    data = load_history(args.data) if args.data else synthetic_history(days=args.synthetic_days)
+    start, end = data['timestamp'].min(), data['timestamp'].max()
+    split = start + (end - start) * (1 - args.holdout)
+    train = data[data['timestamp'] <= split]
+
+    print(f"Training {args.cell.upper()} on {start} .. {split}")
+    try:
+        meta = train_sequence_model(train, sequence_length=args.sequence_length, cell=args.cell,
+                                    units=args.units, epochs=args.epochs)
+    except (RuntimeError, ValueError) as e:
+        parser.exit(1, f"{e}\n")
+    reset_sequence_forecaster()
+    print(f"{meta['training_windows']} windows; artifact saved to {SEQUENCE_MODEL_DIR}/")
+
+    print(f"Backtesting on {split} .. {end}")
+    results = run_backtest(data, models=['recurrent', 'linear'], n_folds=args.folds, workers=args.workers,
+                           start=split)
+    if results.empty:
+        print("Held-out period too short for any backtest origin; no metrics recorded")
+        return
+
+    accuracy = accuracy_by_horizon(results)
+    metrics = {
+        'holdout_start': split,
+        'folds': int(results['origin'].nunique()),
+        'accuracy': accuracy.to_dict('records'),
+        'hypo_detection': hypo_detection(results).to_dict('records'),
+        'latency': latency(results).to_dict('records'),
+    }
+    save_metrics(metrics)
+
+    with pd.option_context('display.float_format', '{:.1f}'.format):
+        print(accuracy.pivot(index='horizon_minutes', columns='model', values='mae').to_string())
+    print(f"Metrics saved to {SEQUENCE_MODEL_DIR}/metrics.json")
+
+
+if __name__ == '__main__':
+    main()
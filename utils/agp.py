@@ -0,0 +1,64 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from utils.resampling import VersionedCache, data_version
+
+AGP_PERCENTILES = (5, 25, 50, 75, 95)
+BIN_MINUTES = 5  # readings are binned at CGM resolution before being pooled into slots
+MINUTES_PER_DAY = 24 * 60
+
+
+def agp_percentiles(data, days=14, end=None, slot_minutes=15, percentiles=AGP_PERCENTILES):
+    """Glucose percentiles (mg/dL) by time of day over the `days` days before `end`
+
+    Readings are averaged into 5-minute bins of a (days x bins) array, which
+    is reshaped so each column pools every day's bins of one time-of-day slot;
+    all percentiles then come from a single nanpercentile over that array.
+    `end` defaults to midnight after the latest reading. Returns a frame
+    indexed by slot start (minutes after midnight) with one column per
+    percentile plus 'readings', the number of binned readings in the slot.
+    """
+    if slot_minutes % BIN_MINUTES or MINUTES_PER_DAY % slot_minutes:
+        raise ValueError(f"slot_minutes must be a multiple of {BIN_MINUTES} that divides a day")
+    slots = MINUTES_PER_DAY // slot_minutes
+    columns = [f"p{p}" for p in percentiles] + ['readings']
+    index = pd.Index(np.arange(slots) * slot_minutes, name='minute')
+
+    readings = data[data['glucose_level'] > 0]
+    if readings.empty:
+        return pd.DataFrame(np.nan, index=index, columns=columns)
+    timestamps = pd.to_datetime(readings['timestamp'])
+    end = timestamps.max().normalize() + pd.Timedelta(days=1) if end is None else pd.Timestamp(end).normalize()
+    start = end - pd.Timedelta(days=days)
+    in_window = ((timestamps >= start) & (timestamps < end)).to_numpy()
+
+    bins_per_day = MINUTES_PER_DAY // BIN_MINUTES
+    minutes = (timestamps[in_window] - start).dt.total_seconds().to_numpy() / 60
+    cell = (minutes // BIN_MINUTES).astype(int)  # day * bins_per_day + bin of day
+    glucose = readings['glucose_level'].to_numpy(float)[in_window]
+    sums = np.bincount(cell, weights=glucose, minlength=days * bins_per_day)
+    counts = np.bincount(cell, minlength=days * bins_per_day)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        binned = (sums / counts).reshape(days, bins_per_day)
+
+    # (days, slots, bins per slot) -> (days * bins per slot, slots): one column per slot
+    per_slot = slot_minutes // BIN_MINUTES
+    pooled = binned.reshape(days, slots, per_slot).transpose(0, 2, 1).reshape(days * per_slot, slots)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # slots without any reading
+        values = np.nanpercentile(pooled, percentiles, axis=0)
+
+    result = pd.DataFrame(values.T, index=index, columns=columns[:-1])
+    result['readings'] = (~np.isnan(pooled)).sum(axis=0)
+    return result
+
+
+_agp_cache = VersionedCache()
+
+
+def cached_agp_percentiles(data, days=14, end=None, slot_minutes=15):
+    """agp_percentiles cached per data version and window; treat the result as read-only"""
+    key = (data_version(data), days, None if end is None else pd.Timestamp(end).normalize(), slot_minutes)
+    return _agp_cache.get(key, lambda: agp_percentiles(data, days=days, end=end, slot_minutes=slot_minutes))
@@ -0,0 +1,158 @@
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from utils.insulin_activity import insulin_on_board_series
+
+SCHEDULE_FORMAT_VERSION = 1
+SCHEDULE_COLUMNS = ['start', 'carb_ratio', 'isf', 'target']
+
+# Same settings as DataProcessor's defaults, all day long
+DEFAULT_BLOCKS = [{'start': '00:00', 'carb_ratio': 15.0, 'isf': 50.0, 'target': 120.0}]
+
+
+def minute_of_day(times):
+    times = pd.DatetimeIndex(pd.to_datetime(pd.Series(times)))
+    return (times.hour * 60 + times.minute).to_numpy()
+
+
+class TherapySchedule:
+    """Carb ratio (g/U), ISF (mg/dL per U) and target (mg/dL) by time-of-day block
+
+    Each block starts at an HH:MM time and lasts until the next one; the
+    last block wraps past midnight up to the first, so a lookup for any
+    number of times is one searchsorted.
+    """
+
+    def __init__(self, blocks=None):
+        blocks = sorted(blocks or DEFAULT_BLOCKS, key=lambda block: self.parse_start(block['start']))
+        self.blocks = [
+            {'start': block['start'], 'carb_ratio': float(block['carb_ratio']), 'isf': float(block['isf']),
+             'target': float(block['target'])}
+            for block in blocks
+        ]
+        for block in self.blocks:
+            if block['carb_ratio'] <= 0 or block['isf'] <= 0:
+                raise ValueError(f"carb ratio and ISF must be positive ({block['start']})")
+        self.starts = np.array([self.parse_start(block['start']) for block in self.blocks])
+        if len(np.unique(self.starts)) != len(self.starts):
+            raise ValueError("two blocks start at the same time")
+        self.carb_ratio = np.array([block['carb_ratio'] for block in self.blocks])
+        self.isf = np.array([block['isf'] for block in self.blocks])
+        self.target = np.array([block['target'] for block in self.blocks])
+
+    @staticmethod
+    def parse_start(start):
+        """Minute of day of an HH:MM block start"""
+        parts = str(start).strip().split(':')
+        try:
+            hours, minutes = (int(part) for part in parts)
+        except ValueError:
+            raise ValueError(f"block start must be HH:MM, got {start!r}") from None
+        if not (0 <= hours < 24 and 0 <= minutes < 60):
+            raise ValueError(f"block start must be between 00:00 and 23:59, got {start!r}")
+        return hours * 60 + minutes
+
+    @classmethod
+    def constant(cls, carb_ratio, isf, target):
+        return cls([{'start': '00:00', 'carb_ratio': carb_ratio, 'isf': isf, 'target': target}])
+
+    @classmethod
+    def from_frame(cls, frame):
+        """From an edited table with SCHEDULE_COLUMNS; incomplete rows are ignored"""
+        rows = frame[SCHEDULE_COLUMNS].dropna()
+        return cls(rows.to_dict('records'))
+
+    def to_frame(self):
+        return pd.DataFrame(self.blocks, columns=SCHEDULE_COLUMNS)
+
+    def block_index(self, times):
+        """Index of the block in effect at each time (-1, i.e. the last block, before the first start)"""
+        return np.searchsorted(self.starts, minute_of_day(times), side='right') - 1
+
+    def settings_at(self, times):
+        """(carb_ratio, isf, target) arrays for the given times"""
+        index = self.block_index(times)
+        return self.carb_ratio[index], self.isf[index], self.target[index]
+
+    def save(self, path):
+        """Persist the schedule as JSON next to the data files"""
+        payload = {'version': SCHEDULE_FORMAT_VERSION, 'saved_at': datetime.now().isoformat(), 'blocks': self.blocks}
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(payload, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Load a persisted schedule, or None if missing or unreadable"""
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, encoding='utf-8') as f:
+                payload = json.load(f)
+            if payload.get('version') != SCHEDULE_FORMAT_VERSION:
+                return None
+            return cls(payload['blocks'])
+        except (OSError, ValueError, KeyError):
+            return None
+
+
+class BolusCalculator:
+    """Meal + correction bolus from a TherapySchedule, less short-acting insulin on board
+
+    Every argument of `doses` broadcasts, so a whole table of scenarios
+    (carb amounts x dosing times) is one vectorized evaluation.
+    """
+
+    def __init__(self, schedule=None, increment=0.1):
+        self.schedule = schedule or TherapySchedule()
+        self.increment = increment  # pen/pump dose step
+
+    def doses(self, glucose, carbs, times, insulin_on_board=0.0):
+        """Dose breakdown for arrays of glucose (mg/dL), carbs (g), times and IOB (U)
+
+        Returns a dict of arrays: carb_ratio, isf, target, carb_dose,
+        correction_dose, insulin_on_board and dose (rounded to the increment,
+        never negative). A glucose of None or NaN (no current reading) adds
+        no correction.
+        """
+        carb_ratio, isf, target = self.schedule.settings_at(np.ravel(times))
+        shape = np.shape(times)
+        carb_ratio, isf, target = carb_ratio.reshape(shape), isf.reshape(shape), target.reshape(shape)
+
+        glucose = np.asarray(glucose, dtype=float)
+        carb_dose = np.asarray(carbs, dtype=float) / carb_ratio
+        correction_dose = np.where(glucose > target, (glucose - target) / isf, 0.0)
+        total = np.maximum(carb_dose + correction_dose - insulin_on_board, 0.0)
+        return {
+            'carb_ratio': carb_ratio,
+            'isf': isf,
+            'target': target,
+            'carb_dose': carb_dose,
+            'correction_dose': correction_dose,
+            'insulin_on_board': np.broadcast_to(insulin_on_board, np.shape(total)),
+            'dose': np.round(np.round(total / self.increment) * self.increment, 2),
+        }
+
+    def dose(self, data, glucose, carbs, when):
+        """Single recommendation at `when`, subtracting IOB from the recorded short-acting doses"""
+        iob = insulin_on_board_series(data, [when])
+        result = self.doses(glucose, carbs, [when], iob)
+        return {key: float(np.ravel(value)[0]) for key, value in result.items()}
+
+    def scenarios(self, data, glucose, carb_options, times):
+        """Dose table for every (time, carbs) pair, IOB evaluated at each time in one pass"""
+        times = pd.to_datetime(pd.Series(times)).to_numpy()
+        carb_options = np.asarray(carb_options, dtype=float)
+        iob = insulin_on_board_series(data, times)[:, None]  # (n_times, 1)
+        result = self.doses(glucose, carb_options[None, :], np.repeat(times[:, None], len(carb_options), axis=1),
+                            iob)
+        table = pd.DataFrame({key: np.ravel(np.broadcast_to(value, (len(times), len(carb_options))))
+                              for key, value in result.items()})
+        table.insert(0, 'carbs', np.tile(carb_options, len(times)))
+        table.insert(0, 'time', np.repeat(times, len(carb_options)))
+        return table
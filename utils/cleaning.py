@@ -0,0 +1,133 @@
+import os
+
+import pandas as pd
+
+CHUNK_SIZE = 100_000  # rows per chunk read from an archive
+LATENESS = pd.Timedelta('1h')  # how far behind the newest row an out-of-order row may still arrive
+# Columns identifying a diary record; rows equal on all of them are exact repeats
+RECORD_KEY = ('timestamp', 'glucose_level', 'carbs', 'insulin', 'insulin_type')
+DEFAULT_COLUMNS = {'insulin_type': '', 'injection_site': ''}
+
+
+def read_chunks(path, chunksize=CHUNK_SIZE):
+    """Parse a diary/CGM CSV chunk by chunk, coercing timestamps and numbers per chunk"""
+    for chunk in pd.read_csv(path, chunksize=chunksize):
+        chunk['timestamp'] = pd.to_datetime(chunk['timestamp'])
+        for column in ('glucose_level', 'carbs', 'insulin'):
+            if column in chunk.columns:
+                chunk[column] = pd.to_numeric(chunk[column], errors='coerce')
+        yield chunk
+
+
+def frame_chunks(data, chunksize=CHUNK_SIZE):
+    """Split an in-memory frame into consecutive chunks"""
+    for start in range(0, len(data), chunksize):
+        yield data.iloc[start:start + chunksize]
+
+
+def sort_merge(chunks, lateness=LATENESS):
+    """Yield rows in timestamp order from mostly time-ordered chunks
+
+    Each chunk is sorted and merged with the rows held back from the previous
+    one; only rows older than the newest timestamp minus `lateness` are
+    released, so memory stays bounded by the chunk size plus the lateness
+    window. lateness=None sorts everything at once. A row that arrives after
+    its slot was already released raises ValueError.
+    """
+    pending = None
+    released_until = None
+    for chunk in chunks:
+        if chunk.empty:
+            continue
+        if released_until is not None and chunk['timestamp'].min() < released_until:
+            raise ValueError(f"rows before {released_until} arrived after that period was written; "
+                             "increase lateness or sort the archive first")
+        merged = chunk if pending is None else pd.concat([pending, chunk])
+        merged = merged.sort_values('timestamp', kind='stable')
+        if lateness is None:
+            pending = merged
+            continue
+        watermark = merged['timestamp'].iloc[-1] - lateness
+        ready = (merged['timestamp'] < watermark).to_numpy()
+        if ready.any():
+            released_until = watermark
+            yield merged[ready]
+        pending = merged[~ready]
+    if pending is not None and not pending.empty:
+        yield pending
+
+
+def drop_duplicate_timestamps(chunks, subset=('timestamp',)):
+    """Drop rows repeating an earlier row on `subset`, within and across chunk boundaries
+
+    Chunks must be time-ordered; the rows at the previous chunk's last
+    timestamp are carried over, since only they can be repeated later.
+    """
+    subset = list(subset)
+    tail = None
+    for chunk in chunks:
+        if tail is not None:
+            seen = pd.MultiIndex.from_frame(tail[subset])
+            chunk = chunk[~pd.MultiIndex.from_frame(chunk[subset]).isin(seen)]
+        chunk = chunk.drop_duplicates(subset=subset)
+        if chunk.empty:
+            continue
+        last = chunk['timestamp'].iloc[-1]
+        at_last = chunk[chunk['timestamp'] == last]
+        tail = pd.concat([tail, at_last]) if tail is not None and tail['timestamp'].iloc[-1] == last else at_last
+        yield chunk
+
+
+def forward_fill(chunks, columns=('glucose_level',)):
+    """Forward-fill missing values, continuing from the last value of the previous chunk"""
+    carry = {}
+    for chunk in chunks:
+        chunk = chunk.copy()
+        for column in columns:
+            filled = chunk[column].ffill()
+            if column in carry:
+                filled = filled.fillna(carry[column])
+            chunk[column] = filled
+            last_valid = filled.last_valid_index()
+            if last_valid is not None:
+                carry[column] = filled.loc[last_valid]
+        yield chunk
+
+
+def fill_defaults(chunks):
+    """No carbs/insulin means zero; add the insulin_type/injection_site columns older files lack"""
+    for chunk in chunks:
+        chunk['carbs'] = chunk['carbs'].fillna(0)
+        chunk['insulin'] = chunk['insulin'].fillna(0)
+        for column, default in DEFAULT_COLUMNS.items():
+            if column not in chunk.columns:
+                chunk[column] = default
+        yield chunk
+
+
+def clean_chunks(chunks, lateness=LATENESS, subset=('timestamp',)):
+    """The full cleaning pipeline: sort-merge, de-duplicate, forward-fill glucose, fill defaults"""
+    chunks = sort_merge(chunks, lateness)
+    chunks = drop_duplicate_timestamps(chunks, subset)
+    chunks = forward_fill(chunks)
+    return fill_defaults(chunks)
+
+
+def clean_csv(source, destination, chunksize=CHUNK_SIZE, lateness=LATENESS, subset=('timestamp',)):
+    """Stream `source` through the pipeline into `destination`; returns the number of rows written
+
+    The output is written to a temporary file and moved into place only once
+    the whole archive has been cleaned.
+    """
+    partial = destination + '.partial'
+    written = 0
+    with open(partial, 'w', encoding='utf-8', newline='') as f:
+        for chunk in clean_chunks(read_chunks(source, chunksize), lateness, subset):
+            chunk.to_csv(f, index=False, header=written == 0)
+            written += len(chunk)
+        if written == 0:
+            columns = pd.read_csv(source, nrows=0).columns.tolist()
+            columns += [column for column in DEFAULT_COLUMNS if column not in columns]
+            pd.DataFrame(columns=columns).to_csv(f, index=False)
+    os.replace(partial, destination)
+    return written
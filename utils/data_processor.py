@@ -1,6 +1,7 @@
 import pandas as pd
-import numpy as np
-from datetime import datetime, timedelta
+from datetime import datetime
+from utils.cleaning import clean_chunks, frame_chunks
+from utils.insulin_profile import InsulinProfile
 
 class DataProcessor:
     def __init__(self):
@@ -9,8 +10,8 @@ class DataProcessor:
         self.correction_factor = 50  # 1 unit reduces glucose by 50 mg/dL
         self.target_glucose = 120  # Target blood glucose level
 
-    def calculate_insulin_dose(self, current_glucose, carbs):
-        """Calculate recommended insulin dose based on current glucose and carbs"""
+    def calculate_insulin_dose(self, current_glucose, carbs, insulin_on_board=0):
+        """Calculate recommended insulin dose based on current glucose, carbs and active insulin"""
         # Carb coverage
         carb_dose = carbs / self.carb_ratio
 
@@ -19,52 +20,39 @@ class DataProcessor:
         if current_glucose > self.target_glucose:
             correction_dose = (current_glucose - self.target_glucose) / self.correction_factor
 
-        total_dose = carb_dose + correction_dose
+        # Insulin still acting from recent boluses is subtracted
+        total_dose = carb_dose + correction_dose - insulin_on_board
         return max(0, round(total_dose, 1))
 
-    def process_glucose_data(self, data):
-        """Process and clean glucose data"""
+    def process_glucose_data(self, data, chunksize=None):
+        """Process and clean glucose data
+
+        Sorts, removes duplicate timestamps, forward-fills glucose and fills
+        defaults via the chunked cleaning pipeline; with `chunksize` the frame
+        is streamed through it in time-ordered chunks.
+        """
         if data.empty:
             return pd.DataFrame()
 
-        # Sort by timestamp
-        data = data.sort_values('timestamp')
-
-        # Remove duplicates
-        data = data.drop_duplicates(subset=['timestamp'])
-
-        # Fill missing values
-        data['glucose_level'] = data['glucose_level'].fillna(method='ffill')
-        data['carbs'] = data['carbs'].fillna(0)
-        data['insulin'] = data['insulin'].fillna(0)
-
-        # Fill new columns with default values if they don't exist
-        if 'insulin_type' not in data.columns:
-            data['insulin_type'] = ''
-        if 'injection_site' not in data.columns:
-            data['injection_site'] = ''
-
-        return data
-
-    def predict_insulin_needs(self, data, future_hours=24):
-        """Predict future insulin needs based on historical patterns"""
-        if len(data) < 24:  # Need at least 24 hours of data
+        if chunksize is None:
+            chunks = clean_chunks([data], lateness=None)
+        else:
+            chunks = clean_chunks(frame_chunks(data.sort_values('timestamp', kind='stable'), chunksize))
+        return pd.concat(list(chunks))
+
+    def predict_insulin_needs(self, data, future_hours=24, profile=None, kind=None):
+        """Predict insulin units for each coming hour from the hour-of-day insulin profile
+
+        Pass a maintained InsulinProfile to skip rebuilding it from `data`;
+        kind='basal' or 'bolus' restricts the forecast to that insulin kind.
+        """
+        if profile is None:
+            if len(data) < 24:  # Need at least 24 records
+                return []
+            profile = InsulinProfile.from_data(data)
+        if profile.observed_days == 0:
             return []
-
-        # Get recent data patterns
-        hourly_insulin = data.set_index('timestamp').resample('H')['insulin'].mean()
-        hourly_pattern = hourly_insulin.groupby(hourly_insulin.index.hour).mean()
-
-        # Generate predictions
-        predictions = []
-        current_hour = datetime.now().hour
-
-        for i in range(future_hours):
-            hour = (current_hour + i) % 24
-            predicted_insulin = hourly_pattern.get(hour, hourly_pattern.mean())
-            predictions.append(predicted_insulin)
-
-        return predictions
+        return profile.forecast(datetime.now(), future_hours, kind=kind).tolist()
 
     def analyze_injection_sites(self, data):
         """Analyze insulin injection site rotation patterns"""
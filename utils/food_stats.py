@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+
+# Diary items carry their carbs inline, e.g. "抹茶鮮奶(10)", while items added
+# through the meal form are stored as "米饭 (30.0g碳水)" joined by "; "
+MEAL_ITEM_PATTERN = (
+    r'(?:^|(?<=;))\s*(?P<form_name>[^;()]+?)\s\((?P<form>\d+(?:\.\d+)?)g碳水\)'
+    r'|(?P<name>[^\s();；]+)\((?P<inline>\d+(?:\.\d+)?)\)'
+)
+
+
+def normalize_food_name(name):
+    """Normalize a food name so retyped items map to the same key"""
+    return ' '.join(str(name).split()).lower()
+
+
+def parse_meal_items(food_details):
+    """Parse a Series of food details into one row per item with logged carbs"""
+    details = pd.Series(food_details).dropna().astype(str)
+    if details.empty:
+        return pd.DataFrame(columns=['record', 'name', 'carbs'])
+
+    items = details.str.extractall(MEAL_ITEM_PATTERN)
+    if items.empty:
+        return pd.DataFrame(columns=['record', 'name', 'carbs'])
+
+    names = items['name'].fillna(items['form_name'])
+    carbs = items['inline'].fillna(items['form']).astype(float)
+    return pd.DataFrame({
+        'record': items.index.get_level_values(0),
+        'name': names.str.split().str.join(' ').str.lower(),
+        'carbs': carbs.values
+    }).reset_index(drop=True)
+
+
+class FoodStats:
+    """Per-food carb statistics learned from the meal history"""
+
+    def __init__(self):
+        self.values = {}     # normalized name -> list of logged carbs
+        self.estimates = {}  # normalized name -> {'count', 'median', 'spread'}
+
+    @classmethod
+    def from_data(cls, data):
+        """Build statistics for every parsed meal item in one pass"""
+        stats = cls()
+        if data.empty or 'food_details' not in data.columns:
+            return stats
+
+        items = parse_meal_items(data['food_details'])
+        if items.empty:
+            return stats
+
+        grouped = items.groupby('name')['carbs']
+        table = grouped.agg(count='count', median='median', spread=lambda x: x.std(ddof=0))
+        stats.values = grouped.agg(list).to_dict()
+        stats.estimates = table.round(1).to_dict(orient='index')
+        return stats
+
+    def __len__(self):
+        return len(self.estimates)
+
+    def _refresh(self, name):
+        values = self.values.get(name)
+        if not values:
+            self.values.pop(name, None)
+            self.estimates.pop(name, None)
+            return
+        arr = np.asarray(values, dtype=float)
+        self.estimates[name] = {
+            'count': len(arr),
+            'median': round(float(np.median(arr)), 1),
+            'spread': round(float(arr.std()), 1)
+        }
+
+    def add(self, food_details):
+        """Fold the items of a newly recorded meal into the statistics"""
+        items = parse_meal_items([food_details])
+        for name, carbs in zip(items['name'], items['carbs']):
+            self.values.setdefault(name, []).append(carbs)
+        for name in set(items['name']):
+            self._refresh(name)
+
+    def remove(self, food_details):
+        """Take the items of a deleted meal back out of the statistics"""
+        items = parse_meal_items([food_details])
+        for name, carbs in zip(items['name'], items['carbs']):
+            values = self.values.get(name, [])
+            if carbs in values:
+                values.remove(carbs)
+        for name in set(items['name']):
+            self._refresh(name)
+
+    def estimate(self, food_name):
+        """Look up the learned carb estimate for a food name, or None"""
+        return self.estimates.get(normalize_food_name(food_name))
+
+    def to_frame(self):
+        """Return the statistics table sorted by how often each food is logged"""
+        if not self.estimates:
+            return pd.DataFrame(columns=['count', 'median', 'spread'])
+        table = pd.DataFrame.from_dict(self.estimates, orient='index')
+        return table.sort_values(['count', 'median'], ascending=[False, False])
@@ -0,0 +1,148 @@
+from collections import deque
+
+import pandas as pd
+
+# Thresholds in mg/dL, matching the app's warning lines
+URGENT_LOW = 40
+LOW = 70
+HIGH = 180
+
+# An alert stops being active once the latest reading is older than this
+MAX_READING_AGE_MINUTES = 60
+
+# Low-side severities in increasing order; an episode only re-alerts when it escalates
+LOW_LEVELS = ['projected_low', 'low', 'urgent_low']
+
+ALERT_MESSAGES = {
+    'urgent_low': "🚨 严重低血糖预警！血糖 {glucose:.1f} mg/dL - 请立即处理！",
+    'low': "⚠️ 低血糖预警！血糖 {glucose:.1f} mg/dL - 请及时处理",
+    'projected_low': "⏳ 血糖正在下降（{rate:+.1f} mg/dL/分钟），预计{minutes}分钟内降至 {projected:.0f} mg/dL",
+    'high': "📈 高血糖提醒：血糖 {glucose:.1f} mg/dL",
+}
+
+
+class GlucoseAlertDetector:
+    """Streaming low/urgent-low/high detector fed one glucose reading at a time
+
+    Keeps only the previous reading, a smoothed rate of change and the open
+    episodes, so each reading costs O(1). An alert is emitted when a low
+    episode starts or escalates (projected low -> low -> urgent low) or a
+    high episode starts; an episode ends once glucose recovers past the
+    threshold by `hysteresis`, so readings hovering around a line do not
+    re-alert.
+    """
+
+    def __init__(self, low=LOW, urgent_low=URGENT_LOW, high=HIGH, projection_minutes=30, max_gap_minutes=60,
+                 hysteresis=10, smoothing=0.5, log_size=200, max_age_minutes=MAX_READING_AGE_MINUTES):
+        self.low = low
+        self.urgent_low = urgent_low
+        self.high = high
+        self.projection_minutes = projection_minutes
+        self.max_gap_minutes = max_gap_minutes
+        self.hysteresis = hysteresis
+        self.smoothing = smoothing
+        self.max_age_minutes = max_age_minutes
+
+        self.last_timestamp = None
+        self.last_glucose = None
+        self.rate = None  # mg/dL per minute, None when readings are too far apart
+        self.projected = None
+        self.low_level = None  # low-side severity of the latest reading
+        self.low_episode = None  # highest severity alerted in the open low episode
+        self.high_episode = False
+        self.events = deque(maxlen=log_size)
+
+    @classmethod
+    def from_data(cls, data, **params):
+        """Replay every glucose reading of the event table in time order"""
+        detector = cls(**params)
+        if data.empty:
+            return detector
+        readings = data[data['glucose_level'] > 0]
+        order = pd.to_datetime(readings['timestamp']).argsort(kind='stable')
+        for timestamp, glucose in zip(pd.to_datetime(readings['timestamp']).iloc[order],
+                                      readings['glucose_level'].iloc[order]):
+            detector.update(timestamp, glucose)
+        return detector
+
+    def _alert(self, kind):
+        return {
+            'kind': kind,
+            'timestamp': self.last_timestamp,
+            'glucose': self.last_glucose,
+            'rate': self.rate,
+            'projected': self.projected,
+            'message': ALERT_MESSAGES[kind].format(
+                glucose=self.last_glucose, rate=self.rate or 0.0, projected=self.projected or 0.0,
+                minutes=self.projection_minutes
+            ),
+        }
+
+    def update(self, timestamp, glucose):
+        """Consume one reading (mg/dL); returns the alerts it raised"""
+        if glucose is None or not glucose > 0:
+            return []  # insulin/meal rows carry no reading
+        timestamp = pd.Timestamp(timestamp)
+        if self.last_timestamp is not None and timestamp < self.last_timestamp:
+            raise ValueError("readings must arrive in time order; rebuild with from_data for backfilled records")
+
+        # Smoothed rate of change, only across readings close enough to trust
+        if self.last_timestamp is not None:
+            minutes = (timestamp - self.last_timestamp).total_seconds() / 60
+            if 0 < minutes <= self.max_gap_minutes:
+                instant = (glucose - self.last_glucose) / minutes
+                self.rate = instant if self.rate is None else self.smoothing * instant + (1 - self.smoothing) * self.rate
+            elif minutes > self.max_gap_minutes:
+                self.rate = None
+        self.last_timestamp = timestamp
+        self.last_glucose = float(glucose)
+        self.projected = None if self.rate is None else glucose + self.rate * self.projection_minutes
+
+        raised = []
+
+        # Low side: one episode that can escalate
+        if glucose <= self.urgent_low:
+            self.low_level = 'urgent_low'
+        elif glucose < self.low:
+            self.low_level = 'low'
+        elif self.projected is not None and self.projected < self.low:
+            self.low_level = 'projected_low'
+        else:
+            self.low_level = None
+        if self.low_level is not None:
+            if self.low_episode is None or LOW_LEVELS.index(self.low_level) > LOW_LEVELS.index(self.low_episode):
+                raised.append(self._alert(self.low_level))
+                self.low_episode = self.low_level
+        elif self.low_episode is not None and glucose >= self.low + self.hysteresis:
+            self.low_episode = None
+
+        # High side
+        if glucose > self.high:
+            if not self.high_episode:
+                raised.append(self._alert('high'))
+                self.high_episode = True
+        elif self.high_episode and glucose <= self.high - self.hysteresis:
+            self.high_episode = False
+
+        self.events.extend(raised)
+        return raised
+
+    def current_glucose(self, now, max_age_minutes=None):
+        """The latest reading (mg/dL) if it is at most `max_age_minutes` old at `now`, else None"""
+        max_age_minutes = self.max_age_minutes if max_age_minutes is None else max_age_minutes
+        if self.last_timestamp is None:
+            return None
+        if pd.Timestamp(now) - self.last_timestamp > pd.Timedelta(minutes=max_age_minutes):
+            return None
+        return self.last_glucose
+
+    def active_alerts(self, now):
+        """Current alert state from the latest reading, most severe first; none once that reading is too old"""
+        if self.current_glucose(now) is None:
+            return []
+        alerts = []
+        if self.low_level is not None:
+            alerts.append(self._alert(self.low_level))
+        if self.last_glucose is not None and self.last_glucose > self.high:
+            alerts.append(self._alert('high'))
+        return alerts
@@ -0,0 +1,185 @@
+import numpy as np
+import pandas as pd
+
+from utils.resampling import to_regular_grid
+
+# Consensus CGM thresholds (mg/dL)
+VERY_LOW = 54
+LOW = 70
+HIGH = 180
+VERY_HIGH = 250
+HYPO_EVENT_MINUTES = 15  # a hypo event is at least this long below the threshold
+
+# Range name -> (lower bound inclusive, upper bound exclusive)
+RANGES = {
+    'very_low': (-np.inf, VERY_LOW),
+    'low': (VERY_LOW, LOW),
+    'in_range': (LOW, HIGH + 1e-9),
+    'high': (HIGH + 1e-9, VERY_HIGH + 1e-9),
+    'very_high': (VERY_HIGH + 1e-9, np.inf),
+}
+
+
+def glucose_management_indicator(mean_glucose):
+    """GMI (%) from mean glucose in mg/dL"""
+    return 3.31 + 0.02392 * mean_glucose
+
+
+class GlycemicMetrics:
+    """Time-weighted glucose metrics over any window of the regular grid in O(1)
+
+    Prefix sums over the grid (valid points, glucose, glucose squared, points
+    in each range, hypo-event starts) turn every window statistic into a
+    difference of two entries. New readings only extend the arrays from the
+    reading before the latest one on; deletes and backfilled records rebuild them.
+    """
+
+    def __init__(self, freq='5min', max_gap='30min'):
+        self.freq = freq
+        self.max_gap = max_gap
+        self.step = pd.Timedelta(freq)
+        self.event_points = int(np.ceil(pd.Timedelta(minutes=HYPO_EVENT_MINUTES) / self.step))
+        self.start = None
+        self.glucose = np.empty(0)
+        # Readings an extension re-grids from: the one before the latest reading
+        # time (averaged) and every reading at the latest time, so a duplicate
+        # arriving later is averaged in exactly as from_data would
+        self.anchor = None
+        self.last_timestamp = None
+        self._reset_prefix()
+
+    def _reset_prefix(self):
+        self.prefix = {name: np.zeros(1) for name in ('valid', 'sum', 'sum_sq', *RANGES, 'hypo', 'severe_hypo')}
+        self.runs = {'hypo': np.zeros(0, dtype=int), 'severe_hypo': np.zeros(0, dtype=int)}
+
+    @classmethod
+    def from_data(cls, data, **params):
+        metrics = cls(**params)
+        metrics.extend(data)
+        return metrics
+
+    def __len__(self):
+        return len(self.glucose)
+
+    def extend(self, records):
+        """Account for records newer than everything seen so far (a frame in the user_data layout)"""
+        if records.empty:
+            return
+        records = records[['timestamp', 'glucose_level', 'carbs', 'insulin']].copy()
+        records['timestamp'] = pd.to_datetime(records['timestamp'])
+        if self.last_timestamp is not None and records['timestamp'].min() < self.last_timestamp:
+            raise ValueError("records must be newer than the last one; rebuild with from_data for backfilled records")
+
+        # A new reading can repeat the latest timestamp and so change its average,
+        # which moves every grid point interpolated from it: re-grid from the step
+        # after the previous reading (or the latest reading's step if it is the
+        # first). The anchor readings are all the interpolation needs from the past
+        keep = len(self.glucose)
+        if self.anchor is not None:
+            times = self.anchor['timestamp']
+            first = times.min().floor(self.freq)
+            keep = int((first - self.start) // self.step) + (1 if times.nunique() > 1 else 0)
+            records = pd.concat([self.anchor, records], ignore_index=True)
+
+        grid = to_regular_grid(records, freq=self.freq, max_gap=self.max_gap)
+        if self.start is None:
+            self.start = grid.index[0]
+            tail = grid['glucose_level'].to_numpy(float)
+        else:
+            offset = int((grid.index[0] - self.start) // self.step)
+            tail = grid['glucose_level'].to_numpy(float)[max(keep - offset, 0):]
+            # Steps between the old end and the first new record have no reading
+            tail = np.concatenate([np.full(max(offset - keep, 0), np.nan), tail])
+        self._truncate(keep)
+        self._append(tail)
+
+        self.last_timestamp = records['timestamp'].max()
+        readings = records[records['glucose_level'].fillna(0) > 0]
+        if not readings.empty:
+            latest = readings['timestamp'].max()
+            earlier = readings[readings['timestamp'] < latest]
+            if not earlier.empty:
+                previous = earlier['timestamp'].max()
+                value = earlier.loc[earlier['timestamp'] == previous, 'glucose_level'].mean()
+                earlier = pd.DataFrame({'timestamp': [previous], 'glucose_level': [value]})
+            self.anchor = pd.concat([earlier, readings.loc[readings['timestamp'] == latest,
+                                                           ['timestamp', 'glucose_level']]], ignore_index=True)
+            self.anchor['carbs'] = 0.0
+            self.anchor['insulin'] = 0.0
+
+    def _truncate(self, n):
+        self.glucose = self.glucose[:n]
+        for name in self.prefix:
+            self.prefix[name] = self.prefix[name][:n + 1]
+        for name in self.runs:
+            self.runs[name] = self.runs[name][:n]
+
+    def _append(self, values):
+        """Extend every prefix array by the given grid values"""
+        valid = ~np.isnan(values)
+        filled = np.where(valid, values, 0.0)
+        columns = {'valid': valid.astype(float), 'sum': filled, 'sum_sq': filled ** 2}
+        for name, (lower, upper) in RANGES.items():
+            columns[name] = (valid & (filled >= lower) & (filled < upper)).astype(float)
+        for name, threshold in (('hypo', LOW), ('severe_hypo', VERY_LOW)):
+            runs = self._run_lengths(valid & (filled < threshold), self.runs[name][-1] if len(self.runs[name]) else 0)
+            self.runs[name] = np.concatenate([self.runs[name], runs])
+            # An event is counted at the grid point where it has lasted long enough
+            columns[name] = (runs == self.event_points).astype(float)
+        for name, column in columns.items():
+            self.prefix[name] = np.concatenate([self.prefix[name], self.prefix[name][-1] + np.cumsum(column)])
+        self.glucose = np.concatenate([self.glucose, values])
+
+    @staticmethod
+    def _run_lengths(below, carried):
+        """Length of the below-threshold run ending at each point, continuing a run of `carried` points"""
+        index = np.arange(len(below))
+        # Position of the latest point not below the threshold, -1 (or the carried run) before any
+        last_break = np.maximum.accumulate(np.where(below, -1, index))
+        runs = index - last_break
+        from_carried = last_break == -1
+        runs[from_carried] = index[from_carried] + 1 + carried
+        return np.where(below, runs, 0)
+
+    def _index(self, when, default):
+        """Number of grid points before `when`, clipped to the grid"""
+        if when is None:
+            return default
+        position = int(np.ceil((pd.Timestamp(when) - self.start) / self.step))
+        return min(max(position, 0), len(self.glucose))
+
+    def window(self, start=None, end=None):
+        """Metrics over grid points in [start, end); None means the start/end of the data"""
+        if self.start is None:
+            return None
+        a, b = self._index(start, 0), self._index(end, len(self.glucose))
+        total = {name: float(values[b] - values[a]) for name, values in self.prefix.items()} if b > a else \
+            {name: 0.0 for name in self.prefix}
+        valid = total['valid']
+        step_hours = self.step.total_seconds() / 3600
+        result = {
+            'points': b - a,
+            'coverage': valid / (b - a) * 100 if b > a else 0.0,
+            'hours': valid * step_hours,
+            'hypo_events': int(total['hypo']),
+            'severe_hypo_events': int(total['severe_hypo']),
+        }
+        if valid == 0:
+            result.update({'mean': np.nan, 'sd': np.nan, 'cv': np.nan, 'gmi': np.nan,
+                           **{f"time_{name}": np.nan for name in RANGES}})
+            return result
+        mean = total['sum'] / valid
+        variance = max(total['sum_sq'] - valid * mean ** 2, 0.0) / (valid - 1) if valid > 1 else 0.0
+        result.update({
+            'mean': mean,
+            'sd': np.sqrt(variance),
+            'cv': np.sqrt(variance) / mean * 100,
+            'gmi': glucose_management_indicator(mean),
+            **{f"time_{name}": total[name] / valid * 100 for name in RANGES},
+        })
+        return result
+
+    def last_days(self, days, end=None):
+        """Metrics over the `days` days up to `end` (default: the end of the data)"""
+        end = self.start + len(self.glucose) * self.step if end is None else pd.Timestamp(end)
+        return self.window(end - pd.Timedelta(days=days), end)
@@ -0,0 +1,156 @@
+import numpy as np
+import pandas as pd
+
+from utils.resampling import INSULIN_TYPE_COLUMNS, VersionedCache, data_version, regular_grid
+
+# Action profiles (minutes) per insulin type, used with the exponential insulin
+# activity model; the long-acting profile is deliberately broad and flat
+INSULIN_PROFILES = {
+    '短效胰岛素': {'duration': 300, 'peak': 75},
+    '中效胰岛素': {'duration': 960, 'peak': 360},
+    '长效胰岛素': {'duration': 1440, 'peak': 600},
+}
+CARB_ABSORPTION_MINUTES = 180  # linear absorption of a meal
+
+# Direct convolution wins for short kernels (e.g. 24h at 5-minute steps);
+# FFT takes over for finer grids with long kernels
+FFT_KERNEL_THRESHOLD = 1000
+
+
+def insulin_curves(minutes, duration, peak):
+    """Exponential insulin model: activity (fraction/min) and remaining IOB fraction"""
+    t = np.clip(np.asarray(minutes, dtype=float), 0, duration)
+    tau = peak * (1 - peak / duration) / (1 - 2 * peak / duration)
+    a = 2 * tau / duration
+    S = 1 / (1 - a + (1 + a) * np.exp(-duration / tau))
+
+    activity = (S / tau ** 2) * t * (1 - t / duration) * np.exp(-t / tau)
+    iob = 1 - S * (1 - a) * ((t ** 2 / (tau * duration * (1 - a)) - t / tau - 1) * np.exp(-t / tau) + 1)
+    return activity, np.clip(iob, 0, 1)
+
+
+def carb_curves(minutes, absorption=CARB_ABSORPTION_MINUTES):
+    """Linear carb absorption: absorption rate (fraction/min) and remaining COB fraction"""
+    t = np.asarray(minutes, dtype=float)
+    rate = np.where((t >= 0) & (t < absorption), 1.0 / absorption, 0.0)
+    cob = np.clip(1 - t / absorption, 0, 1)
+    return rate, cob
+
+
+def causal_convolve(signal, kernel):
+    """Convolve event amounts with a response kernel, keeping the first len(signal) steps"""
+    signal = np.asarray(signal, dtype=float)
+    kernel = np.asarray(kernel, dtype=float)
+    n = len(signal)
+    if n == 0:
+        return signal
+    if len(kernel) <= FFT_KERNEL_THRESHOLD:
+        return np.convolve(signal, kernel)[:n]
+
+    size = n + len(kernel) - 1
+    fft_size = 1 << (size - 1).bit_length()
+    result = np.fft.irfft(np.fft.rfft(signal, fft_size) * np.fft.rfft(kernel, fft_size), fft_size)[:n]
+    # FFT round-off can leave tiny negatives where the true value is zero
+    return np.where(np.abs(result) < 1e-9, 0.0, result)
+
+
+def add_on_board(grid, freq):
+    """Add IOB/COB and insulin/carb activity columns to a regular grid"""
+    step_minutes = pd.Timedelta(freq).total_seconds() / 60
+    result = grid.copy()
+    iob_total = np.zeros(len(grid))
+    activity_total = np.zeros(len(grid))
+
+    for insulin_type, profile in INSULIN_PROFILES.items():
+        column = INSULIN_TYPE_COLUMNS[insulin_type]
+        minutes = np.arange(0, profile['duration'] + step_minutes, step_minutes)
+        activity, iob = insulin_curves(minutes, **profile)
+        doses = grid[column].to_numpy(float)
+        kind = column.split('_', 1)[1]
+        # Activity in units per step, so each kernel integrates to ~1 unit per unit dosed
+        iob_by_type = causal_convolve(doses, iob)
+        activity_by_type = causal_convolve(doses, activity * step_minutes)
+        iob_total += iob_by_type
+        activity_total += activity_by_type
+        result[f"iob_{kind}"] = iob_by_type
+        result[f"activity_{kind}"] = activity_by_type
+
+    minutes = np.arange(0, CARB_ABSORPTION_MINUTES + step_minutes, step_minutes)
+    rate, cob = carb_curves(minutes)
+    carbs = grid['carbs'].to_numpy(float)
+
+    result['iob'] = iob_total
+    result['insulin_activity'] = activity_total
+    result['cob'] = causal_convolve(carbs, cob)
+    result['carb_absorption'] = causal_convolve(carbs, rate * step_minutes)
+    return result
+
+
+_on_board_cache = VersionedCache()
+
+
+def on_board_grid(data, freq='5min', max_gap='30min'):
+    """Cached regular grid with IOB/COB columns; treat the result as read-only"""
+    key = (data_version(data), freq, max_gap)
+    return _on_board_cache.get(key, lambda: add_on_board(regular_grid(data, freq=freq, max_gap=max_gap), freq))
+
+
+def project_effects(grid, freq, steps):
+    """Insulin activity and carb absorption still to come from doses and meals already on the grid
+
+    Returns a frame of `steps` future grid steps with the same activity columns
+    as add_on_board, assuming no further doses or meals.
+    """
+    step_minutes = pd.Timedelta(freq).total_seconds() / 60
+    future_index = pd.date_range(grid.index[-1] + pd.Timedelta(freq), periods=steps, freq=freq, name='timestamp') \
+        if len(grid) else pd.DatetimeIndex([], name='timestamp')
+    projected = pd.DataFrame(index=future_index)
+
+    def tail_response(amounts, kernel):
+        # Convolve the last kernel-length of events padded with future zeros,
+        # then keep only the future part
+        tail = np.asarray(amounts, dtype=float)[-len(kernel):]
+        padded = np.concatenate([tail, np.zeros(steps)])
+        return causal_convolve(padded, kernel)[len(tail):]
+
+    activity_total = np.zeros(steps)
+    for insulin_type, profile in INSULIN_PROFILES.items():
+        column = INSULIN_TYPE_COLUMNS[insulin_type]
+        minutes = np.arange(0, profile['duration'] + step_minutes, step_minutes)
+        activity, _ = insulin_curves(minutes, **profile)
+        future = tail_response(grid[column], activity * step_minutes)
+        projected[f"activity_{column.split('_', 1)[1]}"] = future
+        activity_total += future
+
+    minutes = np.arange(0, CARB_ABSORPTION_MINUTES + step_minutes, step_minutes)
+    rate, _ = carb_curves(minutes)
+    projected['insulin_activity'] = activity_total
+    projected['carb_absorption'] = tail_response(grid['carbs'], rate * step_minutes)
+    return projected
+
+
+def insulin_on_board_at(data, when, insulin_types=('短效胰岛素',)):
+    """Insulin still active at `when` from the given insulin types (bolus IOB by default)"""
+    return float(insulin_on_board_series(data, [when], insulin_types)[0])
+
+
+def insulin_on_board_series(data, whens, insulin_types=('短效胰岛素',)):
+    """Vectorized insulin_on_board_at over many points in time, shape (len(whens),)"""
+    whens = pd.to_datetime(pd.Series(whens)).to_numpy()
+    total = np.zeros(len(whens))
+    if data.empty:
+        return total
+
+    timestamps = pd.to_datetime(data['timestamp']).to_numpy()
+    types = data['insulin_type'].fillna('') if 'insulin_type' in data.columns else pd.Series('', index=data.index)
+    for insulin_type in insulin_types:
+        profile = INSULIN_PROFILES[insulin_type]
+        mask = ((types == insulin_type) | ((insulin_type == '短效胰岛素') & ~types.isin(list(INSULIN_PROFILES)))).to_numpy()
+        doses = data['insulin'].fillna(0).to_numpy(float)[mask]
+        # (n_whens, n_doses) minutes since each dose
+        elapsed = (whens[:, None] - timestamps[mask][None, :]) / np.timedelta64(1, 'm')
+        recent = (elapsed >= 0) & (elapsed < profile['duration']) & (doses > 0)
+        if recent.any():
+            _, iob = insulin_curves(np.where(recent, elapsed, 0), **profile)
+            total += np.where(recent, iob, 0) @ doses
+    return total
@@ -0,0 +1,95 @@
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+# Long- and intermediate-acting injections are basal; short-acting and untyped ones are boluses
+BASAL_TYPES = ('长效胰岛素', '中效胰岛素')
+KINDS = ['basal', 'bolus']
+
+
+def insulin_kind(insulin_type):
+    return 'basal' if insulin_type in BASAL_TYPES else 'bolus'
+
+
+class InsulinProfile:
+    """Insulin units by kind, day of week and hour of day, kept in sync record by record
+
+    `sums[kind, weekday, hour]` holds the units injected and `days` counts the
+    records on each diary date, so the per-hour average over observed days is
+    a division and a forecast for any horizon is an index lookup.
+    """
+
+    def __init__(self):
+        self.sums = np.zeros((len(KINDS), 7, 24))
+        self.days = Counter()  # date -> number of records on that date
+        self.weekday_days = np.zeros(7)  # observed dates per weekday
+
+    @classmethod
+    def from_data(cls, data):
+        profile = cls()
+        if data.empty:
+            return profile
+
+        timestamps = pd.to_datetime(data['timestamp'])
+        doses = data['insulin'].fillna(0).to_numpy(float)
+        types = data['insulin_type'].fillna('') if 'insulin_type' in data.columns else pd.Series('', index=data.index)
+        kinds = np.where(types.isin(BASAL_TYPES).to_numpy(), KINDS.index('basal'), KINDS.index('bolus'))
+        np.add.at(profile.sums, (kinds, timestamps.dt.weekday.to_numpy(), timestamps.dt.hour.to_numpy()), doses)
+
+        profile.days.update(timestamps.dt.date)
+        for date in profile.days:
+            profile.weekday_days[date.weekday()] += 1
+        return profile
+
+    def _update(self, timestamp, insulin, insulin_type, sign):
+        timestamp = pd.Timestamp(timestamp)
+        date = timestamp.date()
+        if sign > 0:
+            if self.days[date] == 0:
+                self.weekday_days[date.weekday()] += 1
+            self.days[date] += 1
+        else:
+            self.days[date] -= 1
+            if self.days[date] <= 0:
+                del self.days[date]
+                self.weekday_days[date.weekday()] -= 1
+        if insulin and insulin > 0:
+            kind = KINDS.index(insulin_kind(insulin_type or ''))
+            self.sums[kind, timestamp.weekday(), timestamp.hour] += sign * insulin
+
+    def add(self, timestamp, insulin=0, insulin_type=''):
+        """Account for one new record (any record marks its date as observed)"""
+        self._update(timestamp, insulin, insulin_type, 1)
+
+    def remove(self, timestamp, insulin=0, insulin_type=''):
+        """Undo add for a deleted record"""
+        self._update(timestamp, insulin, insulin_type, -1)
+
+    @property
+    def observed_days(self):
+        return len(self.days)
+
+    def hourly(self, kind=None):
+        """Average units per hour of day over all observed days, shape (24,)"""
+        if not self.days:
+            return np.zeros(24)
+        sums = self.sums.sum(axis=0) if kind is None else self.sums[KINDS.index(kind)]
+        return sums.sum(axis=0) / len(self.days)
+
+    def by_weekday(self, kind=None):
+        """Average units per (weekday, hour), falling back to the all-days average for unobserved weekdays"""
+        sums = self.sums.sum(axis=0) if kind is None else self.sums[KINDS.index(kind)]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            profile = sums / self.weekday_days[:, None]
+        return np.where(self.weekday_days[:, None] > 0, profile, self.hourly(kind))
+
+    def forecast(self, start, hours=24, kind=None, weekly=False):
+        """Expected units in each of the next `hours` hours from `start`
+
+        With weekly=True the day-of-week profile is used as well as the hour.
+        """
+        times = pd.Timestamp(start).floor('h') + pd.to_timedelta(np.arange(hours), unit='h')
+        if weekly:
+            return self.by_weekday(kind)[times.weekday, times.hour]
+        return self.hourly(kind)[times.hour]
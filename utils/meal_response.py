@@ -0,0 +1,123 @@
+import numpy as np
+import pandas as pd
+
+from utils.food_stats import parse_meal_items
+
+# Windows around a meal (minutes)
+PRE_MEAL_MINUTES = 30     # latest reading up to this long before the meal is the baseline
+POST_MEAL_TOLERANCE = 15  # the 1h/2h reading may be this far off the mark
+PEAK_MINUTES = 180        # the peak is the highest reading within this long after the meal
+RESPONSE_COLUMNS = ['timestamp', 'carbs', 'food_details', 'pre_glucose', 'glucose_1h', 'glucose_2h',
+                    'peak_glucose', 'excursion']
+
+
+def glucose_readings(data):
+    """Time-sorted glucose readings as a two-column frame"""
+    readings = data.loc[data['glucose_level'] > 0, ['timestamp', 'glucose_level']].copy()
+    readings['timestamp'] = pd.to_datetime(readings['timestamp'])
+    return readings.sort_values('timestamp', kind='stable').reset_index(drop=True)
+
+
+def meal_responses(meals, readings):
+    """Pre-meal, 1h, 2h and peak glucose (mg/dL) and the excursion for every meal in one pass
+
+    `meals` has timestamp/carbs/food_details columns, `readings` is sorted
+    glucose_readings output. The baseline and 1h/2h values are merge_asof
+    joins; the peak is a max over each meal's searchsorted slice of the
+    readings. Values without a reading in their window are NaN.
+    """
+    meals = meals[['timestamp', 'carbs', 'food_details']].copy()
+    meals['timestamp'] = pd.to_datetime(meals['timestamp'])
+    meals = meals.sort_values('timestamp', kind='stable').reset_index(drop=True)
+    if meals.empty:
+        return pd.DataFrame(columns=RESPONSE_COLUMNS)
+    series = readings.rename(columns={'timestamp': 'reading_time', 'glucose_level': 'glucose'})
+
+    def asof(offset_minutes, direction, tolerance_minutes):
+        target = pd.DataFrame({'target': meals['timestamp'] + pd.Timedelta(minutes=offset_minutes)})
+        joined = pd.merge_asof(target, series, left_on='target', right_on='reading_time', direction=direction,
+                               tolerance=pd.Timedelta(minutes=tolerance_minutes))
+        return joined['glucose'].to_numpy(float)
+
+    meals['pre_glucose'] = asof(0, 'backward', PRE_MEAL_MINUTES)
+    meals['glucose_1h'] = asof(60, 'nearest', POST_MEAL_TOLERANCE)
+    meals['glucose_2h'] = asof(120, 'nearest', POST_MEAL_TOLERANCE)
+
+    # Readings in (meal, meal + PEAK_MINUTES] are values[start:end]; interleaving the
+    # bounds lets one maximum.reduceat take every slice's max (odd results are discarded)
+    times = series['reading_time'].to_numpy()
+    values = np.append(series['glucose'].to_numpy(float), np.nan)
+    start = np.searchsorted(times, meals['timestamp'].to_numpy(), side='right')
+    end = np.searchsorted(times, (meals['timestamp'] + pd.Timedelta(minutes=PEAK_MINUTES)).to_numpy(), side='right')
+    if len(times):
+        bounds = np.column_stack([start, end]).ravel()
+        peaks = np.maximum.reduceat(values, bounds)[::2]
+    else:
+        peaks = np.full(len(meals), np.nan)
+    meals['peak_glucose'] = np.where(end > start, peaks, np.nan)
+    meals['excursion'] = meals['peak_glucose'] - meals['pre_glucose']
+    return meals[RESPONSE_COLUMNS]
+
+
+class MealResponseTable:
+    """Post-meal glucose responses for every meal, kept up to date record by record
+
+    A new reading can only change the meals within the peak window before it
+    (or the baseline window after it), so updates recompute just the meals
+    around the changed record.
+    """
+
+    def __init__(self):
+        self.table = pd.DataFrame(columns=RESPONSE_COLUMNS)
+
+    @classmethod
+    def from_data(cls, data):
+        responses = cls()
+        if data.empty:
+            return responses
+        responses.table = meal_responses(cls._meals(data), glucose_readings(data))
+        return responses
+
+    @staticmethod
+    def _meals(data):
+        meals = data[data['carbs'].fillna(0) > 0]
+        if 'food_details' not in meals.columns:
+            meals = meals.assign(food_details='')
+        return meals
+
+    def __len__(self):
+        return len(self.table)
+
+    def refresh(self, data, timestamp):
+        """Recompute the meals a record at `timestamp` can affect, after it was added or deleted"""
+        timestamp = pd.Timestamp(timestamp)
+        start = timestamp - pd.Timedelta(minutes=PEAK_MINUTES + POST_MEAL_TOLERANCE)
+        end = timestamp + pd.Timedelta(minutes=PRE_MEAL_MINUTES)
+
+        timestamps = pd.to_datetime(data['timestamp'])
+        meals = self._meals(data[(timestamps >= start) & (timestamps <= end)])
+        # Readings the affected meals can reach: their baseline before, their peak window after
+        reach = (timestamps >= start - pd.Timedelta(minutes=PRE_MEAL_MINUTES)) & \
+            (timestamps <= end + pd.Timedelta(minutes=PEAK_MINUTES + POST_MEAL_TOLERANCE))
+        updated = meal_responses(meals, glucose_readings(data[reach]))
+
+        kept = self.table[(self.table['timestamp'] < start) | (self.table['timestamp'] > end)]
+        frames = [frame for frame in (kept, updated) if not frame.empty]
+        self.table = (pd.concat(frames).sort_values('timestamp', kind='stable').reset_index(drop=True)
+                      if frames else pd.DataFrame(columns=RESPONSE_COLUMNS))
+
+    def food_ranking(self, min_meals=1):
+        """Foods by mean glucose excursion of the meals they were part of, worst spike first"""
+        measured = self.table.dropna(subset=['excursion']).reset_index(drop=True)
+        items = parse_meal_items(measured['food_details'])
+        if items.empty:
+            return pd.DataFrame(columns=['meals', 'mean_excursion', 'max_excursion', 'mean_peak'])
+        items = items.join(measured[['excursion', 'peak_glucose']], on='record')
+        ranking = items.groupby('name').agg(
+            meals=('record', 'nunique'),
+            mean_excursion=('excursion', 'mean'),
+            max_excursion=('excursion', 'max'),
+            mean_peak=('peak_glucose', 'mean'),
+        )
+        ranking = ranking[ranking['meals'] >= min_meals]
+        return ranking.sort_values(['mean_excursion', 'max_excursion'], ascending=False)
@@ -0,0 +1,188 @@
+import json
+import os
+import re
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# CJK ideographs (incl. extension A and compatibility block) are indexed as
+# overlapping bigrams, Latin/alphanumeric runs as lower-cased words.
+CJK_RUN = re.compile(r'[㐀-䶿一-鿿豈-﫿]+')
+LATIN_WORD = re.compile(r'[A-Za-z][A-Za-z0-9]*')
+
+INDEX_FORMAT_VERSION = 1
+
+
+def meal_content_hash(timestamps, food_details):
+    """Order-independent hash of (timestamp, food_details) pairs, in the style of data_version"""
+    pairs = pd.DataFrame({'timestamp': pd.to_datetime(pd.Series(list(timestamps), dtype=object)),
+                          'food_details': pd.Series(list(food_details), dtype=object).astype(str)})
+    if pairs.empty:
+        return 'empty'
+    hashed = pd.util.hash_pandas_object(pairs, index=False).values
+    return f"{len(hashed)}-{int(np.sort(hashed).dot(np.arange(1, len(hashed) + 1, dtype=np.uint64))):x}"
+
+
+def tokenize(text):
+    """Split food details into CJK bigram and Latin word tokens"""
+    if not isinstance(text, str) or not text:
+        return set()
+
+    tokens = set()
+    for run in CJK_RUN.findall(text):
+        if len(run) == 1:
+            tokens.add(run)
+        else:
+            tokens.update(run[i:i+2] for i in range(len(run) - 1))
+    tokens.update(word.lower() for word in LATIN_WORD.findall(text))
+    return tokens
+
+
+class MealSearchIndex:
+    """Inverted index over the food_details of meal records"""
+
+    def __init__(self):
+        self.docs = {}      # doc id -> (timestamp iso string, food_details, carbs)
+        self.postings = {}  # token -> set of doc ids
+        self.next_id = 0
+
+    @classmethod
+    def from_data(cls, data):
+        """Build the index from every meal record in the data"""
+        index = cls()
+        if data.empty or 'food_details' not in data.columns:
+            return index
+
+        meals = data[data['food_details'].fillna('').astype(str).str.len() > 0]
+        timestamps = pd.to_datetime(meals['timestamp'])
+        for timestamp, details, carbs in zip(timestamps, meals['food_details'], meals['carbs']):
+            index.add(timestamp, details, carbs)
+        return index
+
+    def __len__(self):
+        return len(self.docs)
+
+    def add(self, timestamp, food_details, carbs=0.0):
+        """Index a single meal record"""
+        tokens = tokenize(food_details)
+        if not tokens:
+            return None
+
+        doc_id = self.next_id
+        self.next_id += 1
+        self.docs[doc_id] = (pd.Timestamp(timestamp).isoformat(), food_details, float(carbs or 0))
+        for token in tokens:
+            self.postings.setdefault(token, set()).add(doc_id)
+        return doc_id
+
+    def remove(self, timestamp, food_details):
+        """Drop the first indexed record matching timestamp and food details"""
+        key = (pd.Timestamp(timestamp).isoformat(), food_details)
+        for token in tokenize(food_details):
+            for doc_id in self.postings.get(token, ()):
+                if self.docs[doc_id][:2] == key:
+                    self._drop(doc_id)
+                    return True
+        return False
+
+    def _drop(self, doc_id):
+        _, food_details, _ = self.docs.pop(doc_id)
+        for token in tokenize(food_details):
+            ids = self.postings.get(token)
+            if ids is None:
+                continue
+            ids.discard(doc_id)
+            if not ids:
+                del self.postings[token]
+
+    def _candidates(self, token):
+        # A lone CJK character has no bigram of its own, so expand it to every
+        # indexed token containing it (the vocabulary is far smaller than the history)
+        if token in self.postings:
+            return self.postings[token]
+        if len(token) == 1 and CJK_RUN.fullmatch(token):
+            ids = set()
+            for vocab_token, vocab_ids in self.postings.items():
+                if token in vocab_token:
+                    ids |= vocab_ids
+            return ids
+        return set()
+
+    def search(self, query, limit=None):
+        """Return meal records containing every term of the query, newest first"""
+        terms = [term for term in str(query).split() if term]
+        if not terms:
+            return pd.DataFrame(columns=['timestamp', 'food_details', 'carbs'])
+
+        result = None
+        for term in terms:
+            tokens = tokenize(term)
+            if not tokens:
+                continue
+            for token in sorted(tokens, key=lambda t: len(self._candidates(t))):
+                ids = self._candidates(token)
+                result = set(ids) if result is None else result & ids
+                if not result:
+                    break
+
+        if not result:
+            return pd.DataFrame(columns=['timestamp', 'food_details', 'carbs'])
+
+        # Bigram intersection may match non-adjacent bigrams, so confirm the
+        # substring on the (small) candidate set only
+        lowered = [term.lower() for term in terms]
+        rows = [
+            self.docs[doc_id] for doc_id in result
+            if all(term in self.docs[doc_id][1].lower() for term in lowered)
+        ]
+        matches = pd.DataFrame(rows, columns=['timestamp', 'food_details', 'carbs'])
+        matches['timestamp'] = pd.to_datetime(matches['timestamp'])
+        matches = matches.sort_values('timestamp', ascending=False).reset_index(drop=True)
+        if limit is not None:
+            matches = matches.head(limit)
+        return matches
+
+    def save(self, path):
+        """Persist the index as JSON next to the data files"""
+        payload = {
+            'version': INDEX_FORMAT_VERSION,
+            'saved_at': datetime.now().isoformat(),
+            'next_id': self.next_id,
+            'docs': {str(doc_id): list(doc) for doc_id, doc in self.docs.items()},
+            'postings': {token: sorted(ids) for token, ids in self.postings.items()},
+        }
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(payload, f, ensure_ascii=False)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Load a persisted index, or None if missing or unreadable"""
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, encoding='utf-8') as f:
+                payload = json.load(f)
+            if payload.get('version') != INDEX_FORMAT_VERSION:
+                return None
+            index = cls()
+            index.next_id = payload['next_id']
+            index.docs = {int(doc_id): tuple(doc) for doc_id, doc in payload['docs'].items()}
+            index.postings = {token: set(ids) for token, ids in payload['postings'].items()}
+            return index
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def is_in_sync(self, data):
+        """Check that the index holds exactly the data's meal records (timestamps and food details)"""
+        if data.empty or 'food_details' not in data.columns:
+            return len(self.docs) == 0
+        details = data['food_details'].fillna('').astype(str)
+        has_tokens = details.str.contains(r'[A-Za-z㐀-䶿一-鿿豈-﫿]', regex=True)
+        if int(has_tokens.sum()) != len(self.docs):
+            return False
+        indexed = list(self.docs.values())
+        return meal_content_hash(data.loc[has_tokens, 'timestamp'], details[has_tokens]) == \
+            meal_content_hash([doc[0] for doc in indexed], [doc[1] for doc in indexed])
@@ -0,0 +1,140 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from utils.resampling import VersionedCache, data_version, regular_grid
+
+LOW = 70
+HIGH = 180
+WEEKDAYS = ['周一', '周二', '周三', '周四', '周五', '周六', '周日']
+ALL_DAYS = '每天'
+# A weekday pattern must beat the all-days rate of its block by this much
+WEEKDAY_LIFT = 0.15
+NIGHT_HOURS = (22, 6)  # blocks starting from 22:00 up to 06:00 are nocturnal
+
+PATTERN_COLUMNS = ['kind', 'weekday', 'start', 'end', 'days', 'observed', 'rate', 'mean_extreme', 'dates', 'night']
+
+
+def day_matrix(data, freq='5min', max_gap='30min'):
+    """Glucose on the regular grid reshaped to (days, slots per day), NaN where there is no reading
+
+    Returns (matrix, dates) with dates[i] the calendar date of row i.
+    """
+    grid = regular_grid(data, freq=freq, max_gap=max_gap)['glucose_level']
+    slots = int(pd.Timedelta('1D') / pd.Timedelta(freq))
+    if grid.empty:
+        return np.empty((0, slots)), pd.DatetimeIndex([])
+    first = grid.index[0].normalize()
+    days = (grid.index[-1].normalize() - first).days + 1
+    position = ((grid.index - first) // pd.Timedelta(freq)).to_numpy()
+    matrix = np.full(days * slots, np.nan)
+    matrix[position] = grid.to_numpy(float)
+    return matrix.reshape(days, slots), pd.date_range(first, periods=days, freq='D')
+
+
+def block_flags(matrix, block_slots, step_slots):
+    """Per (day, block) whether the block was observed, went low and went high, and its min and max
+
+    Blocks are `block_slots` wide and start every `step_slots`; a block that
+    runs past midnight continues into the next day's row. Counts come from
+    cumulative sums along the slot axis, so every block is two lookups.
+    """
+    days, slots = matrix.shape
+    # Append the start of the next day so blocks can wrap past midnight
+    following = np.vstack([matrix[1:, :block_slots], np.full((1, block_slots), np.nan)])
+    extended = np.hstack([matrix, following])
+    valid = ~np.isnan(extended)
+    starts = np.arange(0, slots, step_slots)
+    ends = starts + block_slots
+
+    def block_count(indicator):
+        prefix = np.concatenate([np.zeros((days, 1)), np.cumsum(indicator, axis=1)], axis=1)
+        return prefix[:, ends] - prefix[:, starts]
+
+    observed = block_count(valid) > 0
+    low = block_count(valid & (np.nan_to_num(extended, nan=np.inf) < LOW)) > 0
+    high = block_count(valid & (np.nan_to_num(extended, nan=-np.inf) > HIGH)) > 0
+    # Block extremes from a (days, blocks, block_slots) view of the extended rows
+    windows = np.lib.stride_tricks.sliding_window_view(extended, block_slots, axis=1)[:, starts]
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # blocks without any reading
+        minimum = np.nanmin(windows, axis=2)
+        maximum = np.nanmax(windows, axis=2)
+    return starts, observed, low, high, minimum, maximum
+
+
+def find_patterns(data, block_hours=2, step_hours=1, min_days=3, min_rate=0.3, freq='5min'):
+    """Recurring lows and highs by time-of-day block, overall and per weekday, strongest first
+
+    A pattern is a block in which glucose went below 70 (or above 180) mg/dL
+    on at least `min_days` days and on at least `min_rate` of the days with
+    readings in that block; a weekday pattern must also clearly exceed the
+    block's all-days rate. Overlapping blocks of the same kind and weekday
+    are reduced to the strongest one.
+    """
+    matrix, dates = day_matrix(data, freq=freq)
+    if len(dates) == 0:
+        return pd.DataFrame(columns=PATTERN_COLUMNS)
+    slots_per_hour = int(pd.Timedelta('1h') / pd.Timedelta(freq))
+    starts, observed, low, high, minimum, maximum = block_flags(matrix, block_hours * slots_per_hour,
+                                                                step_hours * slots_per_hour)
+    start_hours = starts // slots_per_hour
+
+    # Day groups: all days, then each weekday, as a (groups, days) indicator matrix
+    weekday = dates.weekday.to_numpy()
+    groups = np.vstack([np.ones(len(dates), dtype=bool), weekday[None, :] == np.arange(7)[:, None]])
+    group_names = [ALL_DAYS] + WEEKDAYS
+
+    patterns = []
+    for kind, flags, extreme in (('low', low, minimum), ('high', high, maximum)):
+        hits = groups.astype(float) @ flags                      # (groups, blocks) days with the event
+        seen = groups.astype(float) @ observed                   # (groups, blocks) days with readings
+        extreme_sum = groups.astype(float) @ np.where(flags, extreme, 0.0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            rate = np.where(seen > 0, hits / seen, 0.0)
+            mean_extreme = extreme_sum / hits
+        candidate = (hits >= min_days) & (rate >= min_rate)
+        candidate[1:] &= rate[1:] >= rate[0] + WEEKDAY_LIFT
+        for group, block in zip(*np.nonzero(candidate)):
+            supporting = dates[groups[group] & flags[:, block]]
+            start = int(start_hours[block])
+            patterns.append({
+                'kind': kind,
+                'weekday': group_names[group],
+                'start': start,
+                'end': (start + block_hours) % 24,
+                'days': int(hits[group, block]),
+                'observed': int(seen[group, block]),
+                'rate': float(rate[group, block]),
+                'mean_extreme': float(mean_extreme[group, block]),
+                'dates': [date.date() for date in supporting],
+                'night': start >= NIGHT_HOURS[0] or start < NIGHT_HOURS[1],
+            })
+    if not patterns:
+        return pd.DataFrame(columns=PATTERN_COLUMNS)
+
+    table = pd.DataFrame(patterns, columns=PATTERN_COLUMNS)
+    table['score'] = table['days'] * table['rate']
+    table = table.sort_values(['score', 'days'], ascending=False)
+
+    # Keep the strongest of overlapping blocks (circular distance below the block width)
+    kept = []
+    for row in table.itertuples():
+        overlaps = any(
+            other.kind == row.kind and other.weekday == row.weekday
+            and min(abs(other.start - row.start), 24 - abs(other.start - row.start)) < block_hours
+            for other in kept
+        )
+        if not overlaps:
+            kept.append(row)
+    return table.loc[[row.Index for row in kept]].drop(columns='score').reset_index(drop=True)
+
+
+_pattern_cache = VersionedCache()
+
+
+def cached_patterns(data, **params):
+    """find_patterns cached per data version and parameters; treat the result as read-only"""
+    key = (data_version(data), tuple(sorted(params.items())))
+    return _pattern_cache.get(key, lambda: find_patterns(data, **params))
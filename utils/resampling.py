@@ -0,0 +1,131 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+GRID_COLUMNS = ['glucose_level', 'carbs', 'insulin']
+
+# Insulin is also summed per type so activity curves can be applied per type;
+# injections without a type are treated as short-acting boluses
+INSULIN_TYPE_COLUMNS = {
+    '短效胰岛素': 'insulin_short',
+    '中效胰岛素': 'insulin_intermediate',
+    '长效胰岛素': 'insulin_long',
+}
+
+
+def data_version(data):
+    """Content hash of the event table, used to key derived caches"""
+    if data.empty:
+        return 'empty'
+    columns = [col for col in ('timestamp', 'glucose_level', 'carbs', 'insulin', 'insulin_type') if col in data.columns]
+    hashed = pd.util.hash_pandas_object(data[columns], index=False).values
+    # Order-independent so re-sorting the same records keeps the version
+    return f"{len(hashed)}-{int(np.sort(hashed).dot(np.arange(1, len(hashed) + 1, dtype=np.uint64))):x}"
+
+
+def to_regular_grid(data, freq='5min', max_gap='30min'):
+    """Resample the irregular event table onto a regular time grid
+
+    Glucose readings (glucose_level > 0) are linearly interpolated onto grid
+    points bracketed by two readings at most `max_gap` apart; otherwise a grid
+    point takes the nearest reading within half a step, else NaN. Carbs and
+    insulin are summed into the step starting at each grid point, in total and
+    per insulin type.
+    """
+    if data.empty:
+        columns = GRID_COLUMNS + list(INSULIN_TYPE_COLUMNS.values())
+        return pd.DataFrame(columns=columns, index=pd.DatetimeIndex([], name='timestamp'), dtype=float)
+
+    step = pd.Timedelta(freq)
+    gap = pd.Timedelta(max_gap)
+    timestamps = pd.to_datetime(data['timestamp']).values.astype('datetime64[ns]')
+
+    start = pd.Timestamp(timestamps.min()).floor(freq)
+    end = pd.Timestamp(timestamps.max()).floor(freq)
+    grid = pd.date_range(start, end, freq=freq, name='timestamp')
+    grid_ns = grid.values.astype('datetime64[ns]').astype(np.int64)
+
+    # Event sums per step: bin index by integer division against the grid origin
+    bins = (timestamps.astype(np.int64) - grid_ns[0]) // step.value
+    carbs = np.bincount(bins, weights=data['carbs'].fillna(0).to_numpy(float), minlength=len(grid))
+    doses = data['insulin'].fillna(0).to_numpy(float)
+    insulin = np.bincount(bins, weights=doses, minlength=len(grid))
+    if 'insulin_type' in data.columns:
+        insulin_types = data['insulin_type'].fillna('').to_numpy(str)
+    else:
+        insulin_types = np.full(len(data), '')
+    by_type = {}
+    for insulin_type, column in INSULIN_TYPE_COLUMNS.items():
+        mask = insulin_types == insulin_type
+        if column == 'insulin_short':
+            mask |= ~np.isin(insulin_types, list(INSULIN_TYPE_COLUMNS))
+        by_type[column] = np.bincount(bins, weights=np.where(mask, doses, 0.0), minlength=len(grid))
+
+    # Glucose readings, averaging duplicates at the same instant
+    is_reading = data['glucose_level'].fillna(0).to_numpy(float) > 0
+    readings = (
+        pd.Series(data['glucose_level'].to_numpy(float)[is_reading], index=timestamps[is_reading])
+        .groupby(level=0).mean()
+    )
+    glucose = np.full(len(grid), np.nan)
+    if not readings.empty:
+        reading_ns = readings.index.values.astype('datetime64[ns]').astype(np.int64)
+        values = readings.to_numpy()
+
+        right = np.searchsorted(reading_ns, grid_ns, side='left')
+        left = right - 1
+        has_left = left >= 0
+        has_right = right < len(reading_ns)
+        left_c = np.clip(left, 0, len(reading_ns) - 1)
+        right_c = np.clip(right, 0, len(reading_ns) - 1)
+
+        # Exact hits and bracketed interpolation within short gaps
+        span = reading_ns[right_c] - reading_ns[left_c]
+        bracketed = has_left & has_right & (span <= gap.value)
+        weight = np.where(span > 0, (grid_ns - reading_ns[left_c]) / np.where(span > 0, span, 1), 0.0)
+        interpolated = values[left_c] + weight * (values[right_c] - values[left_c])
+        exact = has_right & (reading_ns[right_c] == grid_ns)
+        glucose = np.where(exact, values[right_c], np.where(bracketed, interpolated, np.nan))
+
+        # Isolated readings still land on the nearest grid point within half a step
+        dist_left = np.where(has_left, grid_ns - reading_ns[left_c], np.iinfo(np.int64).max)
+        dist_right = np.where(has_right, reading_ns[right_c] - grid_ns, np.iinfo(np.int64).max)
+        nearest = np.where(dist_left <= dist_right, values[left_c], values[right_c])
+        near_enough = np.minimum(dist_left, dist_right) <= step.value // 2
+        glucose = np.where(np.isnan(glucose) & near_enough, nearest, glucose)
+
+    return pd.DataFrame({'glucose_level': glucose, 'carbs': carbs, 'insulin': insulin, **by_type}, index=grid)
+
+
+class VersionedCache:
+    """Small LRU of derived frames keyed by data version and build parameters"""
+
+    def __init__(self, max_entries=16):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, build):
+        """Return the cached value for the key, building it on a miss"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+        value = build()
+        with self._lock:
+            self._entries[key] = value
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+
+_grid_cache = VersionedCache()
+
+
+def regular_grid(data, freq='5min', max_gap='30min'):
+    """Cached to_regular_grid; callers must treat the result as read-only"""
+    key = (data_version(data), freq, max_gap)
+    return _grid_cache.get(key, lambda: to_regular_grid(data, freq=freq, max_gap=max_gap))
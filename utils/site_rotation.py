@@ -0,0 +1,120 @@
+from collections import deque
+
+import pandas as pd
+
+# Sites offered by the injection form, in display order
+SITES = ['腹部', '大腿', '手臂', '臀部']
+WINDOW_DAYS = (7, 14, 30)
+
+# A site is overused when it takes this share of the last week's injections (with enough of them),
+# or is used this many times in a row
+OVERUSE_SHARE = 0.5
+OVERUSE_MIN_INJECTIONS = 4
+OVERUSE_STREAK = 3
+
+
+class SiteRotationTracker:
+    """Per-site last use and rolling 7/14/30-day injection counts, updated injection by injection
+
+    Each window keeps a deque of the site's injection times inside it, so
+    adding an injection or moving the clock forward only pops what falls
+    out of the window, and a summary costs O(sites).
+    """
+
+    def __init__(self, sites=SITES, windows=WINDOW_DAYS):
+        self.windows = tuple(windows)
+        self.last_used = {}
+        self.recent = {}
+        for site in sites:
+            self._track(site)
+        self.last_timestamp = None
+        self.streak_site = None
+        self.streak_length = 0
+
+    @classmethod
+    def from_data(cls, data, **params):
+        """Replay every injection with a recorded site in time order"""
+        tracker = cls(**params)
+        if data.empty or 'injection_site' not in data.columns:
+            return tracker
+        sites = data['injection_site'].fillna('').astype(str)
+        injections = data[(data['insulin'].fillna(0) > 0) & (sites != '')]
+        timestamps = pd.to_datetime(injections['timestamp'])
+        order = timestamps.argsort(kind='stable')
+        for timestamp, site in zip(timestamps.iloc[order], injections['injection_site'].iloc[order]):
+            tracker.add(timestamp, site)
+        return tracker
+
+    def _track(self, site):
+        if site not in self.recent:
+            self.last_used[site] = None
+            self.recent[site] = {days: deque() for days in self.windows}
+
+    def _evict(self, site, now):
+        for days, times in self.recent[site].items():
+            cutoff = now - pd.Timedelta(days=days)
+            while times and times[0] <= cutoff:
+                times.popleft()
+
+    def add(self, timestamp, site):
+        """Record one injection; injections must arrive in time order"""
+        if not site:
+            return
+        timestamp = pd.Timestamp(timestamp)
+        if self.last_timestamp is not None and timestamp < self.last_timestamp:
+            raise ValueError("injections must arrive in time order; rebuild with from_data for backfilled records")
+        self._track(site)
+        self.last_timestamp = timestamp
+        self.last_used[site] = timestamp
+        for times in self.recent[site].values():
+            times.append(timestamp)
+        self._evict(site, timestamp)
+        if site == self.streak_site:
+            self.streak_length += 1
+        else:
+            self.streak_site, self.streak_length = site, 1
+
+    def advance(self, now):
+        """Drop injections that have left the windows as of `now`"""
+        now = pd.Timestamp(now)
+        for site in self.recent:
+            self._evict(site, now)
+
+    def counts(self, days):
+        return {site: len(windows[days]) for site, windows in self.recent.items()}
+
+    def overused(self):
+        """Sites used too often lately, each with the reason"""
+        found = {}
+        week = self.counts(self.windows[0])
+        total = sum(week.values())
+        if total >= OVERUSE_MIN_INJECTIONS:
+            for site, count in week.items():
+                if count / total >= OVERUSE_SHARE:
+                    found[site] = f"近{self.windows[0]}天 {count}/{total} 次注射"
+        if self.streak_length >= OVERUSE_STREAK:
+            found.setdefault(self.streak_site, f"连续 {self.streak_length} 次注射")
+        return found
+
+    def recommend(self):
+        """Next site: never used first, then the least recently used, fewest recent injections on ties"""
+        week = self.counts(self.windows[0])
+        return min(self.recent, key=lambda site: (
+            self.last_used[site] is not None, self.last_used[site] or pd.Timestamp.min, week[site]
+        ))
+
+    def summary(self, now):
+        """One row per site as of `now`: last use, days since and the rolling window counts"""
+        self.advance(now)
+        now = pd.Timestamp(now)
+        rows = []
+        for site, last_used in self.last_used.items():
+            row = {
+                'site': site,
+                'last_used': last_used,
+                'days_since': None if last_used is None else (now - last_used).total_seconds() / 86400,
+            }
+            for days in self.windows:
+                row[f"last_{days}d"] = len(self.recent[site][days])
+            rows.append(row)
+        return pd.DataFrame(rows)
@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+
+from utils.insulin_activity import CARB_ABSORPTION_MINUTES, INSULIN_PROFILES, carb_curves, causal_convolve, insulin_curves
+
+# Meal times (hour of day) and carb ranges for the simulated diary
+MEAL_HOURS = (8, 13, 19)
+MEAL_CARBS = (20, 80)
+RECORD_COLUMNS = ['timestamp', 'glucose_level', 'carbs', 'insulin', 'insulin_type', 'injection_site', 'food_details']
+
+
+def synthetic_history(days=14, freq='5min', seed=0, start='2025-01-01', isf=50.0, carb_ratio=15.0,
+                      basal=20.0):
+    """Simulated CGM readings plus meal, bolus and basal records in the user_data.csv layout
+
+    Glucose follows the same insulin and carb curves the predictors use, with a
+    pull back towards 130 mg/dL, slow random drift and sensor noise. Boluses
+    are mis-dosed by up to ±40% so the series contains both hypos and highs.
+    """
+    rng = np.random.default_rng(seed)
+    step_minutes = pd.Timedelta(freq).total_seconds() / 60
+    timestamps = pd.date_range(start, periods=int(days * 1440 / step_minutes), freq=freq)
+    n = len(timestamps)
+
+    # Meals with jittered times, and boluses dosed from the carb ratio
+    meal_rows = []
+    for day in range(days):
+        for hour in MEAL_HOURS:
+            when = pd.Timestamp(start) + pd.Timedelta(days=day, hours=hour, minutes=int(rng.integers(-45, 46)))
+            carbs = float(rng.integers(*MEAL_CARBS))
+            dose = round(carbs / carb_ratio * rng.uniform(0.6, 1.4))
+            meal_rows.append((when, carbs, dose))
+    basal_rows = [pd.Timestamp(start) + pd.Timedelta(days=day, hours=8) for day in range(days)]
+
+    carbs_grid = np.zeros(n)
+    bolus_grid = np.zeros(n)
+    for when, carbs, dose in meal_rows:
+        i = int((when - timestamps[0]) / pd.Timedelta(freq))
+        if 0 <= i < n:
+            carbs_grid[i] += carbs
+            bolus_grid[i] += dose
+
+    # Per-step glucose effect of the logged boluses and meals
+    profile = INSULIN_PROFILES['短效胰岛素']
+    activity, _ = insulin_curves(np.arange(0, profile['duration'] + step_minutes, step_minutes), **profile)
+    rate, _ = carb_curves(np.arange(0, CARB_ABSORPTION_MINUTES + step_minutes, step_minutes))
+    effect = (
+        -isf * causal_convolve(bolus_grid, activity * step_minutes)
+        + (isf / carb_ratio) * causal_convolve(carbs_grid, rate * step_minutes)
+    )
+
+    glucose = np.empty(n)
+    level = 130.0
+    drift = 0.0
+    pull = 0.02 * step_minutes / 5
+    for i in range(n):
+        drift = 0.95 * drift + rng.normal(0, 0.5)
+        level += effect[i] + pull * (130.0 - level) + drift
+        level = min(max(level, 40.0), 400.0)
+        glucose[i] = level
+    readings = np.clip(glucose + rng.normal(0, 5, n), 40, 400).round(1)
+
+    records = pd.concat([
+        pd.DataFrame({'timestamp': timestamps, 'glucose_level': readings, 'carbs': 0.0, 'insulin': 0.0,
+                      'insulin_type': ''}),
+        pd.DataFrame({'timestamp': [row[0] for row in meal_rows], 'glucose_level': 0.0,
+                      'carbs': [row[1] for row in meal_rows], 'insulin': [float(row[2]) for row in meal_rows],
+                      'insulin_type': '短效胰岛素'}),
+        pd.DataFrame({'timestamp': basal_rows, 'glucose_level': 0.0, 'carbs': 0.0, 'insulin': basal,
+                      'insulin_type': '长效胰岛素'}),
+    ], ignore_index=True)
+    records['injection_site'] = ''
+    records['food_details'] = ''
+    return records.sort_values('timestamp', kind='stable').reset_index(drop=True)[RECORD_COLUMNS]
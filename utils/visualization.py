@@ -1,11 +1,18 @@
 import plotly.graph_objects as go
+import pandas as pd
 from datetime import datetime, timedelta
 
-def create_glucose_plot(data, date_range=None):
-    """Create an interactive plotly figure for glucose trends with date range selection"""
+def create_glucose_plot(data, date_range=None, on_board=None):
+    """Create an interactive plotly figure for glucose trends with date range selection
+
+    `on_board` is an optional regular grid with 'iob' and 'cob' columns that is
+    overlaid on a secondary axis.
+    """
     if date_range:
         start_date, end_date = date_range
         data = data[(data['timestamp'] >= start_date) & (data['timestamp'] <= end_date)]
+        if on_board is not None:
+            on_board = on_board[(on_board.index >= start_date) & (on_board.index <= end_date)]
 
     # Convert mg/dL to mmol/L for display
     data_display = data.copy()
@@ -23,6 +30,33 @@ def create_glucose_plot(data, date_range=None):
         marker=dict(size=10)  # 增大标记点以便触控
     ))
 
+    # Insulin and carbs on board overlay (secondary axis)
+    if on_board is not None and not on_board.empty:
+        fig.add_trace(go.Scatter(
+            x=on_board.index,
+            y=on_board['iob'].round(2),
+            name='活性胰岛素 IOB (单位)',
+            line=dict(color='purple', width=1.5),
+            fill='tozeroy',
+            fillcolor='rgba(128,0,128,0.08)',
+            yaxis='y2'
+        ))
+        fig.add_trace(go.Scatter(
+            x=on_board.index,
+            y=on_board['cob'].round(1),
+            name='活性碳水 COB (克)',
+            line=dict(color='green', width=1.5, dash='dot'),
+            yaxis='y2'
+        ))
+        fig.update_layout(yaxis2=dict(
+            title='IOB (单位) / COB (克)',
+            overlaying='y',
+            side='right',
+            showgrid=False,
+            rangemode='tozero',
+            tickfont=dict(size=10)
+        ))
+
     # Add danger zone for hypoglycemia (below 2.2 mmol/L = 40 mg/dL)
     fig.add_hrect(
         y0=0, y1=2.2,
@@ -99,10 +133,51 @@ def create_glucose_plot(data, date_range=None):
 
     return fig
 
-def create_prediction_plot(data, predictions):
-    """Create a plotly figure for glucose predictions"""
-    last_timestamp = data['timestamp'].max()
-    future_timestamps = [last_timestamp + timedelta(hours=i) for i in range(1, 7)]
+def create_agp_plot(agp, days):
+    """Ambulatory glucose profile: 5-95% and 25-75% bands and the median by time of day
+
+    `agp` is the frame from utils.agp.agp_percentiles (mg/dL, indexed by minute of day).
+    """
+    # Plot over one nominal day so the x axis reads as clock time
+    times = [datetime(2000, 1, 1) + timedelta(minutes=int(minute)) for minute in agp.index]
+    mmol = agp[['p5', 'p25', 'p50', 'p75', 'p95']] / 18.0182
+
+    fig = go.Figure()
+    fig.add_hrect(y0=3.9, y1=10.0, fillcolor='green', opacity=0.08, layer='below', line_width=0)
+    for low, high, color, name in (('p5', 'p95', 'rgba(0,0,255,0.12)', '5%-95%'),
+                                   ('p25', 'p75', 'rgba(0,0,255,0.3)', '25%-75%')):
+        fig.add_trace(go.Scatter(x=times, y=mmol[high], line=dict(width=0), showlegend=False,
+                                 hoverinfo='skip', connectgaps=False))
+        fig.add_trace(go.Scatter(x=times, y=mmol[low], line=dict(width=0), fill='tonexty', fillcolor=color,
+                                 name=name, connectgaps=False))
+    fig.add_trace(go.Scatter(x=times, y=mmol['p50'], name='中位数', line=dict(color='blue', width=2)))
+
+    fig.add_hline(y=3.9, line_dash="dash", line_color="orange", opacity=0.5)
+    fig.add_hline(y=10.0, line_dash="dash", line_color="orange", opacity=0.5)
+    fig.update_layout(
+        title=f'动态血糖图谱 (AGP，{days}天)',
+        xaxis_title='时间',
+        yaxis_title='血糖值 (mmol/L)',
+        hovermode='x unified',
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
+        margin=dict(l=10, r=10, t=60, b=10),
+        xaxis=dict(tickformat='%H:%M', dtick=3 * 3600 * 1000, tickfont=dict(size=10)),
+        yaxis=dict(tickfont=dict(size=10), range=[0, max(11.1, float(mmol['p95'].max() * 1.1))]),
+    )
+    return fig
+
+def create_prediction_plot(data, predictions, intervals=None):
+    """Create a plotly figure for glucose predictions, with an optional (lower, upper) band
+
+    Predictions given as a Series are plotted at its timestamps, otherwise
+    hourly from the last record.
+    """
+    if isinstance(predictions, pd.Series):
+        future_timestamps = list(predictions.index)
+        predictions = predictions.tolist()
+    else:
+        last_timestamp = data['timestamp'].max()
+        future_timestamps = [last_timestamp + timedelta(hours=i) for i in range(1, len(predictions) + 1)]
 
     # Convert mg/dL to mmol/L for display
     data_display = data.copy()
@@ -129,6 +204,19 @@ def create_prediction_plot(data, predictions):
         marker=dict(size=10)
     ))
 
+    # Prediction interval band in mmol/L
+    if intervals is not None and len(predictions) > 0:
+        lower_mmol = [p / 18.0182 for p in intervals[0]]
+        upper_mmol = [p / 18.0182 for p in intervals[1]]
+        fig.add_trace(go.Scatter(
+            x=future_timestamps + future_timestamps[::-1],
+            y=upper_mmol + lower_mmol[::-1],
+            fill='toself',
+            fillcolor='rgba(255,0,0,0.1)',
+            line=dict(color='rgba(255,255,255,0)'),
+            name='预测区间'
+        ))
+
     # Predictions in mmol/L
     fig.add_trace(go.Scatter(
         x=future_timestamps,
@@ -146,7 +234,7 @@ def create_prediction_plot(data, predictions):
 
     # Update layout with mobile-friendly features
     fig.update_layout(
-        title='血糖预测（未来6小时）',
+        title=f'血糖预测（未来{len(predictions) or 6}小时）',
         xaxis_title='时间',
         yaxis_title='血糖值 (mmol/L)',
         hovermode='x unified',